@@ -1,20 +1,23 @@
 import pygame 
 from pygame.locals import *
-import time
-import math
 import random
-import requests
-import io
-from urllib.request import urlopen # To open URLs
-
-pygame.init()
-clock = pygame.time.Clock()
-pygame.mixer.init() # Initialize the mixel module
+import threading
+import battle_engine
+from rendering import Element, FrameRenderer, HPBar
+from text_cache import text_cache
+from pokeapi import APIManager, Move, choose_moves, load_species
+from scheduler import Scheduler
+from loader import Loader
+from audio import MusicManager
+from replay import DEFAULT_REPLAY_PATH, ReplayWriter
+from ai import ExpectimaxAI
+from layout import EMPTY, LayoutCache, move_layout, turn_layout
+from sprite_cache import SpriteCache
+from telemetry import configure_telemetry, telemetry
 
 game_width = 500
 game_height = 500
-game = pygame.display.set_mode((game_width, game_height))
-pygame.display.set_caption('Pokemon Battle')
+game = None  # The game window, opened by init_display
 
 black = (0, 0, 0)
 gold = (218, 165, 32)
@@ -23,51 +26,43 @@ green = (0, 200, 0)
 red = (200, 0, 0)
 white = (255, 255, 255)
 
-class APIManager:
-    '''
-    Represents the management of the API Request to get Pokemon data
-    Attributes:
-    - BASE_URL (str): the base url for the pokemon api
-    '''
-    BASE_URL = 'https://pokeapi.co/api/v2'
-
-    @staticmethod
-    def get_pokemon_data(name):
-        '''
-        Gets the pokemon data from the API by name
-        Arguments:
-        - name(str): the name is the pokemon to get
-        Returns:
-        - dictionary containing the data
-        '''
-        response = requests.get(f'{APIManager.BASE_URL}/pokemon/{name.lower()}')
-        return response.json() if response.status_code == 200 else None
-
-    @staticmethod
-    def get_move_data(url):
-        '''
-        Gets move data from the API by URL
-        Arguments:
-        - url(str): the url of the move to get
-        Returns:
-        - dictionary with the move data
-        '''
-        response = requests.get(url)
-        return response.json() if response.status_code == 200 else None
-
-class Move:
+renderer = None  # Redraws only what changed between frames, created by init_display
+scheduler = Scheduler()  # Waits and delayed actions, advanced once per frame by the main loop
+message_box = {'text': None}  # The message shown at the bottom of the screen
+loader = Loader()  # Fetches data and sprite files on worker threads while frames keep being drawn
+music = MusicManager(loader)  # Music files are read in the background and kept in memory
+battle_rng = random.Random()  # Critical rolls of the current battle, seeded for each battle so it can be replayed
+damage_table = battle_engine.DamageTable()  # Damage coefficients of the current battle, new for each battle
+replay_log = None  # Records every battle (ReplayWriter), opened by main()
+rival_ai = ExpectimaxAI(time_budget=0.005)  # Searches at most about 5ms per turn, well within a frame
+ui_layout = LayoutCache()  # Buttons of the current screen, shared by drawing and click handling
+prefetched = set()  # Sprites already asked to the loader
+loading = {'since': 0, 'failed': []}  # Loader jobs delivered before the current loading phase, starters that failed in it
+
+INTRO_MUSIC = 'Intro.mp3'
+BATTLE_MUSIC = 'PokemonCombatMusic.mp3'
+END_MUSIC = 'PokemonEndMusic.mp3'
+
+MESSAGE_DELAY = 2000  # Milliseconds a battle message stays on screen
+TURN_DELAY = 1500  # Milliseconds of pause after the rival's turn and at the end of the battle
+
+def init_display():
     '''
-    Represents the pokemon move
-    Attributes:
-    - name(str): name of the move
-    - power(int): power of the move
-    - type(str): type of move
+    Initializes pygame and opens the game window, importing the module does neither
+    Returns:
+    - pygame.Surface: the game window
     '''
-    def __init__(self, url):
-        data = APIManager.get_move_data(url)
-        self.name = data['name']
-        self.power = data['power']
-        self.type = data['type']['name']
+    global game, renderer
+    if game is None:
+        pygame.init()
+        try:
+            pygame.mixer.init() # Initialize the mixel module
+        except pygame.error as error:
+            print(f"No audio device, playing without music: {error}")
+        game = pygame.display.set_mode((game_width, game_height))
+        pygame.display.set_caption('Pokemon Battle')
+        renderer = FrameRenderer(game, grey)
+    return game
 
 class Pokemon(pygame.sprite.Sprite):
     '''
@@ -77,30 +72,41 @@ class Pokemon(pygame.sprite.Sprite):
     - level(int): level of the pokemon
     - x(int): the x-coordinate position of the pokemon
     - y(int): the y-coordinate position of the pokemon
+    - species(SpeciesRecord): the trimmed species data, shared by every pokemon of the species
+    - sprites(SpriteCache): downloaded and pre-scaled sprite images shared by every pokemon, created by get_sprites on first use
     '''
+    sprites = None
+    _sprites_lock = threading.Lock()
+
+    @staticmethod
+    def get_sprites():
+        '''
+        Gets the sprite cache shared by every pokemon, creating it on first use so importing
+        the module does not depend on how APIManager is set up
+        Returns:
+        - SpriteCache: the cache, offline if the response cache is
+        '''
+        with Pokemon._sprites_lock:
+            if Pokemon.sprites is None:
+                Pokemon.sprites = SpriteCache(offline=getattr(APIManager.cache, 'offline', False))
+            return Pokemon.sprites
+
     def __init__(self, name, level, x, y):
         super().__init__()
         self.size = 200  # Adjusted size for the sprite
 
-        self.json = APIManager.get_pokemon_data(name)  # Assign obtained data to self.json
-        if self.json:
+        self.species = load_species(name)  # Only the trimmed record is kept, not the raw API data
+        if self.species:
             self.name = name
             self.level = level
             self.x = x
             self.y = y
             self.num_potions = 3
-            stats = self.json['stats']
-            for stat in stats:
-                if stat['stat']['name'] == 'hp':
-                    self.current_hp = stat['base_stat'] + self.level
-                    self.max_hp = stat['base_stat'] + self.level
-                elif stat['stat']['name'] == 'attack':
-                    self.attack = stat['base_stat']
-                elif stat['stat']['name'] == 'defense':
-                    self.defense = stat['base_stat']
-                elif stat['stat']['name'] == 'speed':
-                    self.speed = stat['base_stat']
-            self.types = [t['type']['name'] for t in self.json['types']]
+            self.max_hp = self.current_hp = self.species.max_hp(self.level)
+            self.attack = self.species.attack
+            self.defense = self.species.defense
+            self.speed = self.species.speed
+            self.types = self.species.types
             self.size = 150
             self.set_sprite('front_default')
         else:
@@ -108,21 +114,18 @@ class Pokemon(pygame.sprite.Sprite):
             print("Failed to retrieve data for", name)
         self.hp_x = 10  
         self.hp_y = 10    
+        self.hp_bar = HPBar(colors=(red, green, black))
 
+    @telemetry.timed('set_sprite_ms')
     def set_sprite(self, side):
         '''
         Sets the sprite image (2D Pixel image) for the pokemon
         Arguments:
         - Side(str): the sode of the pokemon sprite (front or back)
         '''
-        image = self.json['sprites'][side]
-        image_stream = urlopen(image).read()
-        image_file = io.BytesIO(image_stream)
-        self.image = pygame.image.load(image_file).convert_alpha()
-        scale = self.size / self.image.get_width()
-        new_width = int(self.image.get_width() * scale)
-        new_height = int(self.image.get_height() * scale)
-        self.image = pygame.transform.scale(self.image, (new_width, new_height))
+        image = self.species.sprites[side]
+        # Repeat battles reuse the decoded, already scaled surface (no download, no rescale)
+        self.image = Pokemon.get_sprites().get_surface((self.name.lower(), side, self.size), image, self.size)
         self.rect = self.image.get_rect(topleft=(self.x, self.y))
 
     def perform_attack(self, other, move):
@@ -132,22 +135,8 @@ class Pokemon(pygame.sprite.Sprite):
         - other(pokemon): the target pokemon to attack
         - move(pokemon): the move used to attack
         '''
-        display_message(f'{self.name} used {move.name}')  # Display the attack message
-        pygame.display.update()  # Update the display to show the message
-        time.sleep(2)  # Wait for a moment so the message can be read
-
-        damage = (2 * self.level + 10) / 250 * self.attack / other.defense * move.power
-        if move.type in self.types:
-            damage *= 1.5
-        random_num = random.randint(1, 10000)
-        if random_num <= 625:
-            damage *= 1.5
-        damage = math.floor(damage)
-        other.take_damage(damage)
-
-    # Additional update and wait, in case further visual updates are needed after the attack
-    pygame.display.update()
-    time.sleep(2)
+        # The rules live in the headless battle engine, the game only displays what happens
+        battle_engine.perform_attack(self, other, move, rng=battle_rng, observer=show_battle_event, table=damage_table)
 
     def take_damage(self, damage):
         '''
@@ -155,37 +144,21 @@ class Pokemon(pygame.sprite.Sprite):
         Arguments:
         - damage(int): the amount of damage to deduct from the pokemon's HP
         '''
-        self.current_hp -= damage
-        if self.current_hp < 0:
-            self.current_hp = 0
+        battle_engine.take_damage(self, damage)
 
     def use_potion(self):
         '''
         Uses a potion to restore HP for the pokemon
         '''
-        if self.num_potions > 0:
-            self.current_hp += 30
-            if self.current_hp > self.max_hp:
-                self.current_hp = self.max_hp
-            self.num_potions -= 1
+        healed = battle_engine.use_potion(self)
+        show_battle_event('potion', {'pokemon': self, 'healed': healed})
 
     def set_moves(self):
         '''
         Sets the moves for the pokemon based on its level and moves
         '''
         try:
-            self.moves = []
-            for move_info in self.json['moves']:
-                versions = move_info['version_group_details']
-                for version in versions:
-                    if version['version_group']['name'] == 'red-blue' and version['move_learn_method']['name'] == 'level-up':
-                        level_learned = version['level_learned_at']
-                        if self.level >= level_learned:
-                            move = Move(move_info['move']['url'])
-                            if move.power is not None:  # To make sure move has power attribute
-                                self.moves.append(move)
-            if len(self.moves) > 4:
-                self.moves = random.sample(self.moves, 4)
+            self.moves = choose_moves(self.species.move_urls(self.level))
         except Exception as e:
             print(f"Error setting moves: {e}")
             self.moves = []  # Assign an empty list if there was an error
@@ -204,22 +177,8 @@ class Pokemon(pygame.sprite.Sprite):
         Arguments:
         - Surface(pygame.surface): the surface on which to draw the HP bar and text
         '''
-        # Display the health bar
-        bar_scale = 200 // self.max_hp
-        for i in range(self.max_hp):
-            bar = (self.hp_x + bar_scale * i, self.hp_y, bar_scale, 20)
-            pygame.draw.rect(surface, red, bar)
-        for i in range(self.current_hp):
-            bar = (self.hp_x + bar_scale * i, self.hp_y, bar_scale, 20)
-            pygame.draw.rect(surface, green, bar)
-
-        # Display "HP" text
-        font = pygame.font.Font(pygame.font.get_default_font(), 16)
-        text = font.render(f'HP: {self.current_hp} / {self.max_hp}', True, black)
-        text_rect = text.get_rect()
-        text_rect.x = self.hp_x
-        text_rect.y = self.hp_y + 30
-        surface.blit(text, text_rect)
+        # The bar is pre-rendered and only redrawn when the shown HP changes
+        self.hp_bar.draw(surface, self.hp_x, self.hp_y, self.current_hp, self.max_hp)
 
     def get_rect(self):
         '''
@@ -258,54 +217,122 @@ class GrassPokemon(Pokemon):
 
 # Could add more types of pokemons for the future...
 
+def show_battle_event(event, data):
+    '''
+    Displays an event reported by the battle engine on the game screen
+    Arguments:
+    - event(str): the kind of event ('move', 'damage', 'potion', 'faint')
+    - data(dict): the details of the event
+    '''
+    if replay_log is not None:
+        replay_log.record(event, data)
+    if event == 'move':
+        display_message(f"{data['attacker'].name} used {data['move'].name}")  # Display the attack message
+        scheduler.wait(MESSAGE_DELAY)  # Wait for a moment so the message can be read, without blocking the loop
+
 def display_message(message):
     '''
     Displays a message on the game screen
+    The message is drawn by draw_game with the next frames and stays on screen while
+    the scheduler is busy. If a message is already being read, the new one replaces
+    it once the current waits are over and is given its own time to be read.
     Arguments:
     - message(str): the message to display
     '''
-    pygame.draw.rect(game, white, (10, 350, 480, 140))
-    pygame.draw.rect(game, black, (10, 350, 480, 140), 3)
-    font = pygame.font.Font(pygame.font.get_default_font(), 20)
-    text = font.render(message, True, black)
-    text_rect = text.get_rect()
-    text_rect.x = 30
-    text_rect.y = 410
-    game.blit(text, text_rect)
-    pygame.display.update()
+    def show_next():
+        message_box['text'] = message
+        scheduler.wait(MESSAGE_DELAY)
+    if scheduler.busy:
+        scheduler.then(show_next)
+    else:
+        message_box['text'] = message
 
-def create_button(width, height, left, top, text_cx, text_cy, label, border_width=3):
+def message_element(message):
+    '''
+    Describes the message box for the renderer
+    Arguments:
+    - message(str): the message to display
+    Returns:
+    - Element: the message box
+    '''
+    message_rect = Rect(10, 350, 480, 140)
+    def draw(surface):
+        pygame.draw.rect(surface, white, message_rect)
+        pygame.draw.rect(surface, black, message_rect, 3)
+        surface.blit(text_cache.render(message, 20, black), (30, 410))  # Fonts and rendered text are cached
+    return Element('message', (message,), message_rect, draw)
+
+def draw_button(surface, button_rect, label, hovered, border_width=3, text_center=None):
     '''
-    Creates a button with the specified properties and label text.
+    Draws a button with its label
     Arguments:
-    - width (int): The width of the button.
-    - height (int): The height of the button.
-    - left (int): The x-coordinate position of the button's top-left corner.
-    - top (int): The y-coordinate position of the button's top-left corner.
-    - text_cx (int): The x-coordinate position of the center of the label text.
-    - text_cy (int): The y-coordinate position of the center of the label text.
+    - surface (pygame.Surface): The surface on which to draw the button.
+    - button_rect (pygame.Rect): The position and dimensions of the button.
     - label (str): The text to display on the button.
+    - hovered (bool): Whether the mouse is over the button (drawn in gold).
     - border_width (int): The width of the button's border.
-    Returns:
-    - pygame.Rect: The rectangular object representing the button's position and dimensions.
+    - text_center (tuple): The position of the center of the label text, defaults to the center of the button.
     '''
-    mouse_cursor = pygame.mouse.get_pos()
-    button_rect = Rect(left, top, width, height)
-    
     # Draw the border rectangle
-    pygame.draw.rect(game, black, button_rect, border_width)
+    pygame.draw.rect(surface, black, button_rect, border_width)
     
     # Draw the button rectangle inside it
     inner_rect = button_rect.inflate(-border_width*2, -border_width*2)  # Adjust the size for the border
-    pygame.draw.rect(game, gold if button_rect.collidepoint(mouse_cursor) else white, inner_rect)
+    pygame.draw.rect(surface, gold if hovered else white, inner_rect)
     
     # Draw the text on the button
-    font = pygame.font.Font(pygame.font.get_default_font(), 16)
-    text = font.render(label, True, black)
-    text_rect = text.get_rect(center=(text_cx, text_cy))
-    game.blit(text, text_rect)
-    
-    return button_rect
+    text = text_cache.render(label, 16, black)
+    text_rect = text.get_rect(center=text_center or button_rect.center)
+    surface.blit(text, text_rect)
+
+def button_element(widget, mouse_cursor):
+    '''
+    Describes a button of the layout for the renderer
+    Arguments:
+    - widget (Widget): The button, from the layout of the screen.
+    - mouse_cursor (tuple): The position of the mouse.
+    Returns:
+    - Element: the button element
+    '''
+    button_rect = Rect(widget.rect)
+    hovered = widget.contains(mouse_cursor)
+    label = widget.label
+    return Element(widget.name, (label, hovered), button_rect, lambda surface: draw_button(surface, button_rect, label, hovered))
+
+def screen_layout(game_status, player_pokemon):
+    '''
+    Gets the buttons of the current screen, computed again only when they change
+    The same layout is drawn by draw_game and hit-tested by the main loop.
+    Arguments:
+    - game_status (str): The current game state.
+    - player_pokemon (Pokemon): The player's Pokemon.
+    Returns:
+    - Layout: the buttons on screen
+    '''
+    if game_status == 'player_turn':
+        bottom = player_pokemon.y + player_pokemon.image.get_height()
+        return ui_layout.get(('player_turn', bottom, player_pokemon.num_potions), turn_layout, bottom, player_pokemon.num_potions)
+    if game_status == 'select_move':
+        moves = tuple(player_pokemon.moves)
+        return ui_layout.get(('select_move', moves), move_layout, moves, game_width, game_height)
+    return EMPTY
+
+def pokemon_elements(pokemon, with_hp=True):
+    '''
+    Describes a pokemon (and its HP bar) for the renderer
+    Arguments:
+    - pokemon (Pokemon): The Pokemon to draw.
+    - with_hp (bool): Whether to include the HP bar and text.
+    Returns:
+    - list of Element
+    '''
+    elements = [Element(f'{pokemon.name} sprite', (id(pokemon.image),),
+                        pokemon.image.get_rect(topleft=(pokemon.x, pokemon.y)), pokemon.draw)]
+    if with_hp:
+        shown_hp = pokemon.hp_bar.update(pokemon.current_hp, pokemon.max_hp)  # Drains smoothly after a hit
+        elements.append(Element(f'{pokemon.name} hp', (shown_hp, pokemon.max_hp),
+                                (pokemon.hp_x, pokemon.hp_y, 200, 50), pokemon.draw_hp))
+    return elements
 
 def draw_highlighted_box(pokemon, game_display):
     '''
@@ -325,15 +352,18 @@ def start_prebattle(player, rival):
     - player (Pokemon): The player's Pokemon.
     - rival (Pokemon): The rival Pokemon.
     Returns:
-    - str: The initial game state ('player_turn').
+    - str: The initial game state ('player_turn', or 'rival_turn' if the rival is faster).
     '''
-    # Set moves for the player and rival Pokémon
-    player.set_moves()
-    rival.set_moves()
+    global damage_table
+    damage_table = battle_engine.DamageTable()  # The moves and stats can change between battles
+    # A new seed for the critical rolls, recorded with the battle so it can be replayed
+    seed = random.getrandbits(64)
+    battle_rng.seed(seed)
+    if replay_log is not None:
+        replay_log.begin(seed, player, rival)
 
     # Start background music at the beginning of the combat
-    pygame.mixer.music.load('PokemonCombatMusic.mp3') 
-    pygame.mixer.music.play(-1)  # Play the music indefinitely
+    music.play(BATTLE_MUSIC)  # Fades in once the selection music has faded out
 
     # Adjust the positions for the pre-battle
     player.x, player.y = 100, game_height - player.image.get_height() - 80
@@ -343,25 +373,17 @@ def start_prebattle(player, rival):
     player.hp_x, player.hp_y = game_width - 210, player.y + 70  
     rival.hp_x, rival.hp_y = rival.x - 160, rival.y + 60    
     
+    # Both sprites were prefetched while the player hovered the starters, nothing is downloaded here
     player.set_sprite('back_default')
     rival.set_sprite('front_default')
 
     display_message(f"A wild {rival.name} appears!")
-    pygame.display.update()
-    clock.tick(3)
-    
-# Introduce a delay with event handling
-    delay_time = 2  # Set the delay time in seconds
-    start_time = pygame.time.get_ticks()
-    while pygame.time.get_ticks() - start_time < delay_time * 1000:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                exit()
-        pygame.time.delay(200)  # Delay in milliseconds for event
+    scheduler.wait(MESSAGE_DELAY)  # The main loop keeps handling events during the delay
 
-    return 'player_turn'
+    # The faster pokemon moves first, the same rule as the simulations
+    return 'rival_turn' if battle_engine.first_mover(player, rival) is rival else 'player_turn'
     
+@telemetry.timed('turn_rival_ms')
 def handle_rival_turn(player_pokemon, rival_pokemon):
     '''
     Handles the turn of the rival Pokemon during battle.
@@ -371,16 +393,23 @@ def handle_rival_turn(player_pokemon, rival_pokemon):
     Returns:
     - str: The next game state ('end_battle' or 'player_turn').
     '''
-    # Rival randomly selects a move
-    selected_move = random.choice(rival_pokemon.moves)
-    rival_pokemon.perform_attack(player_pokemon, selected_move)
+    # The rival searches for its best action (a move or a potion)
+    action = rival_ai.choose(rival_pokemon, player_pokemon)
+    if action == battle_engine.POTION:
+        rival_pokemon.use_potion()
+        display_message(f"{rival_pokemon.name} used a Potion")
+        scheduler.wait(MESSAGE_DELAY)
+    else:
+        rival_pokemon.perform_attack(player_pokemon, action)
     
     if player_pokemon.current_hp <= 0:
+        show_battle_event('faint', {'pokemon': player_pokemon, 'winner': rival_pokemon})
         display_message(f"{player_pokemon.name} fainted! You lost the battle.")
         return 'end_battle'
     else:
         return 'player_turn'
     
+@telemetry.timed('turn_player_ms')
 def handle_player_turn(player_pokemon, rival_pokemon, selected_move):
     '''
     Handles the turn of the player's Pokemon during battle.
@@ -396,6 +425,7 @@ def handle_player_turn(player_pokemon, rival_pokemon, selected_move):
     
     # Check if the rival's Pokemon has fainted
     if rival_pokemon.current_hp <= 0:
+        show_battle_event('faint', {'pokemon': rival_pokemon, 'winner': player_pokemon})
         display_message(f"{rival_pokemon.name} fainted!")
         return 'end_battle'  # This would end the battle if the rival has no more Pokemon
     
@@ -420,6 +450,7 @@ def check_battle_end(player_pokemon, rival_pokemon):
     else:
         return 'player_turn'
 
+@telemetry.timed('frame_ms')
 def draw_game(game_status, pokemons, player_pokemon, rival_pokemon):
     '''
     Draws the game screen based on the current game state.
@@ -429,60 +460,50 @@ def draw_game(game_status, pokemons, player_pokemon, rival_pokemon):
     - player_pokemon (Pokemon): The player's Pokemon.
     - rival_pokemon (Pokemon): The rival's Pokemon.
     '''
-    game.fill(grey)  # Fills the background with grey
+    mouse_cursor = pygame.mouse.get_pos()
+    elements = []
 
-    if game_status == 'select pokemon':
+    if game_status == 'loading':
+        failed = len(loading['failed']) if not loader.busy else 0  # Starters that could not be loaded
+        elements.append(loading_element(loader.completed - loading['since'], loader.submitted - loading['since'],
+                                        failed, len(pokemons) >= 2))
+
+    elif game_status == 'select pokemon':
         highlighted_pokemon = None
         for pokemon in pokemons:
-            pokemon.draw(game)
-            if pokemon.get_rect().collidepoint(pygame.mouse.get_pos()):
+            elements.extend(pokemon_elements(pokemon, with_hp=False))
+            if pokemon.get_rect().collidepoint(mouse_cursor):
                 highlighted_pokemon = pokemon
         if highlighted_pokemon:
-            draw_highlighted_box(highlighted_pokemon, game)
+            elements.append(Element('highlight', (highlighted_pokemon.name,), highlighted_pokemon.get_rect(),
+                                    lambda surface: draw_highlighted_box(highlighted_pokemon, surface)))
     
     elif game_status == 'player_turn':
         # Draw player's and rival's Pokemon and health bars
-        player_pokemon.draw(game)
-        rival_pokemon.draw(game)
-        player_pokemon.draw_hp(game)
-        rival_pokemon.draw_hp(game)
-        # Adjust the button placement and include the number of potions in the label
-        button_y = player_pokemon.y + player_pokemon.image.get_height() + 20  # Adjust this value as needed
-        fight_button = create_button(100, 50, 50, button_y, 100, button_y + 25, "Fight")
-        potion_button = create_button(100, 50, 200, button_y, 250, button_y + 25, f"Potion ({player_pokemon.num_potions})")
+        elements.extend(pokemon_elements(player_pokemon))
+        elements.extend(pokemon_elements(rival_pokemon))
+        if not scheduler.busy:  # The buttons come back once the messages have been read
+            elements.extend(button_element(widget, mouse_cursor) for widget in screen_layout(game_status, player_pokemon).widgets)
     elif game_status == 'select_move':
         # Draw player's and rival's Pokémon and health bars
-        player_pokemon.draw(game)
-        rival_pokemon.draw(game)
-        player_pokemon.draw_hp(game)
-        rival_pokemon.draw_hp(game)
-    
-        # Define the position for the move buttons box
-        move_box_top = game_height - 100 
-        move_box_height = 90  
-    
-        # Draw a background rectangle for the move buttons
-        pygame.draw.rect(game, grey, (0, move_box_top, game_width, move_box_height))
-    
-        # Draw move buttons within the rectangle
-        button_width = 100
-        button_height = 50
-        button_margin = 10  # Space between buttons
-        starting_x = (game_width - (button_width * 4 + button_margin * 3)) / 2  # Center the buttons horizontally
-    
-        for i, move in enumerate(player_pokemon.moves):
-            button_x = starting_x + (button_width + button_margin) * i
-            button_y = move_box_top + (move_box_height - button_height) / 2  # Center the button vertically within the move box
-            create_button(button_width, button_height, button_x, button_y, button_x + button_width / 2, button_y + button_height / 2, move.name.capitalize())
+        elements.extend(pokemon_elements(player_pokemon))
+        elements.extend(pokemon_elements(rival_pokemon))
+        # The move buttons sit in a box at the bottom (the box has the same grey as the background)
+        elements.extend(button_element(widget, mouse_cursor) for widget in screen_layout(game_status, player_pokemon).widgets)
 
-    elif game_status in ['prebattle', 'rival_turn', 'end_battle']:
+    elif game_status in ['prebattle', 'rival_turn', 'end_battle', 'gameover']:
         # Draw player's and rival's Pokemon and health bars
-        player_pokemon.draw(game)
-        rival_pokemon.draw(game)
-        player_pokemon.draw_hp(game)
-        rival_pokemon.draw_hp(game)
+        elements.extend(pokemon_elements(player_pokemon))
+        elements.extend(pokemon_elements(rival_pokemon))
+
+    if message_box['text'] is not None:
+        if scheduler.busy or game_status == 'gameover':
+            elements.append(message_element(message_box['text']))
+        else:
+            message_box['text'] = None  # Read, the next frame restores what was under it
     
-    pygame.display.update()
+    # Only the areas that changed since the last frame are drawn and sent to the display
+    renderer.render(elements)
 
 initial_positions = {
     'Bulbasaur': (25, 150),
@@ -500,112 +521,245 @@ def reset_game(pokemons, initial_positions, initial_num_potions):
     - initial_positions (dict): A dictionary mapping Pokemon names to their initial positions.
     - initial_num_potions (int): The initial number of potions for a new game.
     '''
-     # Stop any playing music
-    pygame.mixer.music.stop()
+    # The selection music fades in again from the main loop, nothing is stopped or reloaded here
     for pokemon_name, position in initial_positions.items():
         for pokemon in pokemons:
             if pokemon.name.lower() == pokemon_name.lower():
                 pokemon.x, pokemon.y = position
                 pokemon.current_hp = pokemon.max_hp
+                pokemon.hp_bar.reset()
                 pokemon.num_potions = initial_num_potions
                 pokemon.set_sprite('front_default')
+                load_moves(pokemon)  # New moves for the next battle, picked in the background
 
-# Initialize pokemons
-level = 30
-bulbasaur = Pokemon('Bulbasaur', level, 25, 150)
-charmander = Pokemon('Charmander', level, 175, 150)
-squirtle = Pokemon('Squirtle', level, 325, 150)
-pokemons = [bulbasaur, charmander, squirtle]    
-player_pokemon = None
-rival_pokemon = None
-game_status = 'select pokemon'
-
-# Set moves for each Pokemon
-for pokemon in pokemons:
-    pokemon.set_moves()
-
-last_click_time = 0  # Time of the last mouse click
-
-# Main loop that runs the game
-while game_status != 'quit':
-    for event in pygame.event.get():
-        if event.type == QUIT:
-            game_status = 'quit'
-        elif event.type == KEYDOWN:
-            if event.key == K_y and game_status == 'gameover':
-                reset_game(pokemons, initial_positions, initial_num_potions)
-                game_status = 'select pokemon'
-                game.fill(white)
-                pygame.display.update()
-            elif event.key == K_n and game_status == 'gameover':
-                game_status = 'quit'
+def fetch_starter(name, level):
+    '''
+    Fetches the data of a starter, runs on a loader thread
+    Arguments:
+    - name(str): the name of the pokemon
+    - level(int): the level of the pokemon
+    Returns:
+    - list of Move: the moves picked for the pokemon
+    '''
+    species = load_species(name)
+    if species is None:
+        raise ValueError(f'Failed to retrieve data for {name}')
+    Pokemon.get_sprites().get_bytes(species.sprites['front_default'])  # On disk for the main thread to decode
+    return choose_moves(species.move_urls(level))
 
-        elif event.type == MOUSEBUTTONDOWN:
-            current_time = pygame.time.get_ticks()  # Get the current time in milliseconds
-            if current_time - last_click_time > 500:  # Check if 500 milliseconds have passed since the last click
-                last_click_time = current_time  # Update the last click time
-
-                mouse_click = event.pos
-                if game_status == 'select pokemon':
-                    for pokemon in pokemons:
-                        if pokemon.get_rect().collidepoint(mouse_click):
-                            player_pokemon = pokemon
-                            rival_pokemon = random.choice([p for p in pokemons if p != player_pokemon])
-                            game_status = start_prebattle(player_pokemon, rival_pokemon)
-                elif game_status == 'player_turn':
-                    button_y = player_pokemon.y + player_pokemon.image.get_height() + 20
-                    fight_button = create_button(100, 50, 50, button_y, 100, button_y + 25, "Fight")
-                    potion_button = create_button(100, 50, 200, button_y, 250, button_y + 25, f"Use Potion ({player_pokemon.num_potions})")
-
-                    if fight_button.collidepoint(mouse_click):
-                        game_status = 'select_move'
-                    elif potion_button.collidepoint(mouse_click) and player_pokemon.num_potions > 0:
-                        player_pokemon.use_potion()
-                        draw_game(game_status, pokemons, player_pokemon, rival_pokemon)
-
-                elif game_status == 'select_move':
-                    move_box_top = game_height - 100
-                    move_box_height = 90
-                    button_width = 100
-                    button_height = 50
-                    button_margin = 10
-                    starting_x = (game_width - (button_width * 4 + button_margin * 3)) / 2
-
-                    move_buttons = []
-                    for i, move in enumerate(player_pokemon.moves):
-                        button_x = starting_x + (button_width + button_margin) * i
-                        button_y = move_box_top + (move_box_height - button_height) / 2
-                        button = create_button(button_width, button_height, button_x, button_y, button_x + button_width / 2, button_y + button_height / 2, move.name.capitalize())
-                        move_buttons.append((button, move))
-
-                    for button, move in move_buttons:
-                        if button.collidepoint(mouse_click):
-                            game_status = handle_player_turn(player_pokemon, rival_pokemon, move)
-                            break
-
-    if game_status == 'select pokemon' and not pygame.mixer.music.get_busy():
-        # Start selection music only if it's not already playing
-        pygame.mixer.music.load('Intro.mp3')  
-        pygame.mixer.music.play(-1)  # makes the music loop indefinitely
-
-    if game_status == 'rival_turn':
-        game_status = handle_rival_turn(player_pokemon, rival_pokemon)
-        time.sleep(1.5)
-
-    if game_status == 'end_battle':
-        # Ending music
-        pygame.mixer.music.load('PokemonEndMusic.mp3') 
-        pygame.mixer.music.play(-1)  # Play the music indefinitely
-        game_status = check_battle_end(player_pokemon, rival_pokemon)
-        time.sleep(1.5)
-
-    if game_status == 'gameover':
-
-        display_message("Game Over! Press 'Y' to play again, 'N' to quit")
-        pygame.display.update()
-        continue
-
-    draw_game(game_status, pokemons, player_pokemon, rival_pokemon)
-    clock.tick(60)
-
-pygame.quit()
\ No newline at end of file
+def start_loading():
+    '''
+    Starts a loading phase, its progress only counts the jobs delivered from now on
+    '''
+    loading['since'] = loader.completed
+    loading['failed'] = []
+
+def load_starters(pokemons, positions, level, names=None):
+    '''
+    Starts loading the starters in the background, each one is added to the list once loaded
+    The names of the starters that could not be loaded are kept in loading['failed'].
+    Arguments:
+    - pokemons (list): the list the loaded Pokemon objects are added to
+    - positions (dict): A dictionary mapping Pokemon names to their initial positions.
+    - level(int): the level of the pokemons
+    - names (list): the starters to load, all of them if None
+    '''
+    def add_starter(name, moves):
+        pokemon = Pokemon(name, level, *positions[name])  # Decodes the sprite, so it runs on the main thread
+        pokemon.moves = moves
+        pokemons.append(pokemon)
+        pokemons.sort(key=lambda p: p.x)
+    def report_error(name, error):
+        print(f"Failed to load {name}: {error}")
+        loading['failed'].append(name)
+    for name in positions if names is None else names:
+        loader.submit(fetch_starter, name, level,
+                      on_done=lambda moves, name=name: add_starter(name, moves),
+                      on_error=lambda error, name=name: report_error(name, error))
+
+def load_moves(pokemon):
+    '''
+    Picks new moves for a pokemon in the background, it keeps its current moves until then
+    The game stays on the loading screen until the moves are set, so they never change during a battle.
+    Arguments:
+    - pokemon (Pokemon): the pokemon
+    '''
+    def set_moves(moves):
+        pokemon.moves = moves
+    def report_error(error):
+        print(f"Error setting moves: {error}")
+    loader.submit(choose_moves, pokemon.species.move_urls(pokemon.level), on_done=set_moves, on_error=report_error)
+
+def prefetch_battle_sprites(player, pokemons):
+    '''
+    Prefetches the sprites a battle needs while the player is still choosing
+    The rivals are drawn with the same front sprite as on the selection screen, which
+    is already decoded, so only the back sprite of the hovered pokemon is fetched.
+    Arguments:
+    - player (Pokemon): the hovered pokemon
+    - pokemons (list): The list of Pokemon objects.
+    '''
+    targets = [(player, 'back_default')] + [(pokemon, 'front_default') for pokemon in pokemons if pokemon is not player]
+    for pokemon, side in targets:
+        key = (pokemon.name.lower(), side, pokemon.size)
+        if key in prefetched:
+            continue
+        prefetched.add(key)
+        url = pokemon.species.sprites[side]
+        # The file is fetched on a worker thread, then decoded and scaled on the main thread
+        loader.submit(Pokemon.get_sprites().get_bytes, url,
+                      on_done=lambda data, key=key, url=url, size=pokemon.size: Pokemon.get_sprites().get_surface(key, url, size))
+
+def loading_element(done, total, failed, can_continue=False):
+    '''
+    Describes the loading screen for the renderer
+    Arguments:
+    - done(int): number of loading jobs over in this loading phase
+    - total(int): number of loading jobs in this loading phase
+    - failed(int): number of pokemons that could not be loaded
+    - can_continue(bool): whether enough pokemons were loaded to play without the others
+    Returns:
+    - Element: the progress bar and its text
+    '''
+    rect = Rect(100, 220, 300, 80)
+    def draw(surface):
+        if failed:
+            text = f"Failed to load {failed} pokemon(s), click to retry"
+            if can_continue:
+                surface.blit(text_cache.render("or press Enter to play without them", 16, black), (rect.x, rect.y + 60))
+        else:
+            text = f"Loading pokemons... {done} / {total}"
+        surface.blit(text_cache.render(text, 16, black), (rect.x, rect.y))
+        pygame.draw.rect(surface, white, (rect.x, rect.y + 30, rect.width, 20))
+        if total:
+            pygame.draw.rect(surface, green, (rect.x, rect.y + 30, rect.width * done // total, 20))
+        pygame.draw.rect(surface, black, (rect.x, rect.y + 30, rect.width, 20), 2)
+    return Element('loading', (done, total, failed, can_continue), rect, draw)
+
+def main():
+    '''
+    Runs the game until the window is closed
+    '''
+    global replay_log
+    profiler = configure_telemetry()  # POKEMON_TELEMETRY and POKEMON_PROFILE turn the measurements on
+    init_display()
+    clock = pygame.time.Clock()
+    if DEFAULT_REPLAY_PATH:  # POKEMON_REPLAY_LOG= turns the recording off
+        replay_log = ReplayWriter(DEFAULT_REPLAY_PATH)
+
+    # Sprites also come from the offline data bundle when it has been built (python bundle.py)
+    Pokemon.get_sprites().bundle = APIManager.get_bundle()
+
+    music.preload(INTRO_MUSIC, BATTLE_MUSIC, END_MUSIC)
+
+    # Initialize pokemons (the window shows a loading screen while they are fetched)
+    level = 30
+    pokemons = []
+    start_loading()
+    load_starters(pokemons, initial_positions, level)
+    player_pokemon = None
+    rival_pokemon = None
+    game_status = 'loading'
+    started = False  # Whether the starters could be picked once already
+
+    last_click_time = 0  # Time of the last mouse click
+    game_over_shown = False  # The game over message only has to be drawn once
+
+    # Main loop that runs the game
+    while game_status != 'quit':
+        scheduler.update(pygame.time.get_ticks())  # Runs the timeline events that are due
+        loader.poll()  # Hands what the loading threads fetched to the main thread
+        if game_status == 'loading' and not loader.busy and not loading['failed']:
+            game_status = 'select pokemon'
+            if not started:
+                started = True
+                telemetry.observe('startup_ms', pygame.time.get_ticks())  # From pygame.init until the starters can be picked
+
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                game_status = 'quit'
+            elif event.type == MOUSEMOTION and game_status == 'select pokemon':
+                for pokemon in pokemons:
+                    if pokemon.get_rect().collidepoint(event.pos):
+                        prefetch_battle_sprites(pokemon, pokemons)
+            elif event.type == KEYDOWN:
+                if event.key == K_y and game_status == 'gameover':
+                    start_loading()
+                    reset_game(pokemons, initial_positions, initial_num_potions)
+                    # The new moves are picked in the background, they must be in place before a battle starts
+                    game_status = 'loading'
+                    scheduler.clear()
+                    message_box['text'] = None
+                    game.fill(white)
+                    pygame.display.update()
+                    renderer.invalidate()
+                    game_over_shown = False
+                elif event.key == K_n and game_status == 'gameover':
+                    game_status = 'quit'
+                elif event.key == K_RETURN and game_status == 'loading' and not loader.busy and len(pokemons) >= 2:
+                    loading['failed'] = []  # Plays with the starters that could be loaded
+
+            elif event.type == MOUSEBUTTONDOWN and not scheduler.busy:  # Clicks are ignored while messages are read
+                current_time = pygame.time.get_ticks()  # Get the current time in milliseconds
+                if current_time - last_click_time > 500:  # Check if 500 milliseconds have passed since the last click
+                    last_click_time = current_time  # Update the last click time
+
+                    mouse_click = event.pos
+                    if game_status == 'loading' and loading['failed'] and not loader.busy:
+                        # Tries the starters that failed again
+                        names = loading['failed']
+                        start_loading()
+                        load_starters(pokemons, initial_positions, level, names)
+                    elif game_status == 'select pokemon':
+                        for pokemon in pokemons:
+                            if pokemon.get_rect().collidepoint(mouse_click):
+                                player_pokemon = pokemon
+                                rival_pokemon = random.choice([p for p in pokemons if p != player_pokemon])
+                                game_status = start_prebattle(player_pokemon, rival_pokemon)
+                    elif game_status in ('player_turn', 'select_move'):
+                        # Hit-tested against the layout that was drawn, nothing is drawn here
+                        button = screen_layout(game_status, player_pokemon).hit(mouse_click)
+                        if button is None:
+                            pass
+                        elif button.action == 'fight':
+                            game_status = 'select_move'
+                        elif button.action == 'potion':
+                            if player_pokemon.num_potions > 0:
+                                player_pokemon.use_potion()
+                        else:
+                            game_status = handle_player_turn(player_pokemon, rival_pokemon, button.action)
+
+        if game_status == 'select pokemon':
+            music.play(INTRO_MUSIC)  # Does nothing if it is already playing
+        music.update()  # Starts the next track once the previous one has faded out
+
+        # The next step of the battle only happens once the current messages have been read
+        if game_status == 'rival_turn' and not scheduler.busy:
+            game_status = handle_rival_turn(player_pokemon, rival_pokemon)
+            scheduler.wait(TURN_DELAY)
+
+        if game_status == 'end_battle' and not scheduler.busy:
+            music.play(END_MUSIC)  # Ending music
+            game_status = check_battle_end(player_pokemon, rival_pokemon)
+            scheduler.wait(TURN_DELAY)
+
+        if game_status == 'gameover' and not game_over_shown and not scheduler.busy:
+            display_message("Game Over! Press 'Y' to play again, 'N' to quit")
+            game_over_shown = True
+
+        draw_game(game_status, pokemons, player_pokemon, rival_pokemon)
+        telemetry.observe('frame_interval_ms', clock.tick(60))  # Stalls show up as long intervals
+        telemetry.maybe_flush()
+
+    if replay_log is not None:
+        replay_log.close()
+    loader.shutdown()
+    if APIManager.cache is not None:
+        APIManager.cache.close()  # Writes the access times of this session
+    pygame.quit()
+    telemetry.close()
+    if profiler is not None:
+        profiler.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+'''
+Search based opponent
+Looks ahead over the possible attacks and potions of both pokemon with an
+expectiminimax search: the AI picks its best action, assumes the opponent picks the
+action that is worst for the AI, and averages over the critical hit roll of every
+attack with the same damage numbers as battle_engine. Like in the game, the player's
+potion does not use up its turn while the rival's potion does, so a potion drunk by
+the player's side is followed by another action of the same side.
+
+A position only depends on the HP and potions of both pokemon and on whose turn it
+is, so positions are packed into an int and their values kept in a transposition
+table shared by all the decisions of a battle. The search deepens one ply at a time
+until the maximum depth or the time budget is reached, so a decision never takes
+much longer than the budget.
+'''
+import math
+import time
+import battle_engine
+
+CRIT_PROBABILITY = battle_engine.CRIT_CHANCE / 10000
+WIN = 1000.0  # Value of a won position, far above any evaluation
+
+class SearchTimeout(Exception):
+    '''
+    Raised inside the search when the time budget is used up
+    '''
+
+class ExpectimaxAI:
+    '''
+    Represents an opponent that chooses its actions by searching ahead
+    Can be used as a battle_engine policy: ai(battle, pokemon, opponent).
+    Attributes:
+    - max_depth(int): the deepest search, in actions (plies)
+    - time_budget(float): seconds a decision may take, None for no limit (always searches to max_depth)
+    - max_entries(int): the transposition table is cleared when it grows past this size
+    - nodes(int): positions searched
+    - hits(int): positions whose value was found in the transposition table
+    - depth_reached(int): depth of the last completed search
+    - timed_out(bool): whether the last decision was cut short by the time budget
+    '''
+    def __init__(self, max_depth=6, time_budget=0.005, max_entries=200000):
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.max_entries = max_entries
+        self.nodes = 0
+        self.hits = 0
+        self.depth_reached = 0
+        self.timed_out = False
+        self._table = {}
+        self._signature = None
+        self._deadline = None
+
+    def __call__(self, battle, pokemon, opponent):
+        return self.choose(pokemon, opponent, pokemon is battle.player)
+
+    def _prepare(self, pokemon, opponent, player):
+        '''
+        Computes the damage numbers of both pokemon, and clears the table when they change
+        Positions are valued the same way for any two pokemon with the same damage numbers
+        and max HP, so the table is kept from one battle to the next between the same pokemon.
+        Arguments:
+        - pokemon(pokemon): the pokemon controlled by the AI
+        - opponent(pokemon): the pokemon it is fighting
+        - player(bool): whether the AI plays the player's side
+        '''
+        damages = (_damages(pokemon, opponent), _damages(opponent, pokemon))
+        max_hp = (pokemon.max_hp, opponent.max_hp)
+        free_potion = 0 if player else 1  # The side whose potion does not use up its turn
+        if (damages, max_hp, free_potion) == self._signature:
+            return
+        self._signature = (damages, max_hp, free_potion)
+        self._table.clear()
+        self._damages = damages
+        self._max_hp = max_hp
+        self._free_potion = free_potion
+
+    def choose(self, pokemon, opponent, player=False):
+        '''
+        Chooses the action of a pokemon
+        Arguments:
+        - pokemon(pokemon): the pokemon controlled by the AI
+        - opponent(pokemon): the pokemon it is fighting
+        - player(bool): whether the AI plays the player's side instead of the rival's (like in the game)
+        Returns:
+        - a Move to attack with, or battle_engine.POTION
+        '''
+        self._prepare(pokemon, opponent, player)
+        actions = self._actions(0, pokemon.current_hp, pokemon.num_potions)
+        if not actions:
+            return pokemon.moves[0]
+        if len(actions) == 1:
+            return self._to_action(pokemon, actions[0])
+        self._deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        self.depth_reached = 0  # The first depth is always completed, whatever the budget
+        self.timed_out = False
+        best = actions[0]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                best = self._root(actions, pokemon.current_hp, opponent.current_hp,
+                                  pokemon.num_potions, opponent.num_potions, depth)
+            except SearchTimeout:
+                self.timed_out = True
+                break  # Keep the action of the last completed depth
+            self.depth_reached = depth
+        if len(self._table) > self.max_entries:
+            self._table.clear()
+        return self._to_action(pokemon, best)
+
+    def _to_action(self, pokemon, action):
+        return battle_engine.POTION if action is None else pokemon.moves[action[2]]
+
+    def _actions(self, side, hp, potions):
+        '''
+        Lists the actions worth searching for a side
+        Arguments:
+        - side(int): 0 for the AI, 1 for its opponent
+        - hp(int): HP of the side
+        - potions(int): potions left to the side
+        Returns:
+        - list of (damage, critical damage, move index) for the attacks with different damage, and None for the potion
+        '''
+        actions = list(self._damages[side])
+        if potions > 0 and hp < self._max_hp[side]:
+            actions.append(None)
+        return actions
+
+    def _root(self, actions, hp, other_hp, potions, other_potions, depth):
+        '''
+        Searches every action of the AI to a depth
+        Returns:
+        - the best action
+        '''
+        best, best_value = actions[0], -math.inf
+        for action in actions:
+            value = self._after(0, action, hp, other_hp, potions, other_potions, depth)
+            if value > best_value:
+                best, best_value = action, value
+        return best
+
+    def _after(self, side, action, hp, other_hp, potions, other_potions, depth):
+        '''
+        Values the position after an action, averaging over the critical roll
+        Arguments:
+        - side(int): the side taking the action
+        - action: (damage, critical damage, move index), or None for the potion
+        - hp(int): HP of the side acting
+        - other_hp(int): HP of the other side
+        - potions(int): potions of the side acting
+        - other_potions(int): potions of the other side
+        - depth(int): plies left to search after the action
+        Returns:
+        - float: the value for the AI
+        '''
+        if action is None:
+            healed = min(hp + battle_engine.POTION_HEAL, self._max_hp[side])
+            if side == self._free_potion:
+                return self._value(side, healed, other_hp, potions - 1, other_potions, depth - 1)  # Acts again
+            return self._value(1 - side, other_hp, healed, other_potions, potions - 1, depth - 1)
+        damage, critical, _ = action
+        normal = self._value(1 - side, max(0, other_hp - damage), hp, other_potions, potions, depth - 1)
+        if critical == damage:
+            return normal
+        crit = self._value(1 - side, max(0, other_hp - critical), hp, other_potions, potions, depth - 1)
+        return normal + CRIT_PROBABILITY * (crit - normal)
+
+    def _value(self, side, hp, other_hp, potions, other_potions, depth):
+        '''
+        Values a position where a side is about to act
+        Arguments:
+        - side(int): the side about to act, 0 for the AI
+        - hp(int): HP of that side
+        - other_hp(int): HP of the other side
+        - potions(int): potions of that side
+        - other_potions(int): potions of the other side
+        - depth(int): plies left to search
+        Returns:
+        - float: the value for the AI
+        '''
+        if side:
+            hp, other_hp, potions, other_potions = other_hp, hp, other_potions, potions  # From the AI's side
+        if other_hp <= 0:
+            return WIN
+        if hp <= 0:
+            return -WIN
+        if depth <= 0:
+            return (hp / self._max_hp[0] - other_hp / self._max_hp[1]
+                    + battle_engine.POTION_HEAL * 0.5 * (potions / self._max_hp[0] - other_potions / self._max_hp[1]))
+        key = ((((hp << 16 | other_hp) << 8 | potions) << 8 | other_potions) << 1 | side)
+        entry = self._table.get(key)
+        if entry is not None and entry[0] >= depth:
+            self.hits += 1
+            return entry[1]
+        self.nodes += 1
+        if self._deadline is not None and not self.nodes & 63 and time.perf_counter() > self._deadline and self.depth_reached:
+            raise SearchTimeout()
+        if side:
+            best = math.inf
+            for action in self._actions(1, other_hp, other_potions):
+                best = min(best, self._after(1, action, other_hp, hp, other_potions, potions, depth))
+        else:
+            best = -math.inf
+            for action in self._actions(0, hp, potions):
+                best = max(best, self._after(0, action, hp, other_hp, potions, other_potions, depth))
+        self._table[key] = (depth, best)
+        return best
+
+    def stats(self):
+        '''
+        Returns the search counters
+        Returns:
+        - dictionary with the nodes searched, the table hits, the hit rate and the table size
+        '''
+        lookups = self.nodes + self.hits
+        return {'nodes': self.nodes, 'hits': self.hits, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._table)}
+
+def _damages(attacker, defender):
+    '''
+    Computes the damage of each of the attacker's moves, keeping one move per damage numbers
+    Arguments:
+    - attacker(pokemon): the pokemon attacking
+    - defender(pokemon): the pokemon hit
+    Returns:
+    - tuple of (damage, critical damage, move index), strongest first
+    '''
+    damages = {}
+    for index, move in enumerate(attacker.moves):
+        if move.power is None:
+            continue
+        coefficient = battle_engine.damage_coefficient(attacker, defender, move)
+        key = (math.floor(coefficient), math.floor(coefficient * battle_engine.CRIT_MULTIPLIER))
+        damages.setdefault(key, key + (index,))
+    return tuple(sorted(damages.values(), reverse=True))
@@ -0,0 +1,241 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'POKEAPI_CACHE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pokeapi_cache.sqlite'))
+DEFAULT_TTL = 7 * 24 * 3600  # PokeAPI data is effectively static, a week is plenty
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+SCHEMA_VERSION = 1  # Stored in PRAGMA user_version, 1 added the ETag and Last-Modified validators
+ACCESS_FLUSH_HITS = 256  # Access times kept in memory before they are written, so reads never commit
+
+class CacheEntry:
+    '''
+    Represents a cached response with what is needed to revalidate it
+    Attributes:
+    - data: the decoded JSON data
+    - fresh(bool): False once the entry is older than the cache ttl
+    - etag(str): the ETag the server sent with it, None if none
+    - last_modified(str): the Last-Modified the server sent with it, None if none
+    '''
+    __slots__ = ('data', 'fresh', 'etag', 'last_modified')
+
+    def __init__(self, data, fresh, etag=None, last_modified=None):
+        self.data = data
+        self.fresh = fresh
+        self.etag = etag
+        self.last_modified = last_modified
+
+class ResponseCache:
+    '''
+    Represents a persistent, size-bounded cache of API responses keyed by URL
+    Entries are stored as zlib-compressed JSON in a SQLite file and evicted
+    least-recently-used first once the total size goes over max_bytes. Lookups only read:
+    the access times they update are kept in memory and written with the next put, every
+    ACCESS_FLUSH_HITS lookups and on close.
+    Attributes:
+    - path(str): the location of the SQLite file (':memory:' for a throwaway cache)
+    - ttl(float): seconds an entry stays fresh, None means entries never expire
+    - max_bytes(int): upper bound for the total size of the stored bodies
+    - offline(bool): if True, the APIManager serves purely from the cache
+    - hits(int): number of lookups answered from the cache
+    - misses(int): number of lookups that were not in the cache (or expired)
+    - evictions(int): number of entries removed to respect max_bytes
+    '''
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None  # Opened lazily so creating a cache never touches the disk
+        self._total_bytes = 0
+        self._accessed = {}  # url -> last access time not written to the database yet
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        '''
+        Opens the database on first use and creates the table if needed
+        Returns:
+        - sqlite3.Connection: the open connection
+        '''
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._migrate(self._conn)
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            self._total_bytes = total
+        return self._conn
+
+    def _migrate(self, conn):
+        '''
+        Creates the table, or upgrades a cache file written by an older version
+        The schema version is kept in PRAGMA user_version, so existing entries are kept.
+        Arguments:
+        - conn(sqlite3.Connection): the open connection
+        '''
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise ValueError(f'{self.path} was written by a newer version (schema {version})')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, '
+            'stored_at REAL NOT NULL, last_access REAL NOT NULL, etag TEXT, last_modified TEXT)')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(responses)')}
+        if version < 1 and 'etag' not in columns:
+            conn.execute('ALTER TABLE responses ADD COLUMN etag TEXT')
+            conn.execute('ALTER TABLE responses ADD COLUMN last_modified TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)')
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+
+    def get(self, url, allow_stale=False):
+        '''
+        Gets a cached response by URL
+        Arguments:
+        - url(str): the url the response was fetched from
+        - allow_stale(bool): if True, expired entries are still returned
+        Returns:
+        - the decoded JSON data, or None if the url is not cached (or expired)
+        '''
+        entry = self.get_entry(url)
+        if entry is None or not (entry.fresh or allow_stale):
+            return None
+        return entry.data
+
+    def get_entry(self, url):
+        '''
+        Gets a cached response by URL, expired or not, with its validators
+        Only fresh entries count as hits.
+        Arguments:
+        - url(str): the url the response was fetched from
+        Returns:
+        - CacheEntry: the entry, or None if the url is not cached
+        '''
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT body, stored_at, etag, last_modified FROM responses WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            fresh = self.ttl is None or now - row[1] <= self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._accessed[url] = now
+            if len(self._accessed) >= ACCESS_FLUSH_HITS:
+                self._write_access(conn)
+                conn.commit()
+        return CacheEntry(json.loads(zlib.decompress(row[0])), fresh, row[2], row[3])
+
+    def put(self, url, data, etag=None, last_modified=None):
+        '''
+        Stores a response in the cache, evicting old entries if the cache is full
+        Arguments:
+        - url(str): the url the response was fetched from
+        - data: the JSON-serializable response data
+        - etag(str): the ETag header of the response, to revalidate it later
+        - last_modified(str): the Last-Modified header of the response
+        '''
+        body = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        size = len(body)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # Would evict everything else and still not fit
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            self._write_access(conn)  # The eviction order needs the latest access times
+            self._accessed.pop(url, None)
+            conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (url, body, size, now, now, etag, last_modified))
+            self._evict(conn)
+            conn.commit()
+
+    def revalidated(self, url, etag=None, last_modified=None):
+        '''
+        Marks an entry as fresh again after the server answered 304 Not Modified
+        Arguments:
+        - url(str): the url of the entry
+        - etag(str): the ETag sent with the 304, keeps the stored one if None
+        - last_modified(str): the Last-Modified sent with the 304, keeps the stored one if None
+        '''
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            self._accessed.pop(url, None)
+            conn.execute('UPDATE responses SET stored_at = ?, last_access = ?, etag = COALESCE(?, etag), '
+                         'last_modified = COALESCE(?, last_modified) WHERE url = ?', (now, now, etag, last_modified, url))
+            conn.commit()
+
+    def _write_access(self, conn):
+        '''
+        Writes the access times kept in memory, without committing
+        Arguments:
+        - conn(sqlite3.Connection): the open connection (the lock must be held)
+        '''
+        if self._accessed:
+            conn.executemany('UPDATE responses SET last_access = ? WHERE url = ?',
+                             [(accessed, url) for url, accessed in self._accessed.items()])
+            self._accessed.clear()
+
+    def _evict(self, conn):
+        '''
+        Removes least recently used entries until the cache fits in max_bytes
+        The total size is read again first: other processes (tournament workers, the battle
+        server) may have added or removed entries in the same file since it was last read.
+        Arguments:
+        - conn(sqlite3.Connection): the open connection, inside the write transaction (the lock must be held)
+        '''
+        self._total_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if self.max_bytes is None:
+            return
+        while self._total_bytes > self.max_bytes:
+            row = conn.execute('SELECT url, size FROM responses ORDER BY last_access LIMIT 1').fetchone()
+            if row is None:
+                self._total_bytes = 0
+                break
+            url, size = row
+            conn.execute('DELETE FROM responses WHERE url = ?', (url,))
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        '''
+        Removes every entry from the cache and resets the counters
+        '''
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM responses')
+            conn.commit()
+            self._accessed.clear()
+            self._total_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        '''
+        Returns the cache counters
+        Returns:
+        - dictionary with hits, misses, evictions, entries and bytes
+        '''
+        with self._lock:
+            entries = self._connect().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': entries, 'bytes': self._total_bytes}
+
+    def close(self):
+        '''
+        Writes the pending access times and closes the underlying database connection
+        '''
+        with self._lock:
+            if self._conn is not None:
+                self._write_access(self._conn)
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
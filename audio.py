@@ -0,0 +1,138 @@
+'''
+Background music
+The music files are read on loader threads and kept in memory, so switching tracks
+never waits on the disk. Switching fades the current track out and the next one in,
+and a track that is already playing is left alone instead of being reloaded.
+'''
+import io
+import os
+import pygame
+
+MUSIC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def read_file(path):
+    '''
+    Reads a whole file, runs on a loader thread
+    Arguments:
+    - path(str): the file to read
+    Returns:
+    - bytes: the content of the file
+    '''
+    with open(path, 'rb') as file:
+        return file.read()
+
+class MusicManager:
+    '''
+    Represents the music player of the game
+    Attributes:
+    - directory(str): the folder of the music files
+    - loader(Loader): runs the file reads off the main thread
+    - fade_ms(int): length of the fade out and fade in between two tracks
+    - current(str): the track playing, None if none
+    - pending(str): the track to play once the current one has faded out and the file is read
+    - missing(set): tracks whose file could not be read (reported once)
+    - loads(int): number of tracks handed to the mixer
+    '''
+    def __init__(self, loader, directory=MUSIC_DIR, fade_ms=500):
+        self.loader = loader
+        self.directory = directory
+        self.fade_ms = fade_ms
+        self.current = None
+        self.pending = None
+        self.missing = set()
+        self.loads = 0
+        self._tracks = {}  # Content of the files read so far, by track name
+        self._reading = set()
+
+    @property
+    def enabled(self):
+        '''
+        Whether music can be played (the mixer could be initialized)
+        Returns:
+        - bool: True if the mixer is ready
+        '''
+        return pygame.mixer.get_init() is not None
+
+    def preload(self, *names):
+        '''
+        Starts reading music files in the background
+        Arguments:
+        - names(str): the file names of the tracks, in the music folder
+        '''
+        for name in names:
+            if name in self._tracks or name in self._reading or name in self.missing:
+                continue
+            self._reading.add(name)
+            self.loader.submit(read_file, os.path.join(self.directory, name),
+                               on_done=lambda data, name=name: self._read(name, data),
+                               on_error=lambda error, name=name: self._failed(name, error))
+
+    def _read(self, name, data):
+        '''
+        Keeps the content of a file read by the loader
+        Arguments:
+        - name(str): the track
+        - data(bytes): the content of its file
+        '''
+        self._reading.discard(name)
+        self._tracks[name] = data
+        self.update()
+
+    def _failed(self, name, error):
+        '''
+        Reports a file the loader could not read, the game goes on without that track
+        Arguments:
+        - name(str): the track
+        - error(Exception): the error raised while reading the file
+        '''
+        self._reading.discard(name)
+        self.missing.add(name)
+        if isinstance(error, FileNotFoundError):
+            print(f"Music file not found: {name}, playing without it")
+        else:
+            print(f"Failed to read music file {name}: {error}")
+        if self.pending == name:
+            self.pending = None
+
+    def play(self, name):
+        '''
+        Switches to a track, looping it until the next switch
+        Nothing happens if the track is already playing or about to.
+        Arguments:
+        - name(str): the file name of the track
+        '''
+        if name in (self.current, self.pending) or not self.enabled:
+            return
+        self.stop()
+        if name not in self.missing:
+            self.pending = name
+            self.preload(name)
+            self.update()
+
+    def stop(self):
+        '''
+        Fades out the current track (without waiting for the fade to end)
+        '''
+        self.pending = None
+        if self.current is not None and self.enabled:
+            pygame.mixer.music.fadeout(self.fade_ms)
+        self.current = None
+
+    def update(self):
+        '''
+        Starts the pending track once its file is read and the previous track has faded out,
+        called once per frame by the game loop
+        '''
+        name = self.pending
+        if name is None or name not in self._tracks or not self.enabled or pygame.mixer.music.get_busy():
+            return
+        self.pending = None
+        try:
+            pygame.mixer.music.load(io.BytesIO(self._tracks[name]), os.path.splitext(name)[1][1:])
+            pygame.mixer.music.play(-1, fade_ms=self.fade_ms)
+        except pygame.error as error:
+            self.missing.add(name)
+            print(f"Failed to play music file {name}: {error}")
+            return
+        self.loads += 1
+        self.current = name
@@ -0,0 +1,130 @@
+'''
+Vectorized Monte Carlo battle simulator
+Plays many battles at once as NumPy arrays, using the same rules as battle_engine:
+the faster pokemon acts first, both sides pick a random move every turn (no potions), the
+damage formula includes the same type attack bonus, the type effectiveness and the
+625/10000 critical roll.
+Requires numpy (pip3 install numpy).
+'''
+import numpy as np
+import battle_engine
+
+MAX_MOVES = 4
+
+def move_coefficients(attacker, defender):
+    '''
+    Calculates the damage of each of the attacker's moves before the critical roll
+    Uses battle_engine.damage_coefficient so the results are bit for bit identical
+    to the scalar engine.
+    Arguments:
+    - attacker(pokemon): the pokemon using the moves
+    - defender(pokemon): the pokemon receiving them
+    Returns:
+    - list of floats, one per move
+    '''
+    return [battle_engine.damage_coefficient(attacker, defender, move) for move in attacker.moves[:MAX_MOVES]]
+
+def _side_arrays(attacker, defender, battles):
+    '''
+    Builds the per battle arrays for one side of a matchup
+    Arguments:
+    - attacker(pokemon): the pokemon of this side
+    - defender(pokemon): the pokemon it fights
+    - battles(int): number of battles
+    Returns:
+    - tuple (hp, coefficients, num_moves) of arrays with one row per battle
+    '''
+    coefficients = move_coefficients(attacker, defender)
+    if not coefficients:
+        raise ValueError(f'{attacker.name} has no moves to fight with')
+    padded = np.zeros((battles, MAX_MOVES))
+    padded[:, :len(coefficients)] = coefficients
+    hp = np.full(battles, attacker.max_hp, dtype=np.int64)
+    num_moves = np.full(battles, len(coefficients), dtype=np.int64)
+    return hp, padded, num_moves
+
+def _attack(rng, coefficients, num_moves, active):
+    '''
+    Rolls one attack for every active battle
+    Arguments:
+    - rng(numpy.random.Generator): the random number generator
+    - coefficients(numpy.ndarray): damage of each move before the critical roll, one row per battle
+    - num_moves(numpy.ndarray): number of usable moves per battle
+    - active(numpy.ndarray): indices of the battles still going on
+    Returns:
+    - numpy.ndarray: the damage dealt in each active battle
+    '''
+    chosen = rng.integers(0, num_moves[active])
+    damage = coefficients[active, chosen]
+    critical = rng.integers(1, 10001, size=active.size) <= battle_engine.CRIT_CHANCE
+    damage = np.where(critical, damage * battle_engine.CRIT_MULTIPLIER, damage)
+    return np.floor(damage).astype(np.int64)
+
+def simulate_batch(player_hp, player_coefficients, player_moves, rival_hp, rival_coefficients, rival_moves,
+                   seed=None, max_turns=1000, first=0):
+    '''
+    Plays N battles at once, retiring the finished ones from the working set
+    Arguments:
+    - player_hp(numpy.ndarray): starting HP of the player's pokemon in each battle
+    - player_coefficients(numpy.ndarray): (N, 4) damage of the player's moves before the critical roll
+    - player_moves(numpy.ndarray): number of usable player moves in each battle
+    - rival_hp, rival_coefficients, rival_moves: the same for the rival
+    - seed(int): seed for the random numbers, for reproducible results
+    - max_turns(int): safety limit on the number of actions per battle
+    - first(int): the side acting first, 0 for the player and 1 for the rival
+    Returns:
+    - tuple (winner, turns, player_hp, rival_hp) of arrays; winner is 0 for the player,
+      1 for the rival and -1 if max_turns was reached
+    '''
+    rng = np.random.default_rng(seed)
+    player_hp = np.array(player_hp, dtype=np.int64)
+    rival_hp = np.array(rival_hp, dtype=np.int64)
+    battles = player_hp.size
+    winner = np.full(battles, -1, dtype=np.int8)
+    turns = np.zeros(battles, dtype=np.int64)
+    active = np.arange(battles)
+    sides = ((player_coefficients, player_moves, rival_hp, 0), (rival_coefficients, rival_moves, player_hp, 1))
+    turn = 0
+    while active.size and turn < max_turns:
+        coefficients, num_moves, target_hp, side = sides[(turn + first) % 2]
+        damage = _attack(rng, coefficients, num_moves, active)
+        target_hp[active] = np.maximum(target_hp[active] - damage, 0)
+        turns[active] += 1
+        fainted = target_hp[active] == 0
+        winner[active[fainted]] = side
+        active = active[~fainted]
+        turn += 1
+    return winner, turns, player_hp, rival_hp
+
+def simulate_matchup(player, rival, battles, seed=None):
+    '''
+    Estimates how a matchup goes over many battles
+    Arguments:
+    - player(pokemon): the player's pokemon
+    - rival(pokemon): the rival's pokemon, it acts first if it is faster
+    - battles(int): number of battles to play
+    - seed(int): seed for the random numbers, for reproducible results
+    Returns:
+    - dictionary with the win rates, the distribution of the number of turns and
+      statistics of the HP the winner had left
+    '''
+    player_hp, player_coefficients, player_moves = _side_arrays(player, rival, battles)
+    rival_hp, rival_coefficients, rival_moves = _side_arrays(rival, player, battles)
+    winner, turns, player_hp, rival_hp = simulate_batch(
+        player_hp, player_coefficients, player_moves, rival_hp, rival_coefficients, rival_moves, seed,
+        first=0 if battle_engine.first_mover(player, rival) is player else 1)
+    player_won = winner == 0
+    rival_won = winner == 1
+    remaining = np.where(player_won, player_hp, rival_hp)[winner >= 0]
+    return {
+        'battles': battles,
+        'player_win_rate': float(player_won.mean()),
+        'rival_win_rate': float(rival_won.mean()),
+        'turns_mean': float(turns.mean()),
+        'turns_histogram': np.bincount(turns),
+        'winner_hp_mean': float(remaining.mean()) if remaining.size else 0.0,
+        'winner_hp_std': float(remaining.std()) if remaining.size else 0.0,
+        'winner_hp_percentiles': np.percentile(remaining, [5, 25, 50, 75, 95]) if remaining.size else None,
+        'player_hp_left_mean': float(player_hp[player_won].mean()) if player_won.any() else 0.0,
+        'rival_hp_left_mean': float(rival_hp[rival_won].mean()) if rival_won.any() else 0.0,
+    }
@@ -0,0 +1,529 @@
+'''
+Headless battle rules for the Pokemon Combat game
+Nothing in here imports pygame, draws or sleeps, so battles can be simulated at
+machine speed. The pygame game plugs in as an observer that is told about every
+attack and potion and takes care of displaying them.
+Team battles (Party, TeamBattle) play 6v6 style battles with switching on top of
+the same rules.
+'''
+import math
+import random
+from type_chart import effectiveness
+
+CRIT_CHANCE = 625  # Out of 10000
+CRIT_MULTIPLIER = 1.5
+STAB_MULTIPLIER = 1.5  # Same type attack bonus
+POTION_HEAL = 30
+POTION = 'potion'  # Action used by policies to drink a potion instead of attacking
+SWITCH = 'switch'  # Team battles: (SWITCH, index) sends another member of the party into battle
+
+def damage_coefficient(attacker, defender, move):
+    '''
+    Calculates the damage of a move before the critical roll
+    Arguments:
+    - attacker(pokemon): the pokemon using the move
+    - defender(pokemon): the pokemon receiving the attack
+    - move(Move): the move used to attack
+    Returns:
+    - float: the damage including the same type bonus and the type effectiveness
+    '''
+    damage = (2 * attacker.level + 10) / 250 * attacker.attack / defender.defense * move.power
+    if move.type in attacker.types:
+        damage *= STAB_MULTIPLIER
+    return damage * effectiveness(move.type, defender.types)
+
+class DamageTable:
+    '''
+    Represents the damage coefficients of a battle, computed once per (attacker, defender, move)
+    Stats do not change during a battle, so the table is valid for the life of the battle
+    and every attack after the first one with a move is a lookup plus the critical roll.
+    '''
+    def __init__(self):
+        self._coefficients = {}
+
+    def coefficient(self, attacker, defender, move):
+        '''
+        Gets the damage of a move before the critical roll
+        Arguments:
+        - attacker(pokemon): the pokemon using the move
+        - defender(pokemon): the pokemon receiving the attack
+        - move(Move): the move used to attack
+        Returns:
+        - float: the cached damage coefficient
+        '''
+        key = (attacker, defender, move)
+        coefficient = self._coefficients.get(key)
+        if coefficient is None:
+            coefficient = self._coefficients[key] = damage_coefficient(attacker, defender, move)
+        return coefficient
+
+def calculate_damage(attacker, defender, move, rng=random, table=None):
+    '''
+    Calculates the damage of an attack
+    Arguments:
+    - attacker(pokemon): the pokemon using the move
+    - defender(pokemon): the pokemon receiving the attack
+    - move(Move): the move used to attack
+    - rng(random.Random): source of the critical hit roll
+    - table(DamageTable): cached coefficients of the battle, if any
+    Returns:
+    - tuple (damage, critical) with the damage as an int and whether it was a critical hit
+    '''
+    if table is not None:
+        damage = table.coefficient(attacker, defender, move)
+    else:
+        damage = damage_coefficient(attacker, defender, move)
+    critical = rng.randint(1, 10000) <= CRIT_CHANCE
+    if critical:
+        damage *= CRIT_MULTIPLIER
+    return math.floor(damage), critical
+
+def take_damage(pokemon, damage):
+    '''
+    Reduces the pokemon's HP by the specified amount, without going below 0
+    Arguments:
+    - pokemon(pokemon): the pokemon that is hit
+    - damage(int): the amount of damage to deduct from the pokemon's HP
+    '''
+    pokemon.current_hp -= damage
+    if pokemon.current_hp < 0:
+        pokemon.current_hp = 0
+
+def use_potion(pokemon):
+    '''
+    Uses a potion to restore HP for the pokemon, if it has any left
+    Arguments:
+    - pokemon(pokemon): the pokemon drinking the potion
+    Returns:
+    - int: the HP actually restored (0 if there were no potions)
+    '''
+    if pokemon.num_potions <= 0:
+        return 0
+    healed = min(POTION_HEAL, pokemon.max_hp - pokemon.current_hp)
+    pokemon.current_hp += healed
+    pokemon.num_potions -= 1
+    return healed
+
+def perform_attack(attacker, defender, move, rng=random, observer=None, table=None):
+    '''
+    Performs an attack: calculates the damage and applies it to the defender
+    Arguments:
+    - attacker(pokemon): the pokemon using the move
+    - defender(pokemon): the pokemon receiving the attack
+    - move(Move): the move used to attack
+    - rng(random.Random): source of the critical hit roll
+    - observer(callable): called as observer(event, data) before ('move') and after ('damage') the hit
+    - table(DamageTable): cached coefficients of the battle, if any
+    Returns:
+    - int: the damage dealt
+    '''
+    if observer is not None:
+        observer('move', {'attacker': attacker, 'defender': defender, 'move': move})
+    damage, critical = calculate_damage(attacker, defender, move, rng, table)
+    defender.take_damage(damage)
+    if observer is not None:
+        observer('damage', {'attacker': attacker, 'defender': defender, 'move': move, 'damage': damage,
+                            'critical': critical, 'effectiveness': effectiveness(move.type, defender.types)})
+    return damage
+
+class Combatant:
+    '''
+    Represents the battle state of a pokemon, without any data needed for drawing it
+    Attributes:
+    - name(str): name of the pokemon
+    - level(int): level of the pokemon
+    - max_hp(int): HP when fully healed
+    - attack(int): attack stat
+    - defense(int): defense stat
+    - speed(int): speed stat
+    - types(tuple): names of the pokemon's types
+    - moves(tuple): the moves the pokemon can use
+    - num_potions(int): potions left
+    - current_hp(int): HP left
+    Uses __slots__ and shares the types and moves tuples, so holding thousands of
+    combatants for simulations stays cheap.
+    '''
+    __slots__ = ('name', 'level', 'max_hp', 'attack', 'defense', 'speed', 'types', 'moves',
+                 'num_potions', 'current_hp')
+
+    def __init__(self, name, level, max_hp, attack, defense, speed, types, moves, num_potions=3, current_hp=None):
+        self.name = name
+        self.level = level
+        self.max_hp = max_hp
+        self.attack = attack
+        self.defense = defense
+        self.speed = speed
+        self.types = tuple(types)  # No copy when given a tuple
+        self.moves = tuple(moves)
+        self.num_potions = num_potions
+        self.current_hp = max_hp if current_hp is None else current_hp
+
+    @staticmethod
+    def from_pokemon(pokemon):
+        '''
+        Copies the battle state of a game pokemon
+        Arguments:
+        - pokemon(Pokemon): the pokemon to copy
+        Returns:
+        - Combatant: a copy that can be used in simulations without touching the original
+        '''
+        return Combatant(pokemon.name, pokemon.level, pokemon.max_hp, pokemon.attack, pokemon.defense,
+                         pokemon.speed, pokemon.types, pokemon.moves, pokemon.num_potions, pokemon.current_hp)
+
+    @staticmethod
+    def from_species(species, level, moves, num_potions=3):
+        '''
+        Builds a fully healed combatant from a species record
+        Arguments:
+        - species(SpeciesRecord): the trimmed species data
+        - level(int): the level of the pokemon
+        - moves(list): the moves the pokemon can use
+        - num_potions(int): potions to start with
+        Returns:
+        - Combatant: the pokemon ready to battle
+        '''
+        return Combatant(species.name, level, species.max_hp(level), species.attack, species.defense,
+                         species.speed, species.types, moves, num_potions)
+
+    def take_damage(self, damage):
+        take_damage(self, damage)
+
+    def use_potion(self):
+        return use_potion(self)
+
+def random_policy(battle, pokemon, opponent):
+    '''
+    Picks a random move, like the rival does in the game
+    Arguments:
+    - battle(Battle): the battle being played
+    - pokemon(Combatant): the pokemon choosing an action
+    - opponent(Combatant): the pokemon it is fighting
+    Returns:
+    - Move: the move to use
+    '''
+    return battle.rng.choice(pokemon.moves)
+
+def first_mover(player, rival):
+    '''
+    Picks the pokemon acting first: the faster one, the player on a tie (like in the game)
+    Ties are not drawn at random, the random numbers of a battle are kept for its critical rolls.
+    Arguments:
+    - player(pokemon): the player's pokemon
+    - rival(pokemon): the rival's pokemon
+    Returns:
+    - pokemon: player or rival
+    '''
+    return rival if rival.speed > player.speed else player
+
+class Battle:
+    '''
+    Represents a battle between two pokemon following the game's rules
+    The faster pokemon acts first (see first_mover), then they take turns until one of them faints.
+    Like in the game, the player's potion does not use up its turn, the rival's potion does.
+    Attributes:
+    - player(Combatant): the player's pokemon
+    - rival(Combatant): the rival's pokemon
+    - first(Combatant): the pokemon acting first
+    - rng(random.Random): source of every random choice in the battle
+    - observers(list): callables notified as observer(event, data) of everything that happens
+    - turn(int): number of actions taken so far
+    - winner(Combatant): the pokemon that won, None while the battle goes on
+    - damage_table(DamageTable): damage coefficients cached for the life of the battle
+    '''
+    def __init__(self, player, rival, rng=None, observers=None):
+        self.player = player
+        self.rival = rival
+        self.rng = rng if rng is not None else random.Random()
+        self.observers = list(observers) if observers else []
+        self.turn = 0
+        self.winner = None
+        self.damage_table = DamageTable()
+        self.first = first_mover(player, rival)
+
+    def notify(self, event, data):
+        for observer in self.observers:
+            observer(event, data)
+
+    def act(self, pokemon, action):
+        '''
+        Plays one action for a pokemon and checks if the battle has ended
+        Arguments:
+        - pokemon(Combatant): the pokemon acting (the player or the rival)
+        - action: a Move to attack with, or POTION to heal
+        Returns:
+        - str: 'end_battle' if the opponent fainted, otherwise the side whose turn is next
+        '''
+        opponent = self.rival if pokemon is self.player else self.player
+        self.turn += 1
+        if action == POTION:
+            healed = pokemon.use_potion()
+            self.notify('potion', {'pokemon': pokemon, 'healed': healed})
+            if pokemon is self.player:
+                return 'player_turn'  # The player acts again after drinking
+        else:
+            perform_attack(pokemon, opponent, action, self.rng, self.notify if self.observers else None, self.damage_table)
+        if opponent.current_hp <= 0:
+            self.winner = pokemon
+            self.notify('faint', {'pokemon': opponent, 'winner': pokemon})
+            return 'end_battle'
+        return 'rival_turn' if pokemon is self.player else 'player_turn'
+
+    def run(self, player_policy=random_policy, rival_policy=random_policy, max_turns=1000):
+        '''
+        Plays the battle until one pokemon faints
+        Arguments:
+        - player_policy(callable): chooses the player's actions, called as policy(battle, pokemon, opponent)
+        - rival_policy(callable): chooses the rival's actions
+        - max_turns(int): safety limit on the number of actions
+        Returns:
+        - Combatant: the winner, or None if max_turns was reached first
+        '''
+        pokemon = self.first
+        opponent = self.rival if pokemon is self.player else self.player
+        policies = {id(self.player): player_policy, id(self.rival): rival_policy}
+        while self.winner is None and self.turn < max_turns:
+            action = policies[id(pokemon)](self, pokemon, opponent)
+            if self.act(pokemon, action) != ('player_turn' if pokemon is self.player else 'rival_turn'):
+                pokemon, opponent = opponent, pokemon
+        return self.winner
+
+def simulate(player, rival, battles, seed=None, player_policy=random_policy, rival_policy=random_policy):
+    '''
+    Plays many battles between fresh copies of two pokemon
+    Arguments:
+    - player(pokemon): the player's pokemon
+    - rival(pokemon): the rival's pokemon, it acts first if it is faster
+    - battles(int): number of battles to play
+    - seed(int): seed for the random numbers, for reproducible results
+    - player_policy(callable): chooses the player's actions
+    - rival_policy(callable): chooses the rival's actions
+    Returns:
+    - dictionary with the player's wins, the rival's wins and the total number of turns
+    '''
+    rng = random.Random(seed)
+    results = {'player_wins': 0, 'rival_wins': 0, 'turns': 0}
+    for _ in range(battles):
+        battle = Battle(Combatant.from_pokemon(player), Combatant.from_pokemon(rival), rng)
+        battle.player.current_hp = battle.player.max_hp
+        battle.rival.current_hp = battle.rival.max_hp
+        winner = battle.run(player_policy, rival_policy)
+        if winner is battle.player:
+            results['player_wins'] += 1
+        elif winner is battle.rival:
+            results['rival_wins'] += 1
+        results['turns'] += battle.turn
+    return results
+
+class Party:
+    '''
+    Represents the team of one side in a team battle
+    Attributes:
+    - members(tuple): the Combatants of the team, in order
+    - active(int): index of the member in battle
+    - remaining(int): number of members that have not fainted
+    Only the active member takes part in a turn, so the cost of a turn does not depend
+    on the size of the party.
+    '''
+    __slots__ = ('members', 'active', 'remaining')
+
+    def __init__(self, members, active=0):
+        self.members = tuple(members)
+        self.active = active
+        self.remaining = sum(1 for member in self.members if member.current_hp > 0)
+
+    @property
+    def pokemon(self):
+        '''
+        Returns the member in battle
+        Returns:
+        - Combatant: the active member
+        '''
+        return self.members[self.active]
+
+    def can_switch(self, index):
+        '''
+        Checks if a member can be sent into battle
+        Arguments:
+        - index(int): the member
+        Returns:
+        - bool: True if it is not the active member and has not fainted
+        '''
+        return index != self.active and self.members[index].current_hp > 0
+
+    def next_alive(self):
+        '''
+        Finds the next member after the active one that has not fainted
+        Returns:
+        - int: its index, None if every member fainted
+        '''
+        count = len(self.members)
+        for offset in range(1, count + 1):
+            index = (self.active + offset) % count
+            if self.members[index].current_hp > 0:
+                return index
+        return None
+
+    def copy(self):
+        '''
+        Copies the party with fresh copies of its members, for simulations
+        Returns:
+        - Party: the copy, fully healed
+        '''
+        members = [Combatant.from_pokemon(member) for member in self.members]
+        for member in members:
+            member.current_hp = member.max_hp
+        return Party(members)
+
+def next_alive_policy(battle, party):
+    '''
+    Picks the replacement of a fainted member: the next one in the party
+    Arguments:
+    - battle(TeamBattle): the battle being played
+    - party(Party): the party whose member fainted
+    Returns:
+    - int: the index of the replacement
+    '''
+    return party.next_alive()
+
+class TeamBattle:
+    '''
+    Represents a battle between two parties
+    Every round both sides choose an action for their active member. Switches happen
+    first, then the faster active pokemon acts first (the player on a tie, see first_mover).
+    A member that faints is replaced right away, and a side loses when its whole party
+    has fainted.
+    Attributes:
+    - player(Party): the player's party
+    - rival(Party): the rival's party
+    - rng(random.Random): source of every random choice in the battle
+    - observers(list): callables notified as observer(event, data) of everything that happens
+    - replace_policy(callable): picks the replacement of a fainted member, called as policy(battle, party)
+    - rounds(int): number of rounds played
+    - turn(int): number of actions taken so far
+    - winner(Party): the party that won, None while the battle goes on
+    - damage_table(DamageTable): damage coefficients cached for the life of the battle
+    '''
+    def __init__(self, player, rival, rng=None, observers=None, replace_policy=next_alive_policy):
+        self.player = player
+        self.rival = rival
+        self.rng = rng if rng is not None else random.Random()
+        self.observers = list(observers) if observers else []
+        self.replace_policy = replace_policy
+        self.rounds = 0
+        self.turn = 0
+        self.winner = None
+        self.damage_table = DamageTable()
+
+    def notify(self, event, data):
+        for observer in self.observers:
+            observer(event, data)
+
+    def opponent(self, party):
+        return self.rival if party is self.player else self.player
+
+    def switch(self, party, index):
+        '''
+        Sends a member of a party into battle
+        Arguments:
+        - party(Party): the party
+        - index(int): the member, which must not have fainted
+        '''
+        if not party.can_switch(index):
+            raise ValueError(f'Cannot switch to member {index}')
+        party.active = index
+        self.notify('switch', {'party': party, 'pokemon': party.pokemon})
+
+    def act(self, party, action):
+        '''
+        Plays one action for the active member of a party
+        Arguments:
+        - party(Party): the party acting
+        - action: a Move to attack with, POTION to heal or (SWITCH, index)
+        '''
+        self.turn += 1
+        if isinstance(action, tuple) and action[0] == SWITCH:
+            self.switch(party, action[1])
+            return
+        pokemon = party.pokemon
+        if action == POTION:
+            healed = pokemon.use_potion()
+            self.notify('potion', {'pokemon': pokemon, 'healed': healed})
+            return
+        defending = self.opponent(party)
+        defender = defending.pokemon
+        perform_attack(pokemon, defender, action, self.rng, self.notify if self.observers else None, self.damage_table)
+        if defender.current_hp <= 0:
+            defending.remaining -= 1
+            self.notify('faint', {'pokemon': defender, 'winner': pokemon})
+            if defending.remaining == 0:
+                self.winner = party
+            else:
+                self.switch(defending, self.replace_policy(self, defending))
+
+    def _priority(self, party, action):
+        '''
+        Orders the actions of a round: switches first, then by speed, the player on a tie
+        '''
+        is_switch = isinstance(action, tuple) and action[0] == SWITCH
+        return (not is_switch, -party.pokemon.speed, party is not self.player)
+
+    def play_round(self, player_action, rival_action):
+        '''
+        Plays one round: both actions, in turn order
+        A pokemon that fainted (or was switched out) before its action loses it.
+        Arguments:
+        - player_action: the player's action
+        - rival_action: the rival's action
+        Returns:
+        - str: 'end_battle' if a party has no pokemon left, otherwise 'next_round'
+        '''
+        self.rounds += 1
+        entries = [(self._priority(party, action), party, party.pokemon, action)
+                   for party, action in ((self.player, player_action), (self.rival, rival_action))]
+        entries.sort(key=lambda entry: entry[0])
+        for _, party, pokemon, action in entries:
+            if self.winner is not None:
+                break
+            if party.pokemon is pokemon:
+                self.act(party, action)
+        return 'end_battle' if self.winner is not None else 'next_round'
+
+    def run(self, player_policy=random_policy, rival_policy=random_policy, max_rounds=1000):
+        '''
+        Plays the battle until a party has no pokemon left
+        Arguments:
+        - player_policy(callable): chooses the player's actions, called as policy(battle, pokemon, opponent)
+        - rival_policy(callable): chooses the rival's actions
+        - max_rounds(int): safety limit on the number of rounds
+        Returns:
+        - Party: the winner, or None if max_rounds was reached first
+        '''
+        while self.winner is None and self.rounds < max_rounds:
+            player, rival = self.player.pokemon, self.rival.pokemon
+            self.play_round(player_policy(self, player, rival), rival_policy(self, rival, player))
+        return self.winner
+
+def simulate_teams(player, rival, battles, seed=None, player_policy=random_policy, rival_policy=random_policy):
+    '''
+    Plays many team battles between fresh copies of two parties
+    Arguments:
+    - player(Party): the player's party
+    - rival(Party): the rival's party
+    - battles(int): number of battles to play
+    - seed(int): seed for the random numbers, for reproducible results
+    - player_policy(callable): chooses the player's actions
+    - rival_policy(callable): chooses the rival's actions
+    Returns:
+    - dictionary with the player's wins, the rival's wins and the total number of rounds
+    '''
+    rng = random.Random(seed)
+    results = {'player_wins': 0, 'rival_wins': 0, 'rounds': 0}
+    for _ in range(battles):
+        battle = TeamBattle(player.copy(), rival.copy(), rng)
+        winner = battle.run(player_policy, rival_policy)
+        if winner is battle.player:
+            results['player_wins'] += 1
+        elif winner is battle.rival:
+            results['rival_wins'] += 1
+        results['rounds'] += battle.rounds
+    return results
@@ -0,0 +1,403 @@
+'''
+Battle server: many headless battles hosted by one process
+Clients (bots, automated playtests) connect over TCP and exchange one JSON object per
+line. A session follows the turn flow of the game: the player picks a move or a
+potion, the rival answers (a potion does not use up the player's turn, like in the
+game), and the session ends when a pokemon faints.
+
+    {"op": "new", "player": "charmander", "rival": "squirtle", "seed": 1}
+    {"op": "act", "session": 1, "move": 0}        (or "potion": true)
+    {"op": "state", "session": 1}
+    {"op": "close", "session": 1}
+    {"op": "stats"}
+
+Every answer has "ok" and, on failure, "error". A session is removed once its battle
+is over (the last answer has status "end_battle") or after idle_timeout seconds
+without requests. The species are loaded once per
+(name, level) into a SpeciesLibrary: their types and moves tuples are shared by every
+session, which only holds its own HP and potions (battle_engine.Combatant slots).
+Usage: python battle_server.py --port 8765 --species bulbasaur charmander squirtle --level 30
+       python battle_server.py --demo (three starters with built-in data, no API needed)
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import traceback
+import battle_engine
+from pokeapi import Move
+
+MAX_LINE = 64 * 1024
+IDLE_TIMEOUT = 600  # Seconds a session is kept without requests
+
+class SpeciesLibrary:
+    '''
+    Represents the battle-ready species shared by every session
+    Attributes:
+    - level(int): the level of the pokemon served
+    - templates(dict): Combatant at full health by species name, never changed once loaded
+    - loader(callable): builds a missing species, called as loader(name, level, seed) in a worker thread, None to only serve the loaded ones
+    '''
+    def __init__(self, level=30, loader=None):
+        self.level = level
+        self.loader = loader
+        self.templates = {}
+        self._loading = {}  # name -> asyncio.Future of the species being loaded
+
+    def add(self, combatant):
+        self.templates[combatant.name.lower()] = combatant
+
+    async def get(self, name):
+        '''
+        Gets the template of a species, loading it once if a loader is set
+        Arguments:
+        - name(str): the species
+        Returns:
+        - Combatant: the shared template (copy it before battling)
+        '''
+        key = name.lower()
+        template = self.templates.get(key)
+        if template is not None:
+            return template
+        if self.loader is None:
+            raise KeyError(f'Unknown species {name}')
+        future = self._loading.get(key)
+        if future is None:  # The first session asking loads it, the others wait for the same load
+            loop = asyncio.get_running_loop()
+            future = self._loading[key] = loop.run_in_executor(None, self.loader, key, self.level, 0)
+            try:
+                self.add(await future)
+            finally:
+                del self._loading[key]
+            return self.templates[key]
+        return await future
+
+    def new_combatant(self, template):
+        '''
+        Builds the per-session state of a species: new HP and potions, shared moves and types
+        Arguments:
+        - template(Combatant): the template of the species
+        Returns:
+        - Combatant: a fully healed copy
+        '''
+        combatant = battle_engine.Combatant.from_pokemon(template)
+        combatant.current_hp = combatant.max_hp
+        return combatant
+
+class Session:
+    '''
+    Represents one battle being played
+    Attributes:
+    - id(int): the session number
+    - battle(Battle): the battle, with its own random stream
+    - status(str): 'player_turn' or 'end_battle', like the game states
+    - last_active(float): time.monotonic() of the last request
+    '''
+    __slots__ = ('id', 'battle', 'status', 'events', 'last_active')
+
+    def __init__(self, id, battle):
+        self.id = id
+        self.battle = battle
+        self.status = 'player_turn'
+        self.events = []  # Events of the request being answered
+        self.last_active = time.monotonic()
+        battle.observers.append(self.record)
+
+    def record(self, event, data):
+        if event == 'damage':
+            self.events.append({'event': 'attack', 'attacker': data['attacker'].name, 'move': data['move'].name,
+                                'damage': data['damage'], 'critical': data['critical']})
+        elif event == 'potion':
+            self.events.append({'event': 'potion', 'pokemon': data['pokemon'].name, 'healed': data['healed']})
+        elif event == 'faint':
+            self.events.append({'event': 'faint', 'pokemon': data['pokemon'].name})
+
+    def state(self):
+        battle = self.battle
+        winner = None
+        if battle.winner is not None:
+            winner = 'player' if battle.winner is battle.player else 'rival'
+        return {'session': self.id, 'status': self.status, 'winner': winner, 'turn': battle.turn,
+                'player': _pokemon_state(battle.player), 'rival': _pokemon_state(battle.rival)}
+
+def _pokemon_state(pokemon):
+    return {'name': pokemon.name, 'hp': pokemon.current_hp, 'max_hp': pokemon.max_hp,
+            'potions': pokemon.num_potions, 'moves': [move.name for move in pokemon.moves]}
+
+class MatchupPolicies:
+    '''
+    Represents a policy made of one policy per matchup, e.g. one ExpectimaxAI per pair of species
+    The search AI keeps its transposition table only while it plays the same matchup,
+    so sessions of different matchups must not share one.
+    Attributes:
+    - factory(callable): builds the policy of a new matchup, called without arguments
+    - policies(dict): the policies by (pokemon name, opponent name)
+    '''
+    def __init__(self, factory):
+        self.factory = factory
+        self.policies = {}
+
+    def __call__(self, battle, pokemon, opponent):
+        key = (pokemon.name, opponent.name)
+        policy = self.policies.get(key)
+        if policy is None:
+            policy = self.policies[key] = self.factory()
+        return policy(battle, pokemon, opponent)
+
+class BattleServer:
+    '''
+    Represents the service hosting the sessions
+    Requests are handled on the event loop without awaiting anything but the socket (and
+    the first load of a species), so a request costs the time of one or two battle actions.
+    Attributes:
+    - library(SpeciesLibrary): the shared species
+    - rival_policy(callable): chooses the rival's actions, called as policy(battle, pokemon, opponent)
+    - max_sessions(int): sessions kept at most, new ones are refused past it
+    - idle_timeout(float): seconds a session is kept without requests
+    - sessions(dict): the sessions by id, the least recently used first
+    - requests(int): number of requests answered
+    - connections(int): number of clients connected
+    - expired(int): number of sessions removed for being idle
+    '''
+    def __init__(self, library, rival_policy=battle_engine.random_policy, max_sessions=100000, idle_timeout=IDLE_TIMEOUT):
+        self.library = library
+        self.rival_policy = rival_policy
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.requests = 0
+        self.connections = 0
+        self.expired = 0
+        self._ids = itertools.count(1)
+        self._server = None
+        self._reaper = None
+
+    async def start(self, host='127.0.0.1', port=8765):
+        '''
+        Starts listening
+        Arguments:
+        - host(str): the address to listen on
+        - port(int): the port, 0 for any free port
+        Returns:
+        - tuple (host, port) actually listened on
+        '''
+        self._server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE)
+        self._reaper = asyncio.create_task(self._expire_periodically())
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _expire_periodically(self):
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 10, 1))
+            self.expire_idle()
+
+    def expire_idle(self, now=None):
+        '''
+        Removes the sessions idle for longer than idle_timeout
+        The sessions are kept in the order of their last request, so only the expired ones are looked at.
+        Arguments:
+        - now(float): the current time.monotonic()
+        Returns:
+        - int: the number of sessions removed
+        '''
+        now = time.monotonic() if now is None else now
+        expired = []
+        for session in self.sessions.values():
+            if now - session.last_active <= self.idle_timeout:
+                break
+            expired.append(session.id)
+        for session_id in expired:
+            del self.sessions[session_id]
+        self.expired += len(expired)
+        return len(expired)
+
+    async def handle_client(self, reader, writer):
+        '''
+        Answers the requests of one connection, in order, until it is closed
+        '''
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):  # Line over the limit, or connection reset
+                    break
+                if not line:
+                    break
+                writer.write(json.dumps(await self.handle_line(line), separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def handle_line(self, line):
+        '''
+        Answers one request
+        Arguments:
+        - line(bytes): the JSON request
+        Returns:
+        - dictionary: the answer
+        '''
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            op = request.get('op')
+            if op == 'new':
+                answer = await self.new_session(request)
+            elif op == 'act':
+                answer = self.act(self._session(request), request)
+            elif op == 'state':
+                answer = self._session(request).state()
+            elif op == 'close':
+                answer = {'session': self.sessions.pop(self._session(request).id).id}
+            elif op == 'stats':
+                answer = {'sessions': len(self.sessions), 'requests': self.requests, 'connections': self.connections,
+                          'expired': self.expired, 'species': sorted(self.library.templates)}
+            else:
+                raise ValueError(f'Unknown op {op!r}')
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            return {'ok': False, 'error': str(error)}
+        except Exception:
+            # A bug met by one request must not drop the client's connection
+            print(f'Error while answering {line[:200]!r}:', flush=True)
+            traceback.print_exc()
+            return {'ok': False, 'error': 'Internal error'}
+        answer['ok'] = True
+        return answer
+
+    def _session(self, request):
+        session = self.sessions.pop(request.get('session'), None)
+        if session is None:
+            raise KeyError(f'Unknown session {request.get("session")}')
+        session.last_active = time.monotonic()
+        self.sessions[session.id] = session  # Moved to the end, the most recently used
+        return session
+
+    async def new_session(self, request):
+        '''
+        Starts a battle
+        Arguments:
+        - request(dict): the player and rival species, and an optional seed for reproducible battles
+        Returns:
+        - dictionary: the state of the new session (the rival has already moved if it is faster)
+        '''
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError('Too many sessions')
+        player = self.library.new_combatant(await self.library.get(str(request['player'])))
+        rival = self.library.new_combatant(await self.library.get(str(request['rival'])))
+        seed = request.get('seed')
+        battle = battle_engine.Battle(player, rival, random.Random(seed))
+        session = Session(next(self._ids), battle)
+        self.sessions[session.id] = session
+        if battle.first is rival:
+            self._rival_turn(session)
+        return self._answer(session)
+
+    def act(self, session, request):
+        '''
+        Plays the player's action, then the rival's answer
+        Arguments:
+        - session(Session): the session
+        - request(dict): "move" with the index of the move, or "potion": true
+        Returns:
+        - dictionary: the events of the turn and the new state
+        '''
+        if session.status != 'player_turn':
+            raise ValueError('The battle is over')
+        player = session.battle.player
+        if request.get('potion'):
+            if player.num_potions <= 0:
+                raise ValueError('No potions left')
+            action = battle_engine.POTION
+        else:
+            index = request.get('move')
+            if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < len(player.moves):
+                raise ValueError(f'Invalid move {index!r}')
+            action = player.moves[index]
+        session.status = session.battle.act(player, action)
+        if session.status == 'rival_turn':
+            self._rival_turn(session)
+        return self._answer(session)
+
+    def _rival_turn(self, session):
+        battle = session.battle
+        session.status = battle.act(battle.rival, self.rival_policy(battle, battle.rival, battle.player))
+
+    def _answer(self, session):
+        answer = session.state()
+        answer['events'] = session.events
+        session.events = []
+        if session.status == 'end_battle':
+            del self.sessions[session.id]  # Nothing more can happen in it
+        return answer
+
+def demo_library(level=30):
+    '''
+    Builds the three starters from built-in stats and moves, for running without the API
+    Arguments:
+    - level(int): the level of the pokemon
+    Returns:
+    - SpeciesLibrary: the library
+    '''
+    def move(name, power, type):
+        return Move(None, {'name': name, 'power': power, 'type': {'name': type}})
+    tackle, scratch = move('tackle', 40, 'normal'), move('scratch', 40, 'normal')
+    library = SpeciesLibrary(level)
+    library.add(battle_engine.Combatant('bulbasaur', level, 45 + level, 49, 49, 45, ('grass', 'poison'),
+                                       [tackle, move('vine-whip', 45, 'grass'), move('razor-leaf', 55, 'grass')]))
+    library.add(battle_engine.Combatant('charmander', level, 39 + level, 52, 43, 65, ('fire',),
+                                       [scratch, move('ember', 40, 'fire'), move('rage', 20, 'normal')]))
+    library.add(battle_engine.Combatant('squirtle', level, 44 + level, 48, 65, 43, ('water',),
+                                       [tackle, move('bubble', 40, 'water'), move('water-gun', 40, 'water')]))
+    return library
+
+async def serve(host, port, library, rival_policy, idle_timeout=IDLE_TIMEOUT):
+    server = BattleServer(library, rival_policy, idle_timeout=idle_timeout)
+    host, port = await server.start(host, port)
+    print(f'Battle server listening on {host}:{port}', flush=True)
+    await asyncio.Event().wait()  # Until interrupted
+
+def main():
+    parser = argparse.ArgumentParser(description='Host headless Pokemon battles over TCP (JSON lines)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='0 for any free port')
+    parser.add_argument('--level', type=int, default=30)
+    parser.add_argument('--species', nargs='*', default=[], help='species to load before serving')
+    parser.add_argument('--demo', action='store_true', help='serve the starters from built-in data, without the API')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT, help='seconds a session is kept without requests')
+    parser.add_argument('--ai', action='store_true', help='the rival searches for its moves instead of picking at random')
+    args = parser.parse_args()
+
+    if args.demo:
+        library = demo_library(args.level)
+    else:
+        from teams import MAX_PARTY_SIZE, load_parties
+        from tournament import load_combatant
+        library = SpeciesLibrary(args.level, load_combatant)  # The species not preloaded load on first use
+        if args.species:
+            groups = [args.species[i:i + MAX_PARTY_SIZE] for i in range(0, len(args.species), MAX_PARTY_SIZE)]
+            for party in load_parties(groups, args.level):  # Every species loads at the same time
+                for member in party.members:
+                    library.add(member)
+    rival_policy = battle_engine.random_policy
+    if args.ai:
+        from ai import ExpectimaxAI
+        # One AI per matchup, so each keeps its transposition table between battles
+        rival_policy = MatchupPolicies(lambda: ExpectimaxAI(time_budget=0.0005))  # Keeps a request under a millisecond
+    try:
+        asyncio.run(serve(args.host, args.port, library, rival_policy, args.idle_timeout))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Benchmark of the search based opponent
+Plays headless battles where the rival is an ExpectimaxAI and reports decisions per
+second, nodes per second and the transposition table hit rate for several depths,
+with and without the per-turn time budget.
+Usage: python benchmarks/bench_ai.py [battles]
+'''
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai import ExpectimaxAI
+from battle_engine import Combatant, simulate
+from pokeapi import Move
+
+def make_pair():
+    '''
+    Builds two level 30 Charmanders with starter-like moves (a mirror match, so only the choices differ)
+    Returns:
+    - tuple of two Combatants
+    '''
+    def move(name, power, type):
+        return Move(None, {'name': name, 'power': power, 'type': {'name': type}})
+    moves = [move('scratch', 40, 'normal'), move('ember', 40, 'fire'), move('rage', 20, 'normal')]
+    return tuple(Combatant('charmander', 30, 69, 52, 43, 65, ('fire',), moves) for _ in range(2))
+
+def run(battles, max_depth, time_budget):
+    '''
+    Plays battles against random moves with the AI as the rival
+    Arguments:
+    - battles(int): number of battles
+    - max_depth(int): the deepest search
+    - time_budget(float): seconds per decision, None for no limit
+    Returns:
+    - tuple (results of simulate, AI, decisions, seconds)
+    '''
+    player, rival = make_pair()
+    ai = ExpectimaxAI(max_depth=max_depth, time_budget=time_budget)
+    decisions = [0]
+    def counted(battle, pokemon, opponent):
+        decisions[0] += 1
+        return ai(battle, pokemon, opponent)
+    start = time.perf_counter()
+    results = simulate(player, rival, battles, seed=1, rival_policy=counted)
+    return results, ai, decisions[0], time.perf_counter() - start
+
+def main():
+    battles = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f'{"depth":>5} {"budget":>8} {"decisions/s":>12} {"nodes/s":>10} {"hit rate":>9} {"rival wins":>11}')
+    for max_depth, time_budget in ((2, None), (4, None), (6, None), (8, None), (12, 0.005)):
+        results, ai, decisions, seconds = run(battles, max_depth, time_budget)
+        stats = ai.stats()
+        budget = 'none' if time_budget is None else f'{time_budget * 1000:.0f} ms'
+        print(f'{max_depth:>5} {budget:>8} {decisions / seconds:>12.0f} {stats["nodes"] / seconds:>10.0f} '
+              f'{stats["hit_rate"]:>9.1%} {results["rival_wins"] / battles:>11.1%}')
+    print(f'random rival for comparison: {simulate(*make_pair(), battles, seed=1)["rival_wins"] / battles:.1%} rival wins')
+
+if __name__ == '__main__':
+    main()
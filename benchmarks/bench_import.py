@@ -0,0 +1,55 @@
+'''
+Import time benchmark
+Imports each module in a fresh interpreter with python -X importtime and reports the
+total import time and the slowest imports. Importing must not open a window, touch the
+network or run the game, so the tests and tools start quickly.
+Usage: python benchmarks/bench_import.py [module ...]
+'''
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ('PokemonCombat', 'pokeapi', 'battle_engine', 'tournament')
+
+def measure_import(module):
+    '''
+    Imports a module in a new interpreter
+    Arguments:
+    - module(str): the name of the module
+    Returns:
+    - tuple (wall time in seconds, cumulative microseconds of the module, list of (microseconds, name) of its direct imports)
+    '''
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{result.stderr}')
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, field = line[len('import time:'):].split('|')
+        depth = (len(field) - len(field.lstrip()) - 1) // 2  # Nested imports are indented, and listed before their parent
+        name = field.strip()
+        if depth == 0:
+            if name == module:
+                return elapsed, int(cumulative), children
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative), name))
+    return elapsed, 0, []  # Already imported by the interpreter start-up
+
+def main():
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    for module in modules:
+        elapsed, total, children = measure_import(module)
+        print(f'{module}: {total / 1000:.1f} ms import, {elapsed * 1000:.0f} ms with interpreter start-up')
+        for us, name in sorted(children, reverse=True)[:5]:
+            print(f'    {name:<24} {us / 1000:8.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+'''
+Memory benchmark for the battle state
+Measures the footprint of the raw PokeAPI data against the trimmed SpeciesRecord,
+and the per-combatant footprint of battle_engine.Combatant.
+Usage: python benchmarks/bench_memory.py [number of combatants]
+'''
+import json
+import os
+import sys
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from battle_engine import Combatant
+from pokeapi import Move, SpeciesRecord
+
+VERSION_GROUPS = ('red-blue', 'yellow', 'gold-silver', 'crystal', 'ruby-sapphire', 'emerald', 'firered-leafgreen',
+                  'diamond-pearl', 'platinum', 'heartgold-soulsilver', 'black-white', 'black-2-white-2', 'x-y',
+                  'omega-ruby-alpha-sapphire', 'sun-moon', 'ultra-sun-ultra-moon', 'sword-shield', 'scarlet-violet')
+
+def make_species_data(moves=80):
+    '''
+    Builds pokemon data shaped like the PokeAPI response of a starter
+    Arguments:
+    - moves(int): number of moves in the learnset
+    Returns:
+    - dictionary with the same structure as the API data
+    '''
+    return {
+        'name': 'charmander',
+        'stats': [{'stat': {'name': name, 'url': f'https://pokeapi.co/api/v2/stat/{i}/'}, 'base_stat': 50, 'effort': 0}
+                  for i, name in enumerate(('hp', 'attack', 'defense', 'special-attack', 'special-defense', 'speed'))],
+        'types': [{'slot': 1, 'type': {'name': 'fire', 'url': 'https://pokeapi.co/api/v2/type/10/'}}],
+        'moves': [{'move': {'name': f'move-{i}', 'url': f'https://pokeapi.co/api/v2/move/{i}/'},
+                   'version_group_details': [{'level_learned_at': i % 50,
+                                              'move_learn_method': {'name': 'level-up', 'url': 'https://pokeapi.co/api/v2/move-learn-method/1/'},
+                                              'version_group': {'name': group, 'url': f'https://pokeapi.co/api/v2/version-group/{g}/'}}
+                                             for g, group in enumerate(VERSION_GROUPS)]}
+                  for i in range(moves)],
+        'sprites': {side: f'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon/{side}/4.png'
+                    for side in ('front_default', 'back_default', 'front_shiny', 'back_shiny', 'front_female',
+                                 'back_female', 'front_shiny_female', 'back_shiny_female')},
+    }
+
+def measure(build):
+    '''
+    Measures the memory kept alive by what a function builds
+    Arguments:
+    - build(callable): builds the objects to measure
+    Returns:
+    - tuple (result, bytes)
+    '''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    text = json.dumps(make_species_data())
+    raw, raw_bytes = measure(lambda: json.loads(text))
+    record, record_bytes = measure(lambda: SpeciesRecord.from_api(raw))
+    moves = [Move(None, {'name': f'move-{i}', 'power': 40, 'type': {'name': 'fire'}}) for i in range(4)]
+    combatants, combatant_bytes = measure(lambda: [Combatant.from_species(record, 30, moves) for _ in range(count)])
+
+    print(f'raw species JSON:        {raw_bytes / 1024:10.1f} KB')
+    print(f'trimmed SpeciesRecord:   {record_bytes / 1024:10.1f} KB')
+    print(f'Combatant x {count}:  {combatant_bytes / 1024:10.1f} KB '
+          f'({combatant_bytes / count:.0f} bytes per combatant)')
+    print(f'if every combatant kept the raw JSON: {(raw_bytes + combatant_bytes / count) * count / 1024 / 1024:.1f} MB')
+
+if __name__ == '__main__':
+    main()
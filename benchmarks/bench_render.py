@@ -0,0 +1,88 @@
+'''
+Frame time benchmark for the battle screen, under the headless SDL dummy driver
+Compares the old way of drawing a frame (fill the screen, redraw everything, full
+display update) with the dirty rectangle renderer, for frames where nothing changed
+and frames where only an HP bar changed, and the old per-HP-point bar with HPBar.
+Usage: python benchmarks/bench_render.py [frames]
+'''
+import os
+import sys
+import time
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pygame
+from rendering import Element, FrameRenderer, HPBar
+
+grey = (200, 200, 200)
+green = (0, 200, 0)
+red = (200, 0, 0)
+black = (0, 0, 0)
+
+def legacy_hp(surface, x, y, current_hp, max_hp):
+    # The per-frame HP drawing the game used to do: one rect per HP point and a font load
+    bar_scale = 200 // max_hp
+    for i in range(max_hp):
+        pygame.draw.rect(surface, red, (x + bar_scale * i, y, bar_scale, 20))
+    for i in range(current_hp):
+        pygame.draw.rect(surface, green, (x + bar_scale * i, y, bar_scale, 20))
+    font = pygame.font.Font(pygame.font.get_default_font(), 16)
+    surface.blit(font.render(f'HP: {current_hp} / {max_hp}', True, black), (x, y + 30))
+
+def legacy_frame(screen, sprites, hps):
+    screen.fill(grey)
+    for image, position in sprites:
+        screen.blit(image, position)
+    for x, y, current_hp, max_hp in hps:
+        legacy_hp(screen, x, y, current_hp, max_hp)
+    pygame.display.update()
+
+def renderer_frame(renderer, sprites, hps):
+    elements = []
+    for index, (image, position) in enumerate(sprites):
+        elements.append(Element(f'sprite {index}', (id(image),), image.get_rect(topleft=position),
+                                lambda surface, image=image, position=position: surface.blit(image, position)))
+    for index, (x, y, current_hp, max_hp) in enumerate(hps):
+        elements.append(Element(f'hp {index}', (current_hp, max_hp), (x, y, 200, 50),
+                                lambda surface, hp=(x, y, current_hp, max_hp): legacy_hp(surface, *hp)))
+    renderer.render(elements)
+
+def time_frames(draw, frames, hps):
+    start = time.process_time()
+    for frame in range(frames):
+        draw(frame, hps)
+    return (time.process_time() - start) / frames * 1000
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    pygame.init()
+    screen = pygame.display.set_mode((500, 500))
+    image = pygame.Surface((150, 150), pygame.SRCALPHA)
+    image.fill((255, 0, 0, 255))
+    sprites = [(image, (100, 270)), (image, (250, 30))]
+    hps = [[290, 340, 69, 69], [90, 90, 74, 74]]
+    renderer = FrameRenderer(screen, grey)
+
+    results = {}
+    results['legacy, idle'] = time_frames(lambda frame, hps: legacy_frame(screen, sprites, hps), frames, hps)
+    results['renderer, idle'] = time_frames(lambda frame, hps: renderer_frame(renderer, sprites, hps), frames, hps)
+
+    def draining(draw):
+        def frame_with_damage(frame, hps):
+            hps[0][2] = 69 - frame % 69  # The HP changes every frame
+            draw(hps)
+        return frame_with_damage
+    results['legacy, HP changing'] = time_frames(draining(lambda hps: legacy_frame(screen, sprites, hps)), frames, hps)
+    results['renderer, HP changing'] = time_frames(draining(lambda hps: renderer_frame(renderer, sprites, hps)), frames, hps)
+
+    for max_hp in (50, 700):
+        bar = HPBar(drain_rate=None)
+        results[f'legacy HP bar, {max_hp} HP'] = time_frames(
+            lambda frame, hps: legacy_hp(screen, 10, 10, max_hp - frame % 2, max_hp), frames, hps)
+        results[f'HPBar, {max_hp} HP'] = time_frames(
+            lambda frame, hps: bar.draw(screen, 10, 10, max_hp - frame % 2, max_hp), frames, hps)
+
+    for name, milliseconds in results.items():
+        print(f'{name:24} {milliseconds:8.3f} ms CPU per frame')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+'''
+Benchmark suite for the hot paths of the game
+Times the data loading (Pokemon.__init__, set_moves, set_sprite) against a local
+stub of the PokeAPI, the battle resolution (perform_attack) and the drawing
+(draw_hp, button hit-testing, full draw_game frames) under the SDL dummy driver, so the
+results do not depend on the network or on a screen.
+
+Every run is appended to benchmarks/results/history.jsonl and compared with the
+previous run on the same machine: a case whose best time grew by more than the
+threshold (the best of several timings is the least noisy), or whose counters went up (e.g. fonts loaded per frame, requests per
+load), is reported as a regression. With --check the exit status is 1 when there is
+one, so the suite can guard changes.
+Usage: python benchmarks/bench_suite.py [--filter text] [--repeat 5] [--threshold 0.5] [--check] [--no-save]
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+import pygame
+import battle_engine
+import pokeapi
+import PokemonCombat
+from api_cache import ResponseCache
+from pokeapi import APIManager, Move
+from sprite_cache import SpriteCache
+from stub_server import StubServer
+
+HISTORY_PATH = os.path.join(BENCHMARK_DIR, 'results', 'history.jsonl')
+
+_benchmarks = []  # (name, function, calls per timing), in the order they are declared
+
+def benchmark(name, number=100):
+    '''
+    Declares a benchmark case
+    The decorated function gets the Environment and returns the callable to time; all
+    its setup happens before that. The callable may return a dictionary of counters,
+    which are recorded along with the time (from its last call).
+    Arguments:
+    - name(str): name of the case in the results
+    - number(int): calls per timing
+    '''
+    def register(function):
+        _benchmarks.append((name, function, number))
+        return function
+    return register
+
+class Environment:
+    '''
+    Represents the isolated world the benchmarks run in
+    Attributes:
+    - server(StubServer): the local PokeAPI
+    - directory(str): temporary folder for the caches
+    '''
+    def __init__(self, server, directory):
+        self.server = server
+        self.directory = directory
+        self._sprite_dirs = 0
+
+    def cold_caches(self):
+        '''
+        Forgets everything loaded so far, so the next load goes to the (stub) network
+        '''
+        APIManager.cache = None
+        pokeapi._species.clear()
+        Move.registry.clear()
+        self._sprite_dirs += 1
+        PokemonCombat.Pokemon.sprites = SpriteCache(directory=os.path.join(self.directory, f'sprites{self._sprite_dirs}'))
+
+    def warm_caches(self):
+        '''
+        Uses a response cache on disk, like the game after its first launch
+        '''
+        APIManager.cache = ResponseCache(path=os.path.join(self.directory, 'cache.sqlite'))
+        PokemonCombat.Pokemon.sprites = SpriteCache(directory=os.path.join(self.directory, 'sprites'))
+
+@contextmanager
+def environment():
+    '''
+    Starts the stub API and points the game at it, restoring everything afterwards
+    Returns:
+    - Environment: the benchmark environment
+    '''
+    saved = (APIManager.BASE_URL, APIManager.cache, APIManager.bundle, PokemonCombat.Pokemon.sprites)
+    directory = tempfile.mkdtemp(prefix='pokemon-bench-')
+    server = StubServer().start()
+    try:
+        APIManager.BASE_URL = server.api_url
+        APIManager.bundle = None
+        PokemonCombat.init_display()
+        env = Environment(server, directory)
+        env.warm_caches()
+        yield env
+    finally:
+        APIManager.BASE_URL, APIManager.cache, APIManager.bundle, PokemonCombat.Pokemon.sprites = saved
+        server.stop()
+        pygame.quit()
+        shutil.rmtree(directory, ignore_errors=True)
+
+@contextmanager
+def counting_fonts():
+    '''
+    Counts the fonts created, however they are created (a per-frame font load is a known regression)
+    Returns:
+    - list holding the count
+    '''
+    count = [0]
+    original = pygame.font.Font
+    def counted(*args, **kwargs):
+        count[0] += 1
+        return original(*args, **kwargs)
+    pygame.font.Font = counted
+    try:
+        yield count
+    finally:
+        pygame.font.Font = original
+
+def make_pokemon(name, x=100, y=100):
+    pokemon = PokemonCombat.Pokemon(name, 5, x, y)
+    pokemon.set_moves()
+    return pokemon
+
+@benchmark('pokemon_init_cold', number=5)
+def bench_pokemon_init_cold(env):
+    def run():
+        env.cold_caches()
+        before = env.server.requests
+        PokemonCombat.Pokemon('Charmander', 5, 100, 100)
+        return {'requests': env.server.requests - before}
+    return run
+
+@benchmark('pokemon_init_warm', number=200)
+def bench_pokemon_init_warm(env):
+    env.warm_caches()
+    PokemonCombat.Pokemon('Charmander', 5, 100, 100)
+    return lambda: PokemonCombat.Pokemon('Charmander', 5, 100, 100)
+
+@benchmark('set_moves_cold', number=5)
+def bench_set_moves_cold(env):
+    def run():
+        env.cold_caches()
+        pokemon = PokemonCombat.Pokemon('Charmander', 40, 100, 100)
+        before = env.server.requests
+        random.seed(0)  # The same moves, and so the same requests, every time
+        pokemon.set_moves()
+        return {'requests': env.server.requests - before}
+    return run
+
+@benchmark('set_moves_warm', number=200)
+def bench_set_moves_warm(env):
+    env.warm_caches()
+    pokemon = make_pokemon('Charmander')
+    return pokemon.set_moves
+
+@benchmark('set_sprite', number=500)
+def bench_set_sprite(env):
+    env.warm_caches()
+    pokemon = make_pokemon('Charmander')
+    sides = ['front_default', 'back_default']
+    def run():
+        sides.reverse()
+        pokemon.set_sprite(sides[0])
+    return run
+
+@benchmark('perform_attack', number=1000)
+def bench_perform_attack(env):
+    env.warm_caches()
+    attacker, defender = make_pokemon('Charmander'), make_pokemon('Squirtle')
+    move = attacker.moves[0]
+    def run():
+        defender.current_hp = defender.max_hp
+        PokemonCombat.scheduler.clear()  # Only the attack is timed, not a growing queue of messages
+        attacker.perform_attack(defender, move)
+    return run
+
+@benchmark('simulate_100_battles', number=20)
+def bench_simulate_battles(env):
+    env.warm_caches()
+    player = battle_engine.Combatant.from_pokemon(make_pokemon('Charmander'))
+    rival = battle_engine.Combatant.from_pokemon(make_pokemon('Squirtle'))
+    def run():
+        battle_engine.simulate(player, rival, 100, seed=0)  # Headless, nothing is drawn
+    return run
+
+@benchmark('draw_hp', number=1000)
+def bench_draw_hp(env):
+    env.warm_caches()
+    pokemon = make_pokemon('Charmander')
+    def run():
+        pokemon.current_hp = pokemon.max_hp - pokemon.current_hp % 2  # A different HP every call
+        pokemon.draw_hp(PokemonCombat.game)
+    return run
+
+@benchmark('click_hit_test', number=10000)
+def bench_click_hit_test(env):
+    env.warm_caches()
+    pokemon = make_pokemon('Charmander')
+    def run():
+        # What a click on the last move button costs: getting the layout and finding the button
+        PokemonCombat.screen_layout('select_move', pokemon).hit((357, 445))
+    return run
+
+def frame_benchmark(status, changing):
+    '''
+    Builds a full draw_game frame benchmark
+    Arguments:
+    - status(str): the game status drawn
+    - changing(bool): if True the whole screen is redrawn every frame, otherwise nothing changes between frames
+    '''
+    def bench(env):
+        env.warm_caches()
+        pokemons = [make_pokemon(name, x, y) for name, (x, y) in PokemonCombat.initial_positions.items()]
+        player, rival = pokemons[1], pokemons[2]
+        player.x, player.y, rival.x, rival.y = 100, 270, 250, 30
+        PokemonCombat.scheduler.clear()
+        PokemonCombat.message_box['text'] = None
+        with counting_fonts():
+            PokemonCombat.draw_game(status, pokemons, player, rival)  # Fonts and text are cached from here on
+        def run():
+            with counting_fonts() as fonts:
+                if changing:
+                    PokemonCombat.renderer.invalidate()
+                PokemonCombat.draw_game(status, pokemons, player, rival)
+            return {'fonts_per_frame': fonts[0]}
+        return run
+    return bench
+
+for status, label in (('select pokemon', 'select'), ('player_turn', 'battle'), ('select_move', 'moves')):
+    benchmark(f'draw_game_{label}_idle', number=300)(frame_benchmark(status, False))
+    benchmark(f'draw_game_{label}_full', number=100)(frame_benchmark(status, True))
+
+def time_case(run, number, repeat):
+    '''
+    Times a benchmark callable
+    Arguments:
+    - run(callable): the code to time
+    - number(int): calls per timing
+    - repeat(int): number of timings
+    Returns:
+    - dictionary with the median and best time per call in microseconds, and the counters of the last call
+    '''
+    counters = run()  # Warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            counters = run()
+        timings.append((time.perf_counter() - start) / number * 1e6)
+    result = {'median_us': round(statistics.median(timings), 3), 'min_us': round(min(timings), 3)}
+    if isinstance(counters, dict):
+        result.update(counters)
+    return result
+
+def run_suite(name_filter=None, repeat=5):
+    '''
+    Runs the benchmark cases
+    Arguments:
+    - name_filter(str): only run the cases whose name contains this text
+    - repeat(int): number of timings per case
+    Returns:
+    - dictionary of results by case name
+    '''
+    results = {}
+    with environment() as env:
+        for name, function, number in _benchmarks:
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = time_case(function(env), number, repeat)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def load_history(path=HISTORY_PATH):
+    '''
+    Reads the recorded runs
+    Arguments:
+    - path(str): the history file
+    Returns:
+    - list of runs, oldest first
+    '''
+    try:
+        with open(path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def save_run(run, path=HISTORY_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(run, sort_keys=True) + '\n')
+
+def compare(previous, results, threshold):
+    '''
+    Finds the regressions of a run against a previous one
+    Arguments:
+    - previous(dict): the results of the previous run
+    - results(dict): the results of this run
+    - threshold(float): allowed slowdown of the best time, 0.5 for 50%
+    Returns:
+    - list of messages, one per regression
+    '''
+    regressions = []
+    for name, result in results.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        if result['min_us'] > before['min_us'] * (1 + threshold):
+            regressions.append(f'{name}: {before["min_us"]:.1f} -> {result["min_us"]:.1f} us '
+                               f'({result["min_us"] / before["min_us"] - 1:+.0%})')
+        for counter, value in result.items():
+            if counter not in ('median_us', 'min_us') and value > before.get(counter, value):
+                regressions.append(f'{name}: {counter} {before[counter]} -> {value}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the game')
+    parser.add_argument('--filter', help='only run the cases whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=5, help='timings per case')
+    parser.add_argument('--threshold', type=float, default=0.5, help='allowed slowdown before a regression is reported')
+    parser.add_argument('--history', default=HISTORY_PATH, help='where the runs are recorded')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if there is a regression')
+    parser.add_argument('--no-save', action='store_true', help='do not record this run')
+    args = parser.parse_args()
+
+    results = run_suite(args.filter, args.repeat)
+    machine = f'{platform.node()} {platform.machine()}'
+    previous = [run for run in load_history(args.history) if run.get('machine') == machine]
+    previous = previous[-1]['results'] if previous else {}
+
+    for name, result in results.items():
+        counters = ', '.join(f'{counter}={value}' for counter, value in result.items() if counter not in ('median_us', 'min_us'))
+        before = previous.get(name)
+        change = f'{result["min_us"] / before["min_us"] - 1:+7.1%}' if before else '       '
+        print(f'{name:28} {result["median_us"]:11.1f} us median {result["min_us"]:11.1f} us best {change}  {counters}')
+
+    regressions = compare(previous, results, args.threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if not args.no_save:
+        save_run({'time': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+                  'machine': machine, 'python': platform.python_version(), 'pygame': pygame.version.ver,
+                  'results': results}, args.history)
+    if args.check and regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+'''
+Load generator for the battle server
+Opens many connections to a battle server, starts thousands of sessions at once and
+plays them to the end, then reports the throughput, the latency of the requests and
+the memory of the server per session. Without --port a demo server (built-in
+starters, no API needed) is started in a separate process.
+Usage: python benchmarks/load_generator.py [--connections 50] [--sessions-per-connection 40] [--port 8765]
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPECIES = ('bulbasaur', 'charmander', 'squirtle')
+
+def start_demo_server():
+    '''
+    Starts a demo battle server on a free port
+    Returns:
+    - tuple (process, port)
+    '''
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'battle_server.py'), '--demo', '--port', '0'],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()  # Battle server listening on host:port
+    return process, int(line.rsplit(':', 1)[1])
+
+def rss_kb(pid):
+    '''
+    Reads the resident memory of a process (Linux only)
+    Returns:
+    - int: kilobytes, None if it cannot be read
+    '''
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+class Client:
+    '''
+    Represents one connection, sending a request and waiting for its answer
+    Attributes:
+    - latencies(list): seconds taken by each request
+    '''
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+
+    async def request(self, **request):
+        start = time.perf_counter()
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        answer = json.loads(await self.reader.readline())
+        self.latencies.append(time.perf_counter() - start)
+        if not answer['ok']:
+            raise RuntimeError(answer['error'])
+        return answer
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def run_connection(host, port, sessions, seed, started, go, latencies, results):
+    '''
+    Plays sessions on one connection: starts all of them, waits for every connection to
+    do the same, then plays them round-robin until every battle is over
+    '''
+    rng = random.Random(seed)
+    client = Client(latencies)
+    await client.connect(host, port)
+    live = []
+    for _ in range(sessions):
+        answer = await client.request(op='new', player=rng.choice(SPECIES), rival=rng.choice(SPECIES), seed=rng.random())
+        live.append(answer)
+    started()
+    await go.wait()
+    while live:
+        playing = []
+        for state in live:
+            if state['status'] != 'player_turn':  # The server has removed the finished session
+                results[state['winner']] = results.get(state['winner'], 0) + 1
+                continue
+            player = state['player']
+            if player['potions'] and player['hp'] < player['max_hp'] / 3:
+                state = await client.request(op='act', session=state['session'], potion=True)
+            else:
+                state = await client.request(op='act', session=state['session'], move=rng.randrange(len(player['moves'])))
+            playing.append(state)
+        live = playing
+    await client.close()
+
+async def run(host, port, connections, sessions_per_connection, server_pid):
+    latencies = []
+    results = {}
+    go = asyncio.Event()
+    ready = [0]
+    peak = {}
+    def started():
+        ready[0] += 1
+        if ready[0] == connections:
+            go.set()
+    rss_before = rss_kb(server_pid) if server_pid else None
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(run_connection(host, port, sessions_per_connection, index, started, go, latencies, results))
+             for index in range(connections)]
+    await go.wait()
+    stats_client = Client([])
+    await stats_client.connect(host, port)
+    peak['sessions'] = (await stats_client.request(op='stats'))['sessions']
+    peak['rss_kb'] = rss_kb(server_pid) if server_pid else None
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await stats_client.close()
+    return latencies, results, peak, rss_before, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the battle server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help='an already running server, otherwise a demo server is started')
+    parser.add_argument('--connections', type=int, default=50)
+    parser.add_argument('--sessions-per-connection', type=int, default=40)
+    args = parser.parse_args()
+
+    process = None
+    port = args.port
+    if port is None:
+        process, port = start_demo_server()
+    try:
+        latencies, results, peak, rss_before, elapsed = asyncio.run(
+            run(args.host, port, args.connections, args.sessions_per_connection, process.pid if process else None))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    latencies.sort()
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f'{len(latencies)} requests in {elapsed:.2f} s: {len(latencies) / elapsed:.0f} requests/s')
+    print(f'latency ms: mean {statistics.mean(latencies) * 1000:.3f}  p50 {percentile(0.5):.3f}  '
+          f'p95 {percentile(0.95):.3f}  p99 {percentile(0.99):.3f}  max {latencies[-1] * 1000:.3f}')
+    print(f'battles: {sum(results.values())} (player {results.get("player", 0)}, rival {results.get("rival", 0)}), '
+          f'peak sessions: {peak["sessions"]}')
+    if rss_before and peak['rss_kb']:
+        print(f'server memory: {rss_before / 1024:.1f} MB idle, {peak["rss_kb"] / 1024:.1f} MB at the peak, '
+              f'{(peak["rss_kb"] - rss_before) * 1024 / max(peak["sessions"], 1):.0f} bytes per session')
+
+if __name__ == '__main__':
+    main()
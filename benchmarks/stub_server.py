@@ -0,0 +1,159 @@
+'''
+Local stand-in for the PokeAPI, for benchmarks that must not depend on the network
+Serves the JSON files of benchmarks/fixtures (laid out like the API paths, e.g.
+fixtures/pokemon/charmander.json for /api/v2/pokemon/charmander) and generates plain
+PNG sprites. The fixtures refer to http://pokeapi.stub, which is replaced by the
+address of the running server, so every URL the game follows stays local.
+Usage: python benchmarks/stub_server.py [port]
+'''
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PLACEHOLDER = 'http://pokeapi.stub'
+SPRITE_SIZE = 96
+
+def make_png(width, height, color):
+    '''
+    Encodes a PNG image of a single colour
+    Arguments:
+    - width(int): width in pixels
+    - height(int): height in pixels
+    - color(tuple): (red, green, blue, alpha)
+    Returns:
+    - bytes: the encoded image
+    '''
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+    row = b'\x00' + bytes(color) * width  # Filter type 0 on every row
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)  # 8 bit RGBA
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+class StubServer:
+    '''
+    Represents the local API server, running on a background thread
+    Attributes:
+    - fixtures(str): the folder with the JSON fixtures
+    - latency(float): seconds added to every response, to imitate a network round trip
+    - base_url(str): the address of the server, set once it is started
+    - requests(int): number of requests served
+    '''
+    def __init__(self, fixtures=FIXTURE_DIR, latency=0.0, port=0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.port = port
+        self.base_url = None
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._responses = {}
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        '''
+        Starts serving on 127.0.0.1
+        Returns:
+        - StubServer: the server itself
+        '''
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+            disable_nagle_algorithm = True  # Otherwise small responses wait for delayed ACKs
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                response = stub.response(self.path)
+                if response is None:
+                    self.send_error(404)
+                    return
+                content_type, body = response
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Benchmarks stay quiet
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        '''
+        Stops the server and waits for its thread
+        '''
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def api_url(self):
+        return f'{self.base_url}/api/v2'
+
+    def response(self, path):
+        '''
+        Builds the response for a path, reading each fixture only once
+        Arguments:
+        - path(str): the requested path
+        Returns:
+        - tuple (content type, body), or None if there is no such resource
+        '''
+        response = self._responses.get(path)
+        if response is not None:
+            return response
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if len(parts) == 3 and parts[0] == 'sprites':
+            # /sprites/<side>/<id>.png, a colour per pokemon so the sprites differ
+            number = int(parts[2].split('.')[0]) if parts[2].split('.')[0].isdigit() else 0
+            color = ((number * 70) % 256, (number * 130) % 256, (number * 190) % 256, 255)
+            response = ('image/png', make_png(SPRITE_SIZE, SPRITE_SIZE, color))
+        elif len(parts) == 4 and parts[:2] == ['api', 'v2']:
+            file_path = os.path.join(self.fixtures, parts[2], f'{parts[3].lower()}.json')
+            try:
+                with open(file_path, encoding='utf-8') as file:
+                    text = file.read()
+            except (FileNotFoundError, NotADirectoryError):
+                return None
+            json.loads(text)  # Broken fixtures fail loudly instead of being served
+            response = ('application/json', text.replace(PLACEHOLDER, self.base_url).encode('utf-8'))
+        else:
+            return None
+        self._responses[path] = response
+        return response
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    server = StubServer(port=port).start()
+    print(f'Serving the PokeAPI fixtures on {server.api_url}, press Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+'''
+Offline data bundle
+A build step snapshots the species, learnsets, moves and sprites the game needs into
+a single SQLite file, and DataBundle serves them back to APIManager and the sprite
+cache without touching the network.
+Usage: python bundle.py [species ...] [--out pokedata.bundle]
+'''
+import argparse
+import json
+import os
+import sqlite3
+import zlib
+from urllib.request import urlopen # To open URLs
+from pokeapi import APIManager
+
+DEFAULT_BUNDLE_PATH = os.environ.get(
+    'POKEMON_BUNDLE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pokedata.bundle'))
+DEFAULT_SPECIES = ('bulbasaur', 'charmander', 'squirtle')
+
+def trim_species(data):
+    '''
+    Keeps only the parts of the pokemon data the game reads
+    Arguments:
+    - data(dict): the pokemon data from the API
+    Returns:
+    - dictionary with the same structure, without other games' learnsets and extra sprites
+    '''
+    moves = []
+    for move_info in data['moves']:
+        versions = [version for version in move_info['version_group_details']
+                    if version['version_group']['name'] == 'red-blue' and version['move_learn_method']['name'] == 'level-up']
+        if versions:
+            moves.append({'move': {'url': move_info['move']['url']}, 'version_group_details': versions})
+    return {
+        'name': data['name'],
+        'stats': [{'stat': {'name': stat['stat']['name']}, 'base_stat': stat['base_stat']} for stat in data['stats']],
+        'types': [{'type': {'name': t['type']['name']}} for t in data['types']],
+        'moves': moves,
+        'sprites': {side: data['sprites'].get(side) for side in ('front_default', 'back_default')},
+    }
+
+def trim_move(data):
+    '''
+    Keeps only the parts of the move data the game reads
+    Arguments:
+    - data(dict): the move data from the API
+    Returns:
+    - dictionary with the name, power and type of the move
+    '''
+    return {'name': data['name'], 'power': data['power'], 'type': {'name': data['type']['name']}}
+
+def build_bundle(path, species=DEFAULT_SPECIES):
+    '''
+    Fetches everything the game needs for some species and writes it to a bundle file
+    Arguments:
+    - path(str): the bundle file to write (replaced if it exists)
+    - species(list): names of the species to include
+    Returns:
+    - dictionary with the number of species, moves and sprites written
+    '''
+    responses = {}
+    sprites = {}
+    for name in species:
+        url = f'{APIManager.BASE_URL}/pokemon/{name.lower()}'
+        data = APIManager.fetch_json(url)
+        if data is None:
+            raise ValueError(f'Failed to retrieve data for {name}')
+        trimmed = trim_species(data)
+        responses[url] = trimmed
+        move_urls = [move_info['move']['url'] for move_info in trimmed['moves']]
+        for move_url, move_data in zip(move_urls, APIManager.fetch_many(move_urls)):
+            if move_data is not None:
+                responses[move_url] = trim_move(move_data)
+        for image_url in trimmed['sprites'].values():
+            if image_url and image_url not in sprites:
+                sprites[image_url] = urlopen(image_url).read()
+
+    temp_path = path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    conn.execute('CREATE TABLE responses (url TEXT PRIMARY KEY, body BLOB NOT NULL)')
+    conn.execute('CREATE TABLE sprites (url TEXT PRIMARY KEY, data BLOB NOT NULL)')
+    conn.executemany('INSERT INTO responses VALUES (?, ?)',
+                     [(url, zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8')))
+                      for url, data in responses.items()])
+    conn.executemany('INSERT INTO sprites VALUES (?, ?)', sprites.items())
+    conn.commit()
+    conn.close()
+    os.replace(temp_path, path)
+    return {'species': len(species), 'moves': len(responses) - len(species), 'sprites': len(sprites)}
+
+class DataBundle:
+    '''
+    Represents a bundle file opened for reading
+    Every row is read in a single query when the bundle is opened, so lookups are
+    dictionary accesses; JSON bodies are only decompressed when asked for.
+    Attributes:
+    - path(str): the bundle file
+    '''
+    def __init__(self, path=DEFAULT_BUNDLE_PATH):
+        self.path = path
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            self._responses = dict(conn.execute('SELECT url, body FROM responses'))
+            self._sprites = dict(conn.execute('SELECT url, data FROM sprites'))
+        finally:
+            conn.close()
+
+    def get_json(self, url):
+        '''
+        Gets the data of an API url
+        Arguments:
+        - url(str): the url of the species or move
+        Returns:
+        - dictionary with the data, or None if it is not in the bundle
+        '''
+        body = self._responses.get(url)
+        return None if body is None else json.loads(zlib.decompress(body))
+
+    def get_sprite(self, url):
+        '''
+        Gets an encoded sprite image
+        Arguments:
+        - url(str): the url of the image
+        Returns:
+        - bytes: the image, or None if it is not in the bundle
+        '''
+        return self._sprites.get(url)
+
+    def __contains__(self, url):
+        return url in self._responses or url in self._sprites
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot the PokeAPI data the game needs into a bundle file')
+    parser.add_argument('species', nargs='*', default=list(DEFAULT_SPECIES))
+    parser.add_argument('--out', default=DEFAULT_BUNDLE_PATH)
+    args = parser.parse_args()
+    APIManager.bundle = None  # A rebuild takes its data from the API, not from the previous bundle
+    counts = build_bundle(args.out, args.species)
+    print(f"Wrote {counts['species']} species, {counts['moves']} moves and {counts['sprites']} sprites to {args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+'''
+HTTP transport of the API client
+Sends the GET requests of APIManager: retries with exponential backoff on connection
+errors and 5xx/429 answers, conditional requests (If-None-Match/If-Modified-Since)
+when a cached copy has validators, and single-flight coalescing so that callers
+asking for the same URL at the same time share one request.
+'''
+import threading
+import time
+from telemetry import telemetry
+
+RETRY_STATUSES = (429,)  # Retried like the 5xx answers
+
+class Response:
+    '''
+    Represents the outcome of a GET request
+    Attributes:
+    - status(int): the HTTP status (304 when the cached copy is still valid)
+    - data: the decoded JSON body, None unless status is 200
+    - etag(str): the ETag header, None if absent
+    - last_modified(str): the Last-Modified header, None if absent
+    '''
+    __slots__ = ('status', 'data', 'etag', 'last_modified')
+
+    def __init__(self, status, data=None, etag=None, last_modified=None):
+        self.status = status
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+
+def _header(response, name):
+    headers = getattr(response, 'headers', None)
+    value = headers.get(name) if headers is not None else None
+    return value if isinstance(value, str) else None
+
+def get_json(session, url, timeout=10, max_retries=3, backoff=0.25, etag=None, last_modified=None):
+    '''
+    Gets a JSON document, retrying transient failures
+    Arguments:
+    - session(requests.Session): the pooled session sending the request
+    - url(str): the url to get
+    - timeout(float): seconds to wait for the server on each attempt
+    - max_retries(int): retries after the first attempt
+    - backoff(float): delay before the first retry, doubled on every retry
+    - etag(str): ETag of the cached copy, sent as If-None-Match
+    - last_modified(str): Last-Modified of the cached copy, sent as If-Modified-Since
+    Returns:
+    - Response: the answer, None if the server could not be reached or did not answer 200 with JSON or 304
+    '''
+    import requests
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    response = None
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.get(url, timeout=timeout, headers=headers)
+        except requests.RequestException:
+            response = None
+        if response is not None and response.status_code < 500 and response.status_code not in RETRY_STATUSES:
+            break
+        if attempt < max_retries:
+            telemetry.count('api_retries')
+            time.sleep(backoff * 2 ** attempt)
+    if response is None:
+        return None
+    if response.status_code == 304:
+        return Response(304, None, _header(response, 'ETag') or etag, _header(response, 'Last-Modified') or last_modified)
+    if response.status_code != 200:
+        return None
+    try:
+        data = response.json()
+    except ValueError:  # Not JSON, e.g. the login page of a captive portal or an error page of a proxy
+        return None
+    return Response(200, data, _header(response, 'ETag'), _header(response, 'Last-Modified'))
+
+class SingleFlight:
+    '''
+    Represents calls that are shared by the callers asking for the same key at the same time
+    The first caller for a key runs the call; callers arriving while it runs wait for it
+    and get the same result (or exception) instead of repeating the work.
+    Attributes:
+    - calls(int): number of calls actually run
+    - shared(int): number of callers that got the result of another caller's call
+    '''
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> [event, result, exception] of the calls in progress
+
+    def do(self, key, function, *args):
+        '''
+        Runs a call, or waits for the identical call already in progress
+        Arguments:
+        - key: identifies the call, e.g. the url
+        - function(callable): the call, function(*args)
+        - args: the arguments of the call
+        Returns:
+        - the result of the call
+        '''
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = [threading.Event(), None, None]
+                self.calls += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+        if leader:
+            try:
+                flight[1] = function(*args)
+            except BaseException as exception:
+                flight[2] = exception
+            finally:
+                with self._lock:
+                    del self._flights[key]  # Later callers make a new call
+                flight[0].set()
+        else:
+            flight[0].wait()
+        if flight[2] is not None:
+            raise flight[2]
+        return flight[1]
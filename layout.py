@@ -0,0 +1,131 @@
+'''
+Layout of the battle buttons
+The buttons of a screen are computed once per change of state and kept in a Layout,
+which answers click and hover queries with plain arithmetic. Nothing in here draws
+or imports pygame: the game draws the widgets of the layout in a separate pass, so
+the rects it draws are the same ones the clicks are tested against.
+'''
+
+BUTTON_WIDTH = 100
+BUTTON_HEIGHT = 50
+BUTTON_MARGIN = 10  # Space between the move buttons
+MOVE_SLOTS = 4  # The move buttons are centered as if there were always 4 of them
+MOVE_BOX_HEIGHT = 90
+
+class Widget:
+    '''
+    Represents a button on screen
+    Attributes:
+    - name(str): identifies the button from one frame to the next
+    - rect(tuple): (left, top, width, height) of the button
+    - label(str): the text of the button
+    - action: what clicking the button does, e.g. 'fight', 'potion' or a Move
+    '''
+    __slots__ = ('name', 'rect', 'label', 'action')
+
+    def __init__(self, name, rect, label, action):
+        self.name = name
+        self.rect = rect
+        self.label = label
+        self.action = action
+
+    def contains(self, position):
+        '''
+        Checks if a point is on the button
+        Arguments:
+        - position(tuple): (x, y) of the point
+        Returns:
+        - bool: True if the point is inside the button, with the same edges as pygame.Rect.collidepoint
+        '''
+        left, top, width, height = self.rect
+        x, y = position
+        return left <= x < left + width and top <= y < top + height
+
+class Layout:
+    '''
+    Represents the buttons of a screen
+    Attributes:
+    - widgets(tuple): the Widgets, in drawing order
+    - key(tuple): the state the layout was computed for, set by LayoutCache
+    '''
+    __slots__ = ('widgets', 'key')
+
+    def __init__(self, widgets, key=None):
+        self.widgets = tuple(widgets)
+        self.key = key
+
+    def hit(self, position):
+        '''
+        Finds the button under a point
+        Arguments:
+        - position(tuple): (x, y) of the point, e.g. a click
+        Returns:
+        - Widget: the button, None if the point is not on a button
+        '''
+        for widget in self.widgets:
+            if widget.contains(position):
+                return widget
+        return None
+
+EMPTY = Layout(())  # Screens without buttons
+
+def turn_layout(pokemon_bottom, num_potions):
+    '''
+    Computes the buttons of the player's turn
+    Arguments:
+    - pokemon_bottom(int): y-coordinate of the bottom of the player's pokemon, the buttons go under it
+    - num_potions(int): the potions left, shown on the potion button
+    Returns:
+    - Layout: the Fight and Potion buttons
+    '''
+    top = pokemon_bottom + 20
+    return Layout([
+        Widget('fight', (50, top, BUTTON_WIDTH, BUTTON_HEIGHT), 'Fight', 'fight'),
+        Widget('potion', (200, top, BUTTON_WIDTH, BUTTON_HEIGHT), f'Potion ({num_potions})', 'potion'),
+    ])
+
+def move_layout(moves, screen_width, screen_height):
+    '''
+    Computes the move buttons, in a row centered at the bottom of the screen
+    Arguments:
+    - moves(list): the moves of the player's pokemon
+    - screen_width(int): width of the game screen
+    - screen_height(int): height of the game screen
+    Returns:
+    - Layout: one button per move, whose action is the move
+    '''
+    box_top = screen_height - 100
+    starting_x = (screen_width - (BUTTON_WIDTH * MOVE_SLOTS + BUTTON_MARGIN * (MOVE_SLOTS - 1))) / 2
+    top = box_top + (MOVE_BOX_HEIGHT - BUTTON_HEIGHT) / 2  # Centered vertically within the move box
+    widgets = [Widget(f'move {i}', (starting_x + (BUTTON_WIDTH + BUTTON_MARGIN) * i, top, BUTTON_WIDTH, BUTTON_HEIGHT),
+                      move.name.capitalize(), move)
+               for i, move in enumerate(moves)]
+    return Layout(widgets)
+
+class LayoutCache:
+    '''
+    Keeps the layout of the current screen, computing it again only when the state changes
+    Attributes:
+    - layout(Layout): the layout of the last state
+    - builds(int): number of layouts computed
+    '''
+    def __init__(self):
+        self.layout = EMPTY
+        self.builds = 0
+
+    def get(self, key, build, *args):
+        '''
+        Gets the layout for a state
+        Arguments:
+        - key(tuple): identifies the state (it must change whenever the buttons do)
+        - build(callable): computes the layout, called as build(*args) when the key changed
+        - args: the arguments of build
+        Returns:
+        - Layout: the layout of the state
+        '''
+        if self.layout.key != key:
+            layout = build(*args)
+            layout.key = key
+            self.layout = layout
+            self.builds += 1
+        return self.layout
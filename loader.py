@@ -0,0 +1,91 @@
+'''
+Background loading
+Network and disk work (species data, moves, sprite files) runs on worker threads while
+the main thread keeps drawing frames. Results are handed back to the main thread by
+poll(), called once per frame by the game loop, so the callbacks can safely create
+pygame surfaces and change the game state.
+'''
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+class Loader:
+    '''
+    Represents a pool of loading threads whose results are delivered on the main thread
+    Attributes:
+    - submitted(int): number of jobs submitted
+    - completed(int): number of jobs whose result was delivered by poll
+    - failed(int): number of jobs that raised an exception
+    '''
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='loader')
+        self._finished = queue.SimpleQueue()  # (future, on_done, on_error) of jobs that are over
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def busy(self):
+        '''
+        Whether some jobs have not been delivered yet
+        Returns:
+        - bool: True while jobs are running or waiting for poll
+        '''
+        return self.completed < self.submitted
+
+    @property
+    def progress(self):
+        '''
+        Returns the fraction of the submitted jobs that have been delivered
+        Returns:
+        - float: between 0 and 1 (1 when nothing was submitted)
+        '''
+        return self.completed / self.submitted if self.submitted else 1.0
+
+    def submit(self, job, *args, on_done=None, on_error=None):
+        '''
+        Runs a job on a worker thread
+        Arguments:
+        - job(callable): the work to do, called as job(*args) on a worker thread
+        - args: the arguments of the job
+        - on_done(callable): called with the result of the job, on the main thread
+        - on_error(callable): called with the exception raised by the job, on the main thread
+        Returns:
+        - concurrent.futures.Future: the future of the job
+        '''
+        self.submitted += 1
+        future = self._executor.submit(job, *args)
+        future.add_done_callback(lambda future: self._finished.put((future, on_done, on_error)))
+        return future
+
+    def poll(self, limit=None):
+        '''
+        Delivers the results of the finished jobs (must be called from the main thread)
+        Arguments:
+        - limit(int): the most results to deliver, None for all of them
+        Returns:
+        - int: the number of results delivered
+        '''
+        delivered = 0
+        while limit is None or delivered < limit:
+            try:
+                future, on_done, on_error = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            delivered += 1
+            self.completed += 1
+            error = future.exception()
+            if error is not None:
+                self.failed += 1
+                if on_error is not None:
+                    on_error(error)
+                else:
+                    print(f"Error while loading: {error}")
+            elif on_done is not None:
+                on_done(future.result())
+        return delivered
+
+    def shutdown(self):
+        '''
+        Stops the worker threads once their current jobs are over, dropping the queued ones
+        '''
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,325 @@
+'''
+Access to the PokeAPI data used by the game
+Nothing in here needs pygame or a display, so the data can be loaded by tools
+(simulations, tournaments...) as well as by the game. APIManager and Move used to live
+in PokemonCombat.py, which still imports them from here (tournament workers must load
+the data without importing pygame).
+'''
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import http_transport
+from api_cache import ResponseCache
+from telemetry import telemetry
+
+DEFAULT_BUNDLE = 'default'  # APIManager.bundle until first use: the bundle built by bundle.py, if there is one
+
+class APIManager:
+    '''
+    Represents the management of the API Request to get Pokemon data
+    Attributes:
+    - BASE_URL (str): the base url for the pokemon api
+    - cache (ResponseCache): on-disk cache of the responses, None to always use the network
+    - bundle (DataBundle): offline data bundle checked before the cache, None if not used, DEFAULT_BUNDLE to open the one built by bundle.py on first use
+    - session (requests.Session): shared session so connections are pooled and kept alive, created on the first request
+    - _flights (SingleFlight): requests in progress, shared by the callers of the same url
+    - max_workers (int): default number of concurrent requests for batched fetches
+    - max_retries (int): number of retries for connection errors and 5xx/429 responses
+    - backoff (float): base delay in seconds between retries, doubled on every attempt
+    - timeout (float): seconds to wait for the server before giving up on a request
+    '''
+    BASE_URL = 'https://pokeapi.co/api/v2'
+    cache = ResponseCache(offline=os.environ.get('POKEAPI_OFFLINE') == '1')
+    bundle = DEFAULT_BUNDLE
+    max_workers = 8
+    max_retries = 3
+    backoff = 0.25
+    timeout = 10
+    session = None
+    _session_lock = threading.Lock()
+    _bundle_lock = threading.Lock()
+    _flights = http_transport.SingleFlight()
+
+    @staticmethod
+    def get_session():
+        '''
+        Gets the shared session, creating it on first use (importing requests is slow, so it
+        only happens once something is actually fetched)
+        Returns:
+        - requests.Session: the session
+        '''
+        with APIManager._session_lock:
+            if APIManager.session is None:
+                import requests
+                session = requests.Session()
+                session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=APIManager.max_workers))
+                session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=APIManager.max_workers))
+                APIManager.session = session
+            return APIManager.session
+
+    @staticmethod
+    def get_bundle():
+        '''
+        Gets the offline data bundle, opening the one built by bundle.py on first use so the
+        game, the simulations and the tournaments all read from it when it exists
+        Returns:
+        - DataBundle: the bundle, or None if it is not used or has not been built
+        '''
+        if APIManager.bundle is DEFAULT_BUNDLE:
+            with APIManager._bundle_lock:
+                if APIManager.bundle is DEFAULT_BUNDLE:
+                    from bundle import DEFAULT_BUNDLE_PATH, DataBundle  # bundle.py imports this module
+                    APIManager.bundle = DataBundle(DEFAULT_BUNDLE_PATH) if os.path.exists(DEFAULT_BUNDLE_PATH) else None
+        return APIManager.bundle
+
+    @staticmethod
+    def fetch_json(url):
+        '''
+        Gets JSON data for a URL, from the cache when possible
+        Arguments:
+        - url(str): the url to get
+        Returns:
+        - dictionary containing the data, or None if it could not be fetched
+        '''
+        bundle = APIManager.get_bundle()
+        if bundle is not None:
+            data = bundle.get_json(url)
+            if data is not None:
+                telemetry.count('api_bundle_hits')
+                return data
+        cache = APIManager.cache
+        entry = None
+        if cache is not None:
+            entry = cache.get_entry(url)
+            if entry is not None and (entry.fresh or cache.offline):
+                telemetry.count('api_cache_hits')
+                return entry.data
+            if cache.offline:
+                return None  # Offline mode never touches the network
+        # Callers asking for the same url at the same time share one request
+        return APIManager._flights.do(url, APIManager._request, url, entry)
+
+    @staticmethod
+    def _request(url, entry):
+        '''
+        Gets JSON data for a URL from the network, revalidating the expired cached copy if there is one
+        Arguments:
+        - url(str): the url to get
+        - entry(CacheEntry): the expired cached copy, None if the url is not cached
+        Returns:
+        - dictionary containing the data, or None if it could not be fetched
+        '''
+        cache = APIManager.cache
+        with telemetry.timer('api_request_ms'):  # Includes the retries and their backoff
+            response = http_transport.get_json(APIManager.get_session(), url, APIManager.timeout, APIManager.max_retries,
+                                               APIManager.backoff, entry.etag if entry else None,
+                                               entry.last_modified if entry else None)
+        if response is None:
+            telemetry.count('api_failures')
+            return entry.data if entry is not None else None  # An expired copy beats no data at all
+        if response.status == 304:
+            telemetry.count('api_revalidated')
+            cache.revalidated(url, response.etag, response.last_modified)
+            return entry.data
+        if cache is not None:
+            cache.put(url, response.data, response.etag, response.last_modified)
+        return response.data
+
+    @staticmethod
+    def fetch_many(urls, max_workers=None):
+        '''
+        Gets JSON data for several URLs concurrently
+        Arguments:
+        - urls(list): the urls to get
+        - max_workers(int): the maximum number of requests in flight, defaults to APIManager.max_workers
+        Returns:
+        - list with the data for each url (None for failures), in the same order as urls
+        '''
+        workers = min(max_workers or APIManager.max_workers, len(urls))
+        if workers <= 1:
+            return [APIManager.fetch_json(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(APIManager.fetch_json, urls))  # map keeps the input order
+
+    @staticmethod
+    def get_pokemon_data(name):
+        '''
+        Gets the pokemon data from the API by name
+        Arguments:
+        - name(str): the name is the pokemon to get
+        Returns:
+        - dictionary containing the data
+        '''
+        return APIManager.fetch_json(f'{APIManager.BASE_URL}/pokemon/{name.lower()}')
+
+    @staticmethod
+    def get_move_data(url):
+        '''
+        Gets move data from the API by URL
+        Arguments:
+        - url(str): the url of the move to get
+        Returns:
+        - dictionary with the move data
+        '''
+        return APIManager.fetch_json(url)
+
+class Move:
+    '''
+    Represents the pokemon move
+    Attributes:
+    - name(str): name of the move
+    - power(int): power of the move
+    - type(str): type of move
+    - registry(dict): moves already built in this process, keyed by url (shared by every pokemon)
+    '''
+    __slots__ = ('name', 'power', 'type')
+    registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, url, data=None):
+        if data is None:
+            data = APIManager.get_move_data(url)
+        self.name = data['name']
+        self.power = data['power']
+        self.type = data['type']['name']
+
+    @staticmethod
+    def get(url):
+        '''
+        Gets the shared move for a URL, fetching and building it only the first time
+        Arguments:
+        - url(str): the url of the move to get
+        Returns:
+        - Move: the interned move, or None if it could not be fetched
+        '''
+        moves = Move.load_many([url])
+        return moves[0] if moves else None
+
+    @staticmethod
+    def load_many(urls, max_workers=None):
+        '''
+        Gets the shared moves for several URLs, fetching the ones not built yet concurrently
+        Arguments:
+        - urls(list): the urls of the moves to get
+        - max_workers(int): the maximum number of requests in flight
+        Returns:
+        - list of Move objects in the same order as urls (moves that failed to load are skipped)
+        '''
+        missing = [url for url in dict.fromkeys(urls) if url not in Move.registry]
+        if missing:
+            datas = APIManager.fetch_many(missing, max_workers)
+            with Move._registry_lock:
+                for url, data in zip(missing, datas):
+                    if data is not None:
+                        Move.registry.setdefault(url, Move(url, data))
+        return [Move.registry[url] for url in urls if url in Move.registry]
+
+class SpeciesRecord:
+    '''
+    Represents the trimmed data of a species: only what battles and sprites need
+    The raw API data (hundreds of KB with every game's learnset) is dropped once this is built.
+    Attributes:
+    - name(str): name of the species
+    - hp(int): base HP stat
+    - attack(int): base attack stat
+    - defense(int): base defense stat
+    - speed(int): base speed stat
+    - types(tuple): names of the species' types
+    - learnset(tuple): (url, level_learned) of each move learned by level-up in red-blue
+    - sprites(dict): url of the 'front_default' and 'back_default' images
+    '''
+    __slots__ = ('name', 'hp', 'attack', 'defense', 'speed', 'types', 'learnset', 'sprites')
+
+    def __init__(self, name, hp, attack, defense, speed, types, learnset, sprites):
+        self.name = name
+        self.hp = hp
+        self.attack = attack
+        self.defense = defense
+        self.speed = speed
+        self.types = tuple(types)
+        self.learnset = tuple(learnset)
+        self.sprites = sprites
+
+    @staticmethod
+    def from_api(data):
+        '''
+        Extracts the record from the pokemon data of the API
+        Arguments:
+        - data(dict): the pokemon data from the API
+        Returns:
+        - SpeciesRecord: the trimmed record
+        '''
+        stats = {stat['stat']['name']: stat['base_stat'] for stat in data['stats']}
+        learnset = {}
+        for move_info in data['moves']:
+            versions = move_info['version_group_details']
+            for version in versions:
+                if version['version_group']['name'] == 'red-blue' and version['move_learn_method']['name'] == 'level-up':
+                    url = move_info['move']['url']
+                    learnset[url] = min(version['level_learned_at'], learnset.get(url, version['level_learned_at']))
+        sprites = {side: data['sprites'].get(side) for side in ('front_default', 'back_default')}
+        return SpeciesRecord(data['name'], stats.get('hp'), stats.get('attack'), stats.get('defense'),
+                             stats.get('speed'), [t['type']['name'] for t in data['types']],
+                             learnset.items(), sprites)
+
+    def max_hp(self, level):
+        '''
+        Returns the HP of the species at a level
+        Arguments:
+        - level(int): the level of the pokemon
+        Returns:
+        - int: the HP when fully healed
+        '''
+        return self.hp + level
+
+    def move_urls(self, level):
+        '''
+        Lists the moves a pokemon of this species knows by its level
+        Arguments:
+        - level(int): the level of the pokemon
+        Returns:
+        - list with the url of each move
+        '''
+        return [url for url, level_learned in self.learnset if level >= level_learned]
+
+_species = {}  # Records already built in this process, keyed by lowercase name
+
+def load_species(name):
+    '''
+    Gets the shared record of a species, fetching it only the first time
+    Arguments:
+    - name(str): the name of the species
+    Returns:
+    - SpeciesRecord: the record, or None if the data could not be fetched
+    '''
+    key = name.lower()
+    record = _species.get(key)
+    if record is None:
+        data = APIManager.get_pokemon_data(key)
+        if data is None:
+            return None
+        record = _species.setdefault(key, SpeciesRecord.from_api(data))
+    return record
+
+def choose_moves(urls, rng=random, count=4):
+    '''
+    Picks random moves with power among the candidates, fetching only the ones needed
+    Arguments:
+    - urls(list): the urls of the candidate moves
+    - rng(random.Random): source of the random choice
+    - count(int): the number of moves to pick
+    Returns:
+    - list of Move objects (fewer than count if there are not enough moves with power)
+    '''
+    # Pick the candidates in random order and only fetch as many as are still needed,
+    # moves without power are replaced by the next candidates
+    urls = list(urls)
+    rng.shuffle(urls)
+    moves = []
+    next_candidate = 0
+    while len(moves) < count and next_candidate < len(urls):
+        batch = urls[next_candidate:next_candidate + count - len(moves)]
+        next_candidate += len(batch)
+        moves.extend(move for move in Move.load_many(batch) if move.power is not None)  # To make sure move has power attribute
+    return moves
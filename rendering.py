@@ -0,0 +1,197 @@
+'''
+Dirty rectangle rendering for the game screen
+Every frame the game describes what is on screen as a list of elements. The renderer
+compares them with the previous frame and only redraws (and sends to the display) the
+areas that changed. When nothing changed it does no drawing at all.
+'''
+import pygame
+from text_cache import text_cache
+
+class Element:
+    '''
+    Represents something drawn on the screen
+    Attributes:
+    - name(str): identifies the element from one frame to the next
+    - key(tuple): everything that changes how the element looks (HP, hover state, label...)
+    - rect(pygame.Rect): the area covered by the element
+    - draw(callable): draws the element, called as draw(surface)
+    '''
+    __slots__ = ('name', 'key', 'rect', 'draw')
+
+    def __init__(self, name, key, rect, draw):
+        self.name = name
+        self.key = key
+        self.rect = pygame.Rect(rect)
+        self.draw = draw
+
+class FrameRenderer:
+    '''
+    Represents the renderer of the game screen
+    Attributes:
+    - screen(pygame.Surface): the display surface
+    - background(pygame.Surface): cached static background layer
+    - frames(int): number of frames rendered
+    - skipped(int): number of frames where nothing changed and nothing was drawn
+    '''
+    def __init__(self, screen, background_color):
+        self.screen = screen
+        self.background = pygame.Surface(screen.get_size())
+        self.background.fill(background_color)
+        self.frames = 0
+        self.skipped = 0
+        self._previous = None  # Elements of the last frame, by name
+        self._invalid = []  # Areas drawn over by someone else since the last frame
+
+    def invalidate(self, rect=None):
+        '''
+        Marks an area as changed outside the renderer (e.g. a message box), so it is redrawn next frame
+        Arguments:
+        - rect(pygame.Rect): the area that changed, None for the whole screen
+        '''
+        if rect is None:
+            self._previous = None
+        else:
+            self._invalid.append(pygame.Rect(rect))
+
+    def render(self, elements):
+        '''
+        Draws a frame, redrawing only the areas that changed since the last one
+        Arguments:
+        - elements(list): the Elements on screen, in drawing order
+        Returns:
+        - list of pygame.Rect: the areas that were updated on the display (empty if nothing changed)
+        '''
+        self.frames += 1
+        current = {element.name: element for element in elements}
+        if self._previous is None:
+            dirty = [self.screen.get_rect()]
+        else:
+            dirty = self._invalid
+            for name, element in current.items():
+                old = self._previous.get(name)
+                if old is None:
+                    dirty.append(element.rect)
+                elif old.key != element.key or old.rect != element.rect:
+                    dirty.append(old.rect)
+                    dirty.append(element.rect)
+            for name, old in self._previous.items():
+                if name not in current:
+                    dirty.append(old.rect)
+        self._previous = current
+        self._invalid = []
+        if not dirty:
+            self.skipped += 1
+            return dirty
+
+        dirty = _merge(dirty)
+        for area in dirty:
+            self.screen.set_clip(area)
+            self.screen.blit(self.background, area, area)
+            for element in elements:
+                if element.rect.colliderect(area):
+                    element.draw(self.screen)
+        self.screen.set_clip(None)
+        pygame.display.update(dirty)
+        return dirty
+
+def _merge(rects):
+    '''
+    Merges overlapping rectangles so no area is drawn twice
+    Arguments:
+    - rects(list): the rectangles to merge
+    Returns:
+    - list of pygame.Rect without overlaps between them
+    '''
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        overlapping = rect.collidelist(merged)
+        while overlapping != -1:
+            rect.union_ip(merged.pop(overlapping))
+            overlapping = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+class HPBar:
+    '''
+    Represents an HP bar with its "HP: x / y" text, drawn in constant time
+    The bar is kept pre-rendered on a surface that is only redrawn (in place, without
+    allocating a new surface) when the shown HP changes. When the HP drops or rises, the
+    shown value moves towards it at drain_rate HP per second for a smooth animation.
+    Attributes:
+    - width(int): width of the bar in pixels
+    - height(int): height of the bar in pixels
+    - drain_rate(float): HP per second the shown value moves by, None to jump straight to the HP
+    - shown_hp(float): the HP currently shown, None before the first update
+    '''
+    def __init__(self, width=200, height=20, drain_rate=40, colors=((200, 0, 0), (0, 200, 0), (0, 0, 0))):
+        self.width = width
+        self.height = height
+        self.drain_rate = drain_rate
+        self.shown_hp = None
+        self.redraws = 0
+        self._empty_color, self._full_color, self._text_color = colors
+        self._surface = pygame.Surface((width, height + 30), pygame.SRCALPHA)
+        self._drawn = None  # (shown HP, max HP) currently on the surface
+        self._last_update = None
+
+    def reset(self):
+        '''
+        Forgets the shown HP so the next update jumps straight to the current HP
+        '''
+        self.shown_hp = None
+
+    def update(self, current_hp, max_hp, now=None):
+        '''
+        Moves the shown HP towards the current HP
+        Arguments:
+        - current_hp(int): the pokemon's HP
+        - max_hp(int): the pokemon's HP when fully healed
+        - now(int): the current time in milliseconds, defaults to pygame.time.get_ticks()
+        Returns:
+        - int: the HP to show
+        '''
+        now = pygame.time.get_ticks() if now is None else now
+        if self.shown_hp is None or self.drain_rate is None:
+            self.shown_hp = current_hp
+        elif self.shown_hp != current_hp:
+            step = self.drain_rate * (now - self._last_update) / 1000
+            if abs(current_hp - self.shown_hp) <= step:
+                self.shown_hp = current_hp
+            elif current_hp < self.shown_hp:
+                self.shown_hp -= step
+            else:
+                self.shown_hp += step
+        self._last_update = now
+        return round(self.shown_hp)
+
+    def draw(self, surface, x, y, current_hp, max_hp):
+        '''
+        Draws the bar and its text
+        Arguments:
+        - surface(pygame.Surface): the surface on which to draw
+        - x(int): the x-coordinate of the bar
+        - y(int): the y-coordinate of the bar
+        - current_hp(int): the pokemon's HP
+        - max_hp(int): the pokemon's HP when fully healed
+        '''
+        shown = self.update(current_hp, max_hp)
+        if self._drawn != (shown, max_hp):
+            self._redraw(shown, max_hp)
+        surface.blit(self._surface, (x, y))
+
+    def _redraw(self, shown, max_hp):
+        '''
+        Redraws the cached surface: two rects and the text, whatever the max HP is
+        Arguments:
+        - shown(int): the HP to show
+        - max_hp(int): the pokemon's HP when fully healed
+        '''
+        self.redraws += 1
+        self._surface.fill((0, 0, 0, 0))
+        self._surface.fill(self._empty_color, (0, 0, self.width, self.height))
+        filled = self.width * max(0, min(shown, max_hp)) // max_hp if max_hp > 0 else 0
+        if filled:
+            self._surface.fill(self._full_color, (0, 0, filled, self.height))
+        self._surface.blit(text_cache.render(f'HP: {shown} / {max_hp}', 16, self._text_color), (0, 30))
+        self._drawn = (shown, max_hp)
@@ -0,0 +1,552 @@
+'''
+Battle replay log
+Battles are recorded as compact binary records appended to a log file: the seed of
+the battle's random numbers, the two pokemon, then one small record per action (the
+move or potion, the critical roll and the HP left). Names and pokemon are written once
+per writing session and referenced by number afterwards, so a simulated battle between
+pokemon already defined costs a few bytes per action. Each session appended to a file
+starts a new segment with its own numbers, so opening a log never reads it.
+
+The size of the file after the last finished battle is kept in a small sidecar file
+(path + '.end'). If the process was killed in the middle of a battle, the next writer
+cuts the file back to that size and the log stays readable.
+
+The file is read as a stream, one battle at a time, so logs of millions of battles
+can be summarized or verified without loading them. A replay plays the recorded
+actions again through battle_engine with the recorded seed and checks that every
+critical roll, damage and HP matches.
+
+Replays assume the battle's random numbers are only used for the critical rolls:
+actions come from the players, the rival's AI or a policy, never from the battle's
+generator (the game's rival searches with ExpectimaxAI, record_simulation picks
+moves with a separate generator).
+Usage: python replay.py stats battles.replay
+       python replay.py verify battles.replay
+'''
+import argparse
+import os
+import random
+import struct
+import time
+import battle_engine
+
+DEFAULT_REPLAY_PATH = os.environ.get(
+    'POKEMON_REPLAY_LOG',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'battles.replay'))
+
+MAGIC = b'PKRP'
+VERSION = 2  # 2 added the segments
+END_SUFFIX = '.end'  # Sidecar file holding the size of the log after the last finished battle
+NO_POWER = 0xFFFF  # Power of the moves without power (never used to attack)
+NO_WINNER = 0xFF
+PLAYER, RIVAL = 0, 1
+
+# Every record starts with a one byte tag
+STRING = b'S'  # id, length, utf-8 bytes
+COMBATANT = b'C'  # id, then the fields of the pokemon (see ReplayWriter._combatant_id)
+BATTLE = b'B'  # seed, player id, rival id
+ATTACK = b'A'  # side, move index, critical, damage, defender HP after the hit
+POTION = b'P'  # side, HP healed, HP after drinking
+END = b'E'  # winner side (NO_WINNER if none)
+SEGMENT = b'N'  # a new writing session, the names and pokemon are numbered again
+
+_HEADER = struct.Struct('<4sB')
+_STRING = struct.Struct('<HB')
+_COMBATANT = struct.Struct('<HHBHHHHBHBB')  # id, name, level, max HP, attack, defense, speed, potions, HP, types, moves
+_TYPE = struct.Struct('<H')
+_MOVE = struct.Struct('<HHH')  # name, power, type
+_BATTLE = struct.Struct('<QHH')
+_ATTACK = struct.Struct('<BBBHH')
+_POTION = struct.Struct('<BHH')
+_END = struct.Struct('<B')
+_OFFSET = struct.Struct('<Q')
+
+class ReplayMove:
+    '''
+    Represents a move read from a log, with what the battle rules need
+    Attributes:
+    - name(str): name of the move
+    - power(int): power of the move
+    - type(str): type of move
+    '''
+    __slots__ = ('name', 'power', 'type')
+
+    def __init__(self, name, power, type):
+        self.name = name
+        self.power = power
+        self.type = type
+
+class BattleLog:
+    '''
+    Represents one recorded battle
+    Attributes:
+    - seed(int): seed of the random numbers used for the critical rolls
+    - player(Combatant): the player's pokemon as it was when the battle started
+    - rival(Combatant): the rival's pokemon as it was when the battle started
+    - actions(list): ('attack', side, move index, critical, damage, HP after) and ('potion', side, healed, HP after) tuples
+    - winner(int): PLAYER or RIVAL, None if the battle did not end
+    '''
+    __slots__ = ('seed', 'player', 'rival', 'actions', 'winner')
+
+    def __init__(self, seed, player, rival):
+        self.seed = seed
+        self.player = player
+        self.rival = rival
+        self.actions = []
+        self.winner = None
+
+class ReplayWriter:
+    '''
+    Represents a replay log opened for appending
+    It can be used as a battle observer: begin() a battle, then pass record() as the
+    observer of battle_engine (or call it with the same events), the battle ends with
+    the 'faint' event or end().
+    Attributes:
+    - path(str): the log file
+    - battles(int): number of battles started by this writer
+    '''
+    def __init__(self, path=DEFAULT_REPLAY_PATH):
+        self.path = path
+        self.battles = 0
+        self._strings = {}  # Numbers of this session, see SEGMENT
+        self._combatants = {}
+        self._player = None  # Pokemon of the battle being recorded
+        self._rival = None
+        length = _appendable_length(path) if os.path.exists(path) and os.path.getsize(path) > 0 else None
+        if length is not None:
+            self._file = open(path, 'r+b')
+            self._file.truncate(length)
+            self._file.seek(length)
+            self._file.write(SEGMENT)
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(_HEADER.pack(MAGIC, VERSION))
+        self._end_file = open(path + END_SUFFIX, 'wb')
+        self._write_end(length or _HEADER.size)
+
+    def _write_end(self, length):
+        '''
+        Records the size of the log after the last finished battle in the sidecar file
+        Arguments:
+        - length(int): the size in bytes
+        '''
+        self._end_file.seek(0)
+        self._end_file.write(_OFFSET.pack(length))
+        self._end_file.flush()
+
+    def _string_id(self, text):
+        '''
+        Gets the number of a name, writing its definition the first time
+        Arguments:
+        - text(str): the name
+        Returns:
+        - int: its number in the file
+        '''
+        string_id = self._strings.get(text)
+        if string_id is None:
+            string_id = self._strings[text] = len(self._strings)
+            data = text.encode('utf-8')
+            self._file.write(STRING + _STRING.pack(string_id, len(data)) + data)
+        return string_id
+
+    def _combatant_id(self, pokemon):
+        '''
+        Gets the number of a pokemon's starting state, writing its definition the first time
+        Arguments:
+        - pokemon(pokemon): the pokemon (a Combatant, a game Pokemon...)
+        Returns:
+        - int: its number in the file
+        '''
+        key = _combatant_key(pokemon)
+        combatant_id = self._combatants.get(key)
+        if combatant_id is None:
+            combatant_id = self._combatants[key] = len(self._combatants)
+            ids = [self._string_id(text) for text in (pokemon.name,) + tuple(pokemon.types)]
+            moves = [(self._string_id(move.name), NO_POWER if move.power is None else move.power, self._string_id(move.type))
+                     for move in pokemon.moves]
+            parts = [COMBATANT, _COMBATANT.pack(combatant_id, ids[0], pokemon.level, pokemon.max_hp, pokemon.attack,
+                                                pokemon.defense, pokemon.speed, pokemon.num_potions, pokemon.current_hp,
+                                                len(pokemon.types), len(moves))]
+            parts.extend(_TYPE.pack(type_id) for type_id in ids[1:])
+            parts.extend(_MOVE.pack(*move) for move in moves)
+            self._file.write(b''.join(parts))
+        return combatant_id
+
+    def begin(self, seed, player, rival):
+        '''
+        Starts recording a battle, must be called before any action
+        Arguments:
+        - seed(int): seed of the random numbers used for the critical rolls (64 bits)
+        - player(pokemon): the player's pokemon, as it is before the first action
+        - rival(pokemon): the rival's pokemon
+        '''
+        if self._player is not None:
+            self.end()
+        record = BATTLE + _BATTLE.pack(seed, self._combatant_id(player), self._combatant_id(rival))
+        self._file.write(record)
+        self._player, self._rival = player, rival
+        self.battles += 1
+
+    def _side(self, pokemon):
+        return PLAYER if pokemon is self._player else RIVAL
+
+    def record(self, event, data):
+        '''
+        Records an event of the battle being recorded (used as a battle_engine observer)
+        Arguments:
+        - event(str): 'damage', 'potion' or 'faint', other events are ignored
+        - data(dict): the details of the event
+        '''
+        if self._player is None:
+            return
+        if event == 'damage':
+            attacker, defender = data['attacker'], data['defender']
+            move_index = attacker.moves.index(data['move'])
+            self._file.write(ATTACK + _ATTACK.pack(self._side(attacker), move_index, data['critical'],
+                                                   data['damage'], defender.current_hp))
+        elif event == 'potion':
+            pokemon = data['pokemon']
+            self._file.write(POTION + _POTION.pack(self._side(pokemon), data['healed'], pokemon.current_hp))
+        elif event == 'faint':
+            self.end(data['winner'])
+
+    def end(self, winner=None):
+        '''
+        Ends the battle being recorded and flushes it to the file
+        Arguments:
+        - winner(pokemon): the pokemon that won, None if the battle was left before the end
+        '''
+        if self._player is None:
+            return
+        self._file.write(END + _END.pack(NO_WINNER if winner is None else self._side(winner)))
+        self._file.flush()  # A crash only loses the battle being played
+        self._write_end(self._file.tell())
+        self._player = self._rival = None
+
+    def close(self):
+        '''
+        Ends the current battle (if any) and closes the file
+        '''
+        self.end()
+        self._file.flush()
+        self._write_end(self._file.tell())
+        self._file.close()
+        self._end_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _appendable_length(path):
+    '''
+    Finds where a writer can append to an existing log: after the last finished battle
+    The size is read from the sidecar file. Without it (or if it does not match the
+    log) the log is read once to find its last finished battle. A log that cannot be
+    appended to is moved aside.
+    Arguments:
+    - path(str): the log file
+    Returns:
+    - int: the size to cut the log back to, None if a new log must be started
+    '''
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        header = file.read(_HEADER.size)
+    if len(header) == _HEADER.size and _HEADER.unpack(header) == (MAGIC, VERSION):
+        length = None
+        try:
+            with open(path + END_SUFFIX, 'rb') as file:
+                length = _OFFSET.unpack(file.read(_OFFSET.size))[0]
+        except (OSError, struct.error):
+            pass
+        if length is None or not _HEADER.size <= length <= size:
+            length = _scan_length(path)
+        if length < size:
+            print(f'Replay log {path} ended with an unfinished record, {size - length} bytes dropped')
+        return length
+    aside = f'{path}.{int(time.time())}.bak'
+    os.replace(path, aside)
+    print(f'{path} is not a replay log of version {VERSION}, moved to {aside}')
+    return None
+
+def _scan_length(path):
+    '''
+    Reads a log to find the size after its last finished battle
+    Arguments:
+    - path(str): the log file
+    Returns:
+    - int: the size in bytes
+    '''
+    reader = ReplayReader(path)
+    length = _HEADER.size
+    try:
+        for record in reader.records():
+            if record[0] == END or record[0] == SEGMENT:
+                length = reader.position
+    except (ValueError, KeyError):  # Cut in the middle of a record
+        pass
+    return length
+
+def _combatant_key(pokemon):
+    '''
+    Describes the starting state of a pokemon, two pokemon with the same key share a definition
+    Arguments:
+    - pokemon(pokemon): the pokemon
+    Returns:
+    - tuple of every field written to the log
+    '''
+    return (pokemon.name, pokemon.level, pokemon.max_hp, pokemon.attack, pokemon.defense, pokemon.speed,
+            pokemon.num_potions, pokemon.current_hp, tuple(pokemon.types),
+            tuple((move.name, move.power, move.type) for move in pokemon.moves))
+
+class ReplayReader:
+    '''
+    Represents a replay log opened for reading, as a stream of records
+    Attributes:
+    - path(str): the log file
+    - position(int): bytes read up to the end of the last record returned
+    '''
+    def __init__(self, path=DEFAULT_REPLAY_PATH):
+        self.path = path
+        self.position = 0
+
+    def records(self):
+        '''
+        Reads the records one by one
+        Returns:
+        - generator of tuples starting with the record tag:
+          (STRING, id, text), (COMBATANT, id, Combatant), (BATTLE, seed, player id, rival id),
+          (ATTACK, side, move index, critical, damage, HP after), (POTION, side, healed, HP after), (END, winner),
+          (SEGMENT,) where the numbers of the names and pokemon start again
+        '''
+        strings = {}
+        combatants = {}
+        with open(self.path, 'rb') as file:
+            magic, version = _HEADER.unpack(_read(file, _HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f'{self.path} is not a replay log (version {VERSION})')
+            while True:
+                self.position = file.tell()
+                tag = file.read(1)
+                if not tag:
+                    return
+                if tag == ATTACK:
+                    record = (ATTACK,) + _ATTACK.unpack(_read(file, _ATTACK.size))
+                elif tag == POTION:
+                    record = (POTION,) + _POTION.unpack(_read(file, _POTION.size))
+                elif tag == BATTLE:
+                    record = (BATTLE,) + _BATTLE.unpack(_read(file, _BATTLE.size))
+                elif tag == END:
+                    record = (END,) + _END.unpack(_read(file, _END.size))
+                elif tag == SEGMENT:
+                    strings.clear()
+                    combatants.clear()
+                    record = (SEGMENT,)
+                elif tag == STRING:
+                    string_id, length = _STRING.unpack(_read(file, _STRING.size))
+                    strings[string_id] = _read(file, length).decode('utf-8')
+                    record = (STRING, string_id, strings[string_id])
+                elif tag == COMBATANT:
+                    (combatant_id, name, level, max_hp, attack, defense, speed, potions, current_hp,
+                     num_types, num_moves) = _COMBATANT.unpack(_read(file, _COMBATANT.size))
+                    types = [strings[_TYPE.unpack(_read(file, _TYPE.size))[0]] for _ in range(num_types)]
+                    moves = []
+                    for _ in range(num_moves):
+                        move_name, power, move_type = _MOVE.unpack(_read(file, _MOVE.size))
+                        moves.append(ReplayMove(strings[move_name], None if power == NO_POWER else power, strings[move_type]))
+                    combatants[combatant_id] = battle_engine.Combatant(strings[name], level, max_hp, attack, defense, speed,
+                                                                       types, moves, potions, current_hp)
+                    record = (COMBATANT, combatant_id, combatants[combatant_id])
+                else:
+                    raise ValueError(f'Corrupted replay log {self.path}: unknown record {tag!r}')
+                self.position = file.tell()
+                yield record
+
+    def battles(self):
+        '''
+        Reads the battles one by one (only one battle is in memory at a time)
+        Returns:
+        - generator of BattleLog, a battle left before the end has no winner
+        '''
+        combatants = {}
+        battle = None
+        for record in self.records():
+            tag = record[0]
+            if tag == ATTACK:
+                battle.actions.append(('attack',) + record[1:])
+            elif tag == POTION:
+                battle.actions.append(('potion',) + record[1:])
+            elif tag == BATTLE:
+                if battle is not None:
+                    yield battle
+                battle = BattleLog(record[1], combatants[record[2]], combatants[record[3]])
+            elif tag == END:
+                battle.winner = None if record[1] == NO_WINNER else record[1]
+                yield battle
+                battle = None
+            elif tag == COMBATANT:
+                combatants[record[1]] = record[2]
+            elif tag == SEGMENT:
+                combatants = {}
+        if battle is not None:
+            yield battle
+
+def _read(file, size):
+    '''
+    Reads exactly size bytes
+    Arguments:
+    - file(file): the log file
+    - size(int): the number of bytes
+    Returns:
+    - bytes: the data read
+    '''
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError(f'Truncated replay log {file.name}')
+    return data
+
+def _copy(combatant):
+    '''
+    Copies the starting state of a recorded pokemon, so it can be replayed more than once
+    Arguments:
+    - combatant(Combatant): the pokemon read from the log
+    Returns:
+    - Combatant: a copy
+    '''
+    return battle_engine.Combatant.from_pokemon(combatant)
+
+def replay_battle(log):
+    '''
+    Plays a recorded battle again and checks that it gives the same results
+    Arguments:
+    - log(BattleLog): the recorded battle
+    Returns:
+    - battle_engine.Battle: the battle played again
+    Raises:
+    - ValueError: if the critical rolls, the damage or the HP differ from the log
+    '''
+    hits = []
+    def observe(event, data):
+        if event == 'damage':
+            hits.append(data)
+    battle = battle_engine.Battle(_copy(log.player), _copy(log.rival), random.Random(log.seed), observers=[observe])
+    sides = (battle.player, battle.rival)
+    for number, action in enumerate(log.actions):
+        pokemon = sides[action[1]]
+        opponent = sides[1 - action[1]]
+        if action[0] == 'attack':
+            _, _, move_index, critical, damage, hp_after = action
+            battle.act(pokemon, pokemon.moves[move_index])
+            hit = hits.pop()
+            replayed = (hit['critical'], hit['damage'], opponent.current_hp)
+            if replayed != (bool(critical), damage, hp_after):
+                raise ValueError(f'Replay diverged at action {number}: recorded {(bool(critical), damage, hp_after)}, got {replayed}')
+        else:
+            _, _, healed, hp_after = action
+            battle.act(pokemon, battle_engine.POTION)
+            if pokemon.current_hp != hp_after:
+                raise ValueError(f'Replay diverged at action {number}: recorded {hp_after} HP, got {pokemon.current_hp}')
+    winner = None if battle.winner is None else sides.index(battle.winner)
+    if winner != log.winner and log.winner is not None:
+        raise ValueError(f'Replay diverged: recorded winner {log.winner}, got {winner}')
+    return battle
+
+def verify(path):
+    '''
+    Replays every battle of a log
+    Arguments:
+    - path(str): the log file
+    Returns:
+    - int: the number of battles replayed
+    Raises:
+    - ValueError: at the first battle that does not replay the same way
+    '''
+    count = 0
+    for count, log in enumerate(ReplayReader(path).battles(), 1):
+        try:
+            replay_battle(log)
+        except ValueError as error:
+            raise ValueError(f'Battle {count}: {error}') from None
+    return count
+
+def summarize(path):
+    '''
+    Computes aggregate statistics of a log, reading it as a stream
+    Arguments:
+    - path(str): the log file
+    Returns:
+    - dictionary with the number of battles, wins per side, unfinished battles, actions, critical hits and potions
+    '''
+    stats = {'battles': 0, 'player_wins': 0, 'rival_wins': 0, 'unfinished': 0,
+             'actions': 0, 'attacks': 0, 'critical_hits': 0, 'potions': 0, 'damage': 0}
+    battle_open = False
+    for record in ReplayReader(path).records():
+        tag = record[0]
+        if tag == ATTACK:
+            stats['attacks'] += 1
+            stats['critical_hits'] += record[3]
+            stats['damage'] += record[4]
+        elif tag == POTION:
+            stats['potions'] += 1
+        elif tag == BATTLE:
+            stats['battles'] += 1
+            stats['unfinished'] += battle_open
+            battle_open = True
+        elif tag == END:
+            battle_open = False
+            if record[1] == PLAYER:
+                stats['player_wins'] += 1
+            elif record[1] == RIVAL:
+                stats['rival_wins'] += 1
+            else:
+                stats['unfinished'] += 1
+    stats['unfinished'] += battle_open
+    stats['actions'] = stats['attacks'] + stats['potions']
+    return stats
+
+def record_simulation(path, player, rival, battles, seed=None):
+    '''
+    Simulates battles with random moves on both sides and records them
+    Arguments:
+    - path(str): the log file to append to
+    - player(pokemon): the player's pokemon
+    - rival(pokemon): the rival's pokemon, it acts first if it is faster
+    - battles(int): number of battles to play
+    - seed(int): seed for the random numbers, for reproducible logs
+    Returns:
+    - dictionary with the player's wins, the rival's wins and the total number of turns
+    '''
+    rng = random.Random(seed)  # Picks the moves and the seed of each battle
+    def random_move(battle, pokemon, opponent):
+        return rng.choice(pokemon.moves)
+    results = {'player_wins': 0, 'rival_wins': 0, 'turns': 0}
+    with ReplayWriter(path) as writer:
+        for _ in range(battles):
+            battle_seed = rng.getrandbits(64)
+            battle = battle_engine.Battle(battle_engine.Combatant.from_pokemon(player), battle_engine.Combatant.from_pokemon(rival),
+                                          random.Random(battle_seed), observers=[writer.record])
+            writer.begin(battle_seed, battle.player, battle.rival)
+            winner = battle.run(random_move, random_move)
+            if winner is None:
+                writer.end()
+            elif winner is battle.player:
+                results['player_wins'] += 1
+            else:
+                results['rival_wins'] += 1
+            results['turns'] += battle.turn
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Read battle replay logs')
+    parser.add_argument('command', choices=('stats', 'verify'))
+    parser.add_argument('path', nargs='?', default=DEFAULT_REPLAY_PATH)
+    args = parser.parse_args()
+    if args.command == 'stats':
+        for name, value in summarize(args.path).items():
+            print(f'{name}: {value}')
+    else:
+        print(f'Replayed {verify(args.path)} battles, all identical')
+
+if __name__ == '__main__':
+    main()
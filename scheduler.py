@@ -0,0 +1,78 @@
+'''
+Timeline scheduler for the game loop
+Instead of sleeping (which stops the window from pumping events and repainting), the
+game puts waits and delayed actions on a timeline that the main loop advances once
+per frame, so the loop keeps running at a steady frame rate.
+'''
+import heapq
+import itertools
+
+class Scheduler:
+    '''
+    Represents a timeline of waits and delayed callbacks, driven by the game loop
+    Attributes:
+    - now(int): the time of the last update, in milliseconds
+    - busy_until(int): the time at which the current waits are over
+    '''
+    def __init__(self):
+        self.now = 0
+        self.busy_until = 0
+        self._events = []  # Heap of (due time, sequence number, callback)
+        self._sequence = itertools.count()  # Keeps callbacks due at the same time in order
+
+    @property
+    def busy(self):
+        '''
+        Whether a wait is in progress or callbacks are still pending
+        Returns:
+        - bool: True while the timeline is playing
+        '''
+        return self.now < self.busy_until or bool(self._events)
+
+    def wait(self, delay):
+        '''
+        Adds a wait at the end of the current waits (replaces a time.sleep)
+        Arguments:
+        - delay(int): the length of the wait in milliseconds
+        '''
+        self.busy_until = max(self.busy_until, self.now) + delay
+
+    def after(self, delay, callback):
+        '''
+        Schedules a callback
+        Arguments:
+        - delay(int): milliseconds from now
+        - callback(callable): called without arguments from update once the delay has passed
+        '''
+        heapq.heappush(self._events, (self.now + delay, next(self._sequence), callback))
+
+    def then(self, callback):
+        '''
+        Schedules a callback for when the current waits are over (right away if there are none)
+        Arguments:
+        - callback(callable): called without arguments from update
+        '''
+        self.after(max(0, self.busy_until - self.now), callback)
+
+    def update(self, now):
+        '''
+        Advances the timeline, running the callbacks that are due
+        Arguments:
+        - now(int): the current time in milliseconds (e.g. pygame.time.get_ticks())
+        Returns:
+        - int: the number of callbacks run
+        '''
+        self.now = now
+        ran = 0
+        while self._events and self._events[0][0] <= now:
+            _, _, callback = heapq.heappop(self._events)
+            callback()
+            ran += 1
+        return ran
+
+    def clear(self):
+        '''
+        Cancels every wait and pending callback
+        '''
+        self._events.clear()
+        self.busy_until = self.now
@@ -0,0 +1,130 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from urllib.request import urlopen # To open URLs
+import pygame
+from telemetry import telemetry
+
+DEFAULT_SPRITE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sprite_cache')
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+class SpriteCache:
+    '''
+    Represents a two level cache for pokemon sprites
+    Downloaded image bytes are kept on disk, and decoded surfaces that are already
+    scaled to their target size are kept in memory, evicting the least recently used
+    ones once their pixel data goes over max_bytes.
+    Attributes:
+    - directory(str): the folder where the downloaded image files are kept
+    - max_bytes(int): memory budget for the decoded surfaces
+    - bundle(DataBundle): offline data bundle checked before the disk, None if not used
+    - offline(bool): if True, images that are not on disk or in the bundle are never downloaded
+    - hits(int): number of surfaces served from memory
+    - misses(int): number of surfaces that had to be decoded and scaled
+    - downloads(int): number of images fetched over the network
+    '''
+    def __init__(self, directory=DEFAULT_SPRITE_DIR, max_bytes=DEFAULT_MAX_BYTES, bundle=None, offline=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bundle = bundle
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.downloads = 0
+        self._surfaces = OrderedDict()
+        self._surface_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, url):
+        '''
+        Returns the file used to store the image of a URL
+        Arguments:
+        - url(str): the url of the image
+        Returns:
+        - str: path of the file in the cache directory
+        '''
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.png')
+
+    def get_bytes(self, url):
+        '''
+        Gets the encoded image for a URL, downloading it only if it is not on disk yet
+        Arguments:
+        - url(str): the url of the image
+        Returns:
+        - bytes: the encoded image
+        '''
+        if self.bundle is not None:
+            data = self.bundle.get_sprite(url)
+            if data is not None:
+                return data
+        path = self._path(url)
+        try:
+            with open(path, 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            if self.offline:
+                raise
+        with telemetry.timer('sprite_download_ms'):
+            data = urlopen(url).read()
+        self.downloads += 1
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)  # Readers never see a half written file
+        return data
+
+    def get_surface(self, key, url, width):
+        '''
+        Gets a decoded surface scaled to a width (keeping the aspect ratio)
+        Arguments:
+        - key(tuple): identifies the sprite, e.g. (species, side, width)
+        - url(str): the url of the image, used when the surface is not cached
+        - width(int): the target width of the surface
+        Returns:
+        - pygame.Surface: the scaled surface, shared between callers so it must not be drawn on
+        '''
+        with self._lock:
+            surface = self._surfaces.get(key)
+            if surface is not None:
+                self._surfaces.move_to_end(key)
+                self.hits += 1
+                return surface
+            self.misses += 1
+        data = self.get_bytes(url)
+        with telemetry.timer('sprite_decode_ms'):  # Decoding and scaling, without the download
+            image = pygame.image.load(io.BytesIO(data)).convert_alpha()
+            scale = width / image.get_width()
+            surface = pygame.transform.scale(image, (int(image.get_width() * scale), int(image.get_height() * scale)))
+        self._store(key, surface)
+        return surface
+
+    def _store(self, key, surface):
+        '''
+        Keeps a surface in memory, evicting the least recently used ones if over budget
+        Arguments:
+        - key(tuple): identifies the sprite
+        - surface(pygame.Surface): the surface to keep
+        '''
+        size = surface.get_width() * surface.get_height() * surface.get_bytesize()
+        with self._lock:
+            old = self._surfaces.pop(key, None)
+            if old is not None:
+                self._surface_bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+            self._surfaces[key] = surface
+            self._surface_bytes += size
+            while self._surface_bytes > self.max_bytes and len(self._surfaces) > 1:
+                _, evicted = self._surfaces.popitem(last=False)
+                self._surface_bytes -= evicted.get_width() * evicted.get_height() * evicted.get_bytesize()
+
+    def stats(self):
+        '''
+        Returns the cache counters
+        Returns:
+        - dictionary with hits, misses, downloads, surfaces and bytes
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'downloads': self.downloads,
+                    'surfaces': len(self._surfaces), 'bytes': self._surface_bytes}
@@ -0,0 +1,65 @@
+'''
+Team battles between parties of pokemon
+Builds parties from the API data and plays team battles between them. The members
+of a party are loaded concurrently (each one needs a species and several move
+requests), so building a 6 pokemon party takes about as long as loading one pokemon.
+Usage: python teams.py bulbasaur,charmander,squirtle pikachu,eevee,jigglypuff --level 30 --battles 1000
+'''
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import battle_engine
+from tournament import load_combatant
+
+MAX_PARTY_SIZE = 6
+
+def load_party(names, level, seed=0, loader=load_combatant):
+    '''
+    Builds a party, loading all its members at the same time
+    Arguments:
+    - names(list): names of the pokemon, in party order
+    - level(int): the level of every member
+    - seed(int): seed used to pick the moves of the members
+    - loader(callable): builds one member, called as loader(name, level, seed)
+    Returns:
+    - Party: the party, in the same order as names
+    '''
+    return load_parties([names], level, seed, loader)[0]
+
+def load_parties(teams, level, seed=0, loader=load_combatant):
+    '''
+    Builds several parties, every member of every party loading at the same time
+    Arguments:
+    - teams(list): one list of names per party
+    - level(int): the level of every member
+    - seed(int): seed used to pick the moves of the members
+    - loader(callable): builds one member, called as loader(name, level, seed)
+    Returns:
+    - list of Party, in the same order as teams
+    '''
+    for team in teams:
+        if not 0 < len(team) <= MAX_PARTY_SIZE:
+            raise ValueError(f'A party has 1 to {MAX_PARTY_SIZE} pokemon, got {len(team)}')
+    names = [name for team in teams for name in team]
+    if not names:
+        return []
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        members = iter(list(executor.map(lambda name: loader(name, level, seed), names)))
+    return [battle_engine.Party([next(members) for _ in team]) for team in teams]
+
+def main():
+    parser = argparse.ArgumentParser(description='Play team battles between two parties')
+    parser.add_argument('player', help='the player party, as comma separated names')
+    parser.add_argument('rival', help='the rival party, as comma separated names')
+    parser.add_argument('--level', type=int, default=30)
+    parser.add_argument('--battles', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    teams = [[name.strip().lower() for name in team.split(',') if name.strip()] for team in (args.player, args.rival)]
+    player, rival = load_parties(teams, args.level, args.seed)
+    results = battle_engine.simulate_teams(player, rival, args.battles, seed=args.seed)
+    print(f'Player wins: {results["player_wins"]}, rival wins: {results["rival_wins"]}, '
+          f'average rounds: {results["rounds"] / args.battles:.1f}')
+
+if __name__ == '__main__':
+    main()
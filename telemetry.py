@@ -0,0 +1,358 @@
+'''
+Lightweight telemetry for the game
+Timers, counters and histograms around the hot paths (API requests, sprite decoding,
+frames, turns), exported to a JSON lines file, a Prometheus text file or an
+in-process sink. Telemetry is off unless POKEMON_TELEMETRY names an output file, and
+while it is off every timer and counter is a single attribute check.
+- POKEMON_TELEMETRY=telemetry.jsonl appends a snapshot of the metrics as one JSON line per flush
+- POKEMON_TELEMETRY=metrics.prom rewrites the file in the Prometheus text format on every flush
+- POKEMON_PROFILE=cpu, memory or cpu,memory captures a cProfile profile and/or the
+  tracemalloc top allocations of the whole session into POKEMON_PROFILE_OUT (pokemon.prof by default)
+'''
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+BUCKETS = (1, 2, 5, 10, 16, 33, 50, 100, 250, 500, 1000, 2500, 10000)  # Upper bounds in milliseconds
+FLUSH_INTERVAL = 10.0  # Seconds between two flushes of the game loop
+
+class Histogram:
+    '''
+    Represents the distribution of a measurement over fixed buckets
+    Attributes:
+    - counts(list): number of values in each bucket, the last one is for values over every bound
+    - count(int): number of values
+    - total(float): sum of the values
+    - max(float): largest value
+    '''
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        '''
+        Estimates a quantile from the buckets
+        Arguments:
+        - q(float): the quantile, e.g. 0.95
+        Returns:
+        - float: the upper bound of the bucket holding the quantile (max for the last bucket)
+        '''
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': round(self.total, 3), 'max': round(self.max, 3),
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'buckets': list(self.counts)}
+
+class _NullTimer:
+    '''
+    Timer used while telemetry is off: entering and leaving it does nothing
+    '''
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ('telemetry', 'name', 'start')
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.telemetry.observe(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+class Telemetry:
+    '''
+    Represents the metrics of a session
+    Counters and histograms can be updated from any thread.
+    Attributes:
+    - enabled(bool): whether measurements are recorded, nothing is recorded while False
+    - sink: where flush() sends the snapshots, None to only keep them in memory
+    - counters(dict): counts by name
+    - histograms(dict): Histograms of durations (in milliseconds) and other measurements, by name
+    '''
+    def __init__(self, sink=None, enabled=None):
+        self.sink = sink
+        self.enabled = sink is not None if enabled is None else enabled
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def count(self, name, value=1):
+        '''
+        Adds to a counter
+        Arguments:
+        - name(str): the counter
+        - value(int): the amount to add
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        '''
+        Records a measurement in a histogram
+        Arguments:
+        - name(str): the histogram
+        - value(float): the measurement, in milliseconds for durations
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def timer(self, name):
+        '''
+        Times a block of code into a histogram: with telemetry.timer('frame_ms'): ...
+        Arguments:
+        - name(str): the histogram
+        Returns:
+        - a context manager
+        '''
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def timed(self, name):
+        '''
+        Decorator timing every call of a function into a histogram
+        Arguments:
+        - name(str): the histogram
+        '''
+        def decorate(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(name, (time.perf_counter() - start) * 1000)
+            return wrapper
+        return decorate
+
+    def snapshot(self):
+        '''
+        Copies the current metrics
+        Returns:
+        - dictionary with the time, the counters and a summary of every histogram
+        '''
+        with self._lock:
+            return {'time': round(time.time(), 3), 'counters': dict(self.counters),
+                    'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()}}
+
+    def flush(self):
+        '''
+        Sends a snapshot of the metrics to the sink
+        '''
+        self._last_flush = time.monotonic()
+        if self.enabled and self.sink is not None:
+            self.sink.write(self.snapshot())
+
+    def maybe_flush(self, interval=FLUSH_INTERVAL):
+        '''
+        Flushes if the last flush was more than an interval ago, for calling once per frame
+        Arguments:
+        - interval(float): seconds between flushes
+        '''
+        if self.enabled and time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def close(self):
+        '''
+        Flushes the last metrics and closes the sink
+        '''
+        if self.enabled and self.sink is not None:
+            self.flush()
+            self.sink.close()
+
+class MemorySink:
+    '''
+    Represents an in-process sink keeping every snapshot
+    Attributes:
+    - snapshots(list): the snapshots flushed so far
+    '''
+    def __init__(self):
+        self.snapshots = []
+
+    def write(self, snapshot):
+        self.snapshots.append(snapshot)
+
+    def close(self):
+        pass
+
+class JsonLinesSink:
+    '''
+    Represents a file getting one JSON line per snapshot
+    Attributes:
+    - path(str): the file, appended to
+    '''
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, snapshot):
+        with open(self.path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(snapshot, sort_keys=True) + '\n')
+
+    def close(self):
+        pass
+
+class PrometheusSink:
+    '''
+    Represents a file holding the latest snapshot in the Prometheus text format (for a node exporter textfile collector)
+    Attributes:
+    - path(str): the file, replaced on every write
+    - prefix(str): prefix of the metric names
+    '''
+    def __init__(self, path, prefix='pokemon_'):
+        self.path = path
+        self.prefix = prefix
+
+    def write(self, snapshot):
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(prometheus_text(snapshot, self.prefix))
+        os.replace(temp_path, self.path)  # Collectors never read a half written file
+
+    def close(self):
+        pass
+
+def _metric_name(prefix, name):
+    return prefix + ''.join(char if char.isalnum() else '_' for char in name)
+
+def prometheus_text(snapshot, prefix='pokemon_'):
+    '''
+    Formats a snapshot in the Prometheus text exposition format
+    Arguments:
+    - snapshot(dict): the snapshot, from Telemetry.snapshot
+    - prefix(str): prefix of the metric names
+    Returns:
+    - str: the text
+    '''
+    lines = []
+    for name, value in sorted(snapshot['counters'].items()):
+        metric = _metric_name(prefix, name) + '_total'
+        lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+    for name, histogram in sorted(snapshot['histograms'].items()):
+        metric = _metric_name(prefix, name)
+        lines.append(f'# TYPE {metric} histogram')
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (math.inf,), histogram['buckets']):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{le="{"+Inf" if bound == math.inf else bound}"}} {cumulative}')
+        lines += [f'{metric}_sum {histogram["sum"]}', f'{metric}_count {histogram["count"]}']
+    return '\n'.join(lines) + '\n'
+
+def sink_for(path):
+    '''
+    Picks the sink for an output file from its extension
+    Arguments:
+    - path(str): the file, .prom for the Prometheus format and anything else for JSON lines
+    Returns:
+    - the sink
+    '''
+    return PrometheusSink(path) if path.endswith('.prom') else JsonLinesSink(path)
+
+class Profiler:
+    '''
+    Represents an optional whole-session profile
+    Attributes:
+    - modes(set): 'cpu' for cProfile and/or 'memory' for tracemalloc
+    - path(str): where the results are written
+    '''
+    def __init__(self, modes, path='pokemon.prof'):
+        self.modes = set(modes)
+        self.path = path
+        self._profile = None
+
+    def start(self):
+        import cProfile  # Only imported when profiling, the game starts faster without them
+        import tracemalloc
+        if 'memory' in self.modes:
+            tracemalloc.start()
+        if 'cpu' in self.modes:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self, top=25):
+        '''
+        Stops profiling and writes the results: the cProfile stats to path (for pstats or
+        snakeviz) and the largest allocations to path + '.memory.txt'
+        Arguments:
+        - top(int): number of allocation sites written
+        '''
+        import pstats
+        import tracemalloc
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.path)
+            pstats.Stats(self.path).sort_stats('cumulative').print_stats(top)
+            self._profile = None
+        if 'memory' in self.modes and tracemalloc.is_tracing():
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:top]
+            tracemalloc.stop()
+            with open(self.path + '.memory.txt', 'w', encoding='utf-8') as file:
+                file.write('\n'.join(str(statistic) for statistic in statistics) + '\n')
+
+telemetry = Telemetry()  # Shared by the game and the data modules, off until configure_telemetry() is called
+
+def configure_telemetry(environ=os.environ):
+    '''
+    Turns telemetry and profiling on as asked by the environment variables
+    Arguments:
+    - environ(dict): the environment
+    Returns:
+    - Profiler: the started profiler, None if profiling was not asked for
+    '''
+    path = environ.get('POKEMON_TELEMETRY')
+    if path:
+        telemetry.sink = sink_for(path)
+        telemetry.enabled = True
+    modes = {mode.strip() for mode in environ.get('POKEMON_PROFILE', '').split(',') if mode.strip()}
+    unknown = modes - {'cpu', 'memory'}
+    if unknown:
+        print(f"Unknown POKEMON_PROFILE modes {sorted(unknown)}, use 'cpu' and/or 'memory'")
+    modes -= unknown
+    if not modes:
+        return None
+    profiler = Profiler(modes, environ.get('POKEMON_PROFILE_OUT') or 'pokemon.prof')
+    profiler.start()
+    return profiler
@@ -0,0 +1,82 @@
+import itertools
+import unittest
+from unittest.mock import patch
+from ai import ExpectimaxAI
+from battle_engine import Combatant, POTION, simulate
+from test_battle_engine import MockMove
+
+def make_combatant(name, max_hp=69, moves=None, current_hp=None, num_potions=3):
+    moves = moves or [MockMove('tackle', 40, 'normal'), MockMove('growl', None, 'normal'), MockMove('poke', 10, 'normal')]
+    return Combatant(name, 30, max_hp, 52, 43, 65, ('normal',), moves, num_potions, current_hp)
+
+class TestExpectimaxAI(unittest.TestCase):
+
+    def setUp(self):
+        self.ai = ExpectimaxAI(time_budget=None, max_depth=6)
+
+    def test_finishes_the_opponent(self):
+        pokemon = make_combatant('A')
+        opponent = make_combatant('B', current_hp=5)
+        self.assertEqual(self.ai.choose(pokemon, opponent).name, 'tackle')
+
+    def test_strongest_move_at_full_health(self):
+        pokemon = make_combatant('A')
+        opponent = make_combatant('B')
+        self.assertEqual(self.ai.choose(pokemon, opponent).name, 'tackle')
+
+    def test_drinks_a_potion_to_survive(self):
+        # A tackle does 20 damage (30 on a critical): 15 HP dies next turn, 45 HP survives two hits
+        pokemon = make_combatant('A', current_hp=15)
+        opponent = make_combatant('B')
+        self.assertEqual(self.ai.choose(pokemon, opponent), POTION)
+
+    def test_player_potion_keeps_the_turn(self):
+        # Like in the game, the player's side moves again after a potion, the rival's side does not
+        for player in (False, True):
+            ai = ExpectimaxAI(time_budget=None)
+            ai.choose(make_combatant('A'), make_combatant('B'), player)
+            with patch.object(ai, '_value', return_value=0.0) as value:
+                ai._after(0, None, 30, 69, 3, 3, 4)
+                ai._after(1, None, 30, 69, 3, 3, 4)
+            player_side = 0 if player else 1
+            self.assertEqual([call.args[0] for call in value.call_args_list], [player_side, player_side])
+
+    def test_no_potion_at_full_health(self):
+        pokemon = make_combatant('A', moves=[MockMove('poke', 1, 'normal')])
+        opponent = make_combatant('B')
+        self.assertEqual(self.ai.choose(pokemon, opponent).name, 'poke')
+
+    def test_transposition_table_is_reused(self):
+        pokemon = make_combatant('A')
+        opponent = make_combatant('B')
+        self.ai.choose(pokemon, opponent)
+        nodes = self.ai.nodes
+        # Another battle between identical pokemon reuses the table
+        self.ai.choose(make_combatant('A'), make_combatant('B'))
+        self.assertEqual(self.ai.nodes, nodes)
+        self.assertGreater(self.ai.stats()['hit_rate'], 0)
+
+    def test_time_budget(self):
+        # A clock going forward 1ms every time it is read, the budget runs out at the 6th check
+        clock = itertools.count(step=0.001)
+        ai = ExpectimaxAI(time_budget=0.005, max_depth=60)
+        with patch('ai.time.perf_counter', side_effect=lambda: next(clock)):
+            move = ai.choose(make_combatant('A', max_hp=600), make_combatant('B', max_hp=600))
+        self.assertTrue(ai.timed_out)
+        self.assertEqual(move.name, 'tackle')
+        self.assertGreaterEqual(ai.depth_reached, 1)
+        self.assertLess(ai.depth_reached, 60)
+        self.assertLessEqual(next(clock), 0.02)  # The clock was read a few times, not at every node
+
+    def test_no_time_budget(self):
+        self.ai.choose(make_combatant('A', max_hp=600), make_combatant('B', max_hp=600))
+        self.assertFalse(self.ai.timed_out)
+        self.assertEqual(self.ai.depth_reached, 6)
+
+    def test_beats_random_moves(self):
+        moves = [MockMove('tackle', 40, 'normal'), MockMove('poke', 10, 'normal')]
+        results = simulate(make_combatant('A', moves=moves), make_combatant('B', moves=moves), 500, seed=1, rival_policy=self.ai)
+        self.assertGreater(results['rival_wins'], results['player_wins'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+from api_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(':memory:', ttl=60)
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_get_and_put(self):
+        self.assertIsNone(self.cache.get('http://example.com/a'))
+        self.cache.put('http://example.com/a', {'name': 'tackle', 'power': 40})
+        self.assertEqual(self.cache.get('http://example.com/a'), {'name': 'tackle', 'power': 40})
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    @patch('api_cache.time.time')
+    def test_ttl_expiry(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.put('http://example.com/a', {'name': 'tackle'})
+        mock_time.return_value = 1061
+        self.assertIsNone(self.cache.get('http://example.com/a'))
+        # Stale entries are still available when asked for explicitly (offline mode)
+        self.assertEqual(self.cache.get('http://example.com/a', allow_stale=True), {'name': 'tackle'})
+
+    @patch('api_cache.time.time')
+    def test_lru_eviction(self, mock_time):
+        entry = {'name': 'x' * 50}
+        mock_time.return_value = 1
+        self.cache.put('a', entry)
+        size = self.cache.stats()['bytes']
+        self.cache.max_bytes = size * 2
+        mock_time.return_value = 2
+        self.cache.put('b', entry)
+        mock_time.return_value = 3
+        self.cache.get('a')  # 'a' is now more recently used than 'b'
+        mock_time.return_value = 4
+        self.cache.put('c', entry)
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertEqual(self.cache.evictions, 1)
+        self.assertLessEqual(self.cache.stats()['bytes'], self.cache.max_bytes)
+
+    def test_clear(self):
+        self.cache.put('a', {'name': 'tackle'})
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        self.assertIsNone(self.cache.get('a'))
+
+    @patch('api_cache.time.time')
+    def test_lookups_do_not_write(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.put('a', {'name': 'tackle'})
+        changes = self.cache._conn.total_changes
+        mock_time.return_value = 1010
+        for _ in range(10):
+            self.cache.get('a')
+        self.assertEqual(self.cache._conn.total_changes, changes)
+        self.cache.put('b', {'name': 'ember'})  # Writes the access time kept in memory
+        last_access = self.cache._conn.execute("SELECT last_access FROM responses WHERE url = 'a'").fetchone()[0]
+        self.assertEqual(last_access, 1010)
+
+    def test_close_writes_access_times(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.sqlite')
+            cache = ResponseCache(path)
+            cache.put('a', {'name': 'tackle'})
+            stored = cache._conn.execute('SELECT last_access FROM responses').fetchone()[0]
+            with patch('api_cache.time.time', return_value=stored + 60):
+                cache.get('a')
+            cache.close()
+            conn = sqlite3.connect(path)
+            self.assertEqual(conn.execute('SELECT last_access FROM responses').fetchone()[0], stored + 60)
+            conn.close()
+
+    def test_file_shared_with_another_process(self):
+        # Another process (a tournament worker) clears the file, the size counted here must follow
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.sqlite')
+            cache, other = ResponseCache(path), ResponseCache(path)
+            cache.put('a', {'name': 'x' * 50})
+            cache.put('b', {'name': 'x' * 50})
+            other.clear()
+            size = cache.stats()['bytes'] // 2
+            cache.max_bytes = size * 2
+            cache.put('c', {'name': 'x' * 50})
+            stats = cache.stats()
+            self.assertEqual((stats['entries'], stats['bytes']), (1, size))
+            self.assertEqual(cache.evictions, 0)
+            cache.close()
+            other.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import threading
+import unittest
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+import pygame
+from unittest.mock import patch
+import audio
+from audio import MusicManager
+from loader import Loader
+from test_loader import poll_until_idle
+
+class TestMusicManager(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            pygame.mixer.init()
+        except pygame.error as error:
+            self.skipTest(f'No audio device: {error}')
+        self.loader = Loader(max_workers=2)
+        self.music = MusicManager(self.loader, fade_ms=0)
+
+    def tearDown(self):
+        pygame.mixer.music.stop()
+        self.loader.shutdown()
+
+    def test_files_are_read_in_the_background(self):
+        threads = []
+        original = audio.read_file
+        def read_file(path):
+            threads.append(threading.current_thread())
+            return original(path)
+        with patch('audio.read_file', side_effect=read_file):
+            self.music.preload('Intro.mp3')
+            poll_until_idle(self.loader)
+        self.assertIn('Intro.mp3', self.music._tracks)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_playing_track_is_not_reloaded(self):
+        self.music.play('Intro.mp3')
+        poll_until_idle(self.loader)
+        self.assertEqual(self.music.current, 'Intro.mp3')
+        for _ in range(10):
+            self.music.play('Intro.mp3')
+            self.music.update()
+        self.assertEqual(self.music.loads, 1)
+
+    def test_switching_tracks_uses_the_cached_file(self):
+        self.music.preload('Intro.mp3', 'PokemonEndMusic.mp3')
+        poll_until_idle(self.loader)
+        with patch('audio.read_file') as mock_read:
+            self.music.play('Intro.mp3')
+            self.music.play('PokemonEndMusic.mp3')
+            pygame.mixer.music.stop()
+            self.music.update()
+        mock_read.assert_not_called()
+        self.assertEqual(self.music.current, 'PokemonEndMusic.mp3')
+        self.assertEqual(self.music.loads, 2)
+
+    def test_missing_file_is_reported_once(self):
+        with patch('builtins.print') as mock_print:
+            self.music.play('PokemonCombatMusic.mp3')
+            poll_until_idle(self.loader)
+            self.music.play('PokemonCombatMusic.mp3')
+            poll_until_idle(self.loader)
+        self.assertIn('PokemonCombatMusic.mp3', self.music.missing)
+        self.assertIsNone(self.music.pending)
+        self.assertIsNone(self.music.current)
+        mock_print.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import math
+import unittest
+from battle_engine import Combatant, calculate_damage, simulate
+from test_battle_engine import FixedRoll, MockMove
+
+try:
+    import numpy as np
+    import batch_sim
+except ImportError:  # numpy is optional
+    np = None
+
+def make_pair():
+    charmander = Combatant('Charmander', 30, 69, 52, 43, 65, ['fire'],
+                           [MockMove('scratch', 40, 'normal'), MockMove('ember', 40, 'fire')])
+    squirtle = Combatant('Squirtle', 30, 74, 48, 65, 43, ['water'],
+                         [MockMove('tackle', 40, 'normal'), MockMove('bubble', 40, 'water'), MockMove('water-gun', 40, 'water')])
+    return charmander, squirtle
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestBatchSimulator(unittest.TestCase):
+
+    def test_coefficients_match_scalar_damage(self):
+        charmander, squirtle = make_pair()
+        coefficients = batch_sim.move_coefficients(charmander, squirtle)
+        for move, coefficient in zip(charmander.moves, coefficients):
+            self.assertEqual(math.floor(coefficient), calculate_damage(charmander, squirtle, move, FixedRoll(10000))[0])
+            self.assertEqual(math.floor(coefficient * 1.5), calculate_damage(charmander, squirtle, move, FixedRoll(1))[0])
+
+    def test_seeded_results_are_reproducible(self):
+        charmander, squirtle = make_pair()
+        first = batch_sim.simulate_matchup(charmander, squirtle, 1000, seed=42)
+        second = batch_sim.simulate_matchup(charmander, squirtle, 1000, seed=42)
+        self.assertEqual(first['player_win_rate'], second['player_win_rate'])
+        self.assertTrue(np.array_equal(first['turns_histogram'], second['turns_histogram']))
+
+    def test_every_battle_finishes(self):
+        charmander, squirtle = make_pair()
+        results = batch_sim.simulate_matchup(charmander, squirtle, 5000, seed=1)
+        self.assertAlmostEqual(results['player_win_rate'] + results['rival_win_rate'], 1.0)
+        self.assertEqual(results['turns_histogram'].sum(), 5000)
+        self.assertGreater(results['winner_hp_mean'], 0)
+
+    def test_agrees_with_scalar_engine(self):
+        charmander, squirtle = make_pair()
+        vectorized = batch_sim.simulate_matchup(charmander, squirtle, 40000, seed=5)
+        scalar = simulate(charmander, squirtle, 4000, seed=5)
+        self.assertAlmostEqual(vectorized['player_win_rate'], scalar['player_wins'] / 4000, delta=0.03)
+        self.assertAlmostEqual(vectorized['turns_mean'], scalar['turns'] / 4000, delta=0.3)
+
+    def test_faster_rival_attacks_first(self):
+        knockout = [MockMove('explosion', 250, 'normal')]
+        player = Combatant('Slowpoke', 30, 69, 52, 43, 15, ('water',), knockout)
+        rival = Combatant('Jolteon', 30, 69, 52, 43, 130, ('electric',), knockout)
+        results = batch_sim.simulate_matchup(player, rival, 100, seed=0)
+        self.assertEqual((results['player_win_rate'], results['rival_win_rate'], results['turns_mean']), (0.0, 1.0, 1.0))
+
+if __name__ == '__main__':
+    unittest.main()
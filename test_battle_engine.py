@@ -0,0 +1,229 @@
+import random
+import sys
+import unittest
+from unittest.mock import patch
+from battle_engine import Battle, Combatant, DamageTable, POTION, SWITCH, Party, TeamBattle, calculate_damage, simulate, simulate_teams
+
+class FixedRoll:
+    '''
+    Stands in for random.Random and always rolls the same number
+    '''
+    def __init__(self, roll):
+        self.roll = roll
+
+    def randint(self, low, high):
+        return self.roll
+
+class MockMove:
+    def __init__(self, name, power, type):
+        self.name = name
+        self.power = power
+        self.type = type
+
+def make_combatant(name='Charmander', types=('fire',), moves=None, max_hp=69):
+    moves = moves or [MockMove('scratch', 40, 'normal')]
+    return Combatant(name, 30, max_hp, 52, 43, 65, types, moves)
+
+class TestDamage(unittest.TestCase):
+
+    def test_damage_formula(self):
+        attacker = make_combatant()
+        defender = make_combatant('Squirtle', ('water',))
+        damage, critical = calculate_damage(attacker, defender, MockMove('scratch', 40, 'normal'), FixedRoll(10000))
+        self.assertFalse(critical)
+        self.assertEqual(damage, int((2 * 30 + 10) / 250 * 52 / 43 * 40))
+
+    def test_same_type_bonus_and_critical(self):
+        attacker = make_combatant()
+        defender = make_combatant('Rattata', ('normal',))
+        ember = MockMove('ember', 40, 'fire')
+        base = (2 * 30 + 10) / 250 * 52 / 43 * 40
+        self.assertEqual(calculate_damage(attacker, defender, ember, FixedRoll(10000))[0], int(base * 1.5))
+        damage, critical = calculate_damage(attacker, defender, ember, FixedRoll(625))
+        self.assertTrue(critical)
+        self.assertEqual(damage, int(base * 1.5 * 1.5))
+
+    def test_type_effectiveness(self):
+        attacker = make_combatant()
+        base = (2 * 30 + 10) / 250 * 52 / 43 * 40 * 1.5
+        ember = MockMove('ember', 40, 'fire')
+        against_water = calculate_damage(attacker, make_combatant('Squirtle', ('water',)), ember, FixedRoll(10000))[0]
+        against_grass = calculate_damage(attacker, make_combatant('Bulbasaur', ('grass', 'poison')), ember, FixedRoll(10000))[0]
+        self.assertEqual(against_water, int(base * 0.5))
+        self.assertEqual(against_grass, int(base * 2))
+
+    def test_damage_table_is_cached(self):
+        attacker, defender = make_combatant(), make_combatant('Squirtle', ('water',))
+        move = attacker.moves[0]
+        table = DamageTable()
+        first = calculate_damage(attacker, defender, move, FixedRoll(10000), table)
+        with patch('battle_engine.damage_coefficient') as mock_coefficient:
+            second = calculate_damage(attacker, defender, move, FixedRoll(10000), table)
+        mock_coefficient.assert_not_called()
+        self.assertEqual(first, second)
+
+class TestBattle(unittest.TestCase):
+
+    def test_combatant_is_compact(self):
+        pokemon = make_combatant()
+        self.assertFalse(hasattr(pokemon, '__dict__'))
+        self.assertIs(Combatant.from_pokemon(pokemon).moves, pokemon.moves)
+
+    def test_potion(self):
+        pokemon = make_combatant()
+        pokemon.current_hp = 60
+        rival = make_combatant('Squirtle')
+        rival.current_hp = 60
+        battle = Battle(pokemon, rival)
+        # Like in the game, the player acts again after drinking and the rival does not
+        self.assertEqual(battle.act(pokemon, POTION), 'player_turn')
+        self.assertEqual(pokemon.current_hp, pokemon.max_hp)
+        self.assertEqual(pokemon.num_potions, 2)
+        self.assertEqual(battle.act(rival, POTION), 'player_turn')
+        self.assertEqual(rival.num_potions, 2)
+
+    def test_run_lets_the_player_act_again_after_a_potion(self):
+        player, rival = make_combatant(), make_combatant('Squirtle')
+        player.current_hp = 60
+        acting = []
+        def player_policy(battle, pokemon, opponent):
+            acting.append('player')
+            return POTION if pokemon.current_hp < pokemon.max_hp and pokemon.num_potions else pokemon.moves[0]
+        def rival_policy(battle, pokemon, opponent):
+            acting.append('rival')
+            return pokemon.moves[0]
+        Battle(player, rival, random.Random(1)).run(player_policy, rival_policy, max_turns=3)
+        self.assertEqual(acting, ['player', 'player', 'rival'])
+
+    def test_turn_order_and_observers(self):
+        events = []
+        player = make_combatant()
+        rival = make_combatant('Squirtle', ('water',))
+        battle = Battle(player, rival, random.Random(1), [lambda event, data: events.append(event)])
+        self.assertEqual(battle.act(player, player.moves[0]), 'rival_turn')
+        self.assertEqual(battle.act(rival, rival.moves[0]), 'player_turn')
+        self.assertEqual(events, ['move', 'damage', 'move', 'damage'])
+
+    def test_faster_rival_attacks_first(self):
+        # Either pokemon knocks the other out with one hit, so the one acting first wins
+        knockout = [MockMove('explosion', 250, 'normal')]
+        player = Combatant('Slowpoke', 30, 69, 52, 43, 15, ('water',), knockout)
+        rival = Combatant('Jolteon', 30, 69, 52, 43, 130, ('electric',), knockout)
+        self.assertIs(Battle(player, rival).first, rival)
+        self.assertEqual(simulate(player, rival, 50, seed=0), {'player_wins': 0, 'rival_wins': 50, 'turns': 50})
+        # On a tie the player acts first, like in the game
+        rival.speed = player.speed
+        self.assertEqual(simulate(player, rival, 50, seed=0), {'player_wins': 50, 'rival_wins': 0, 'turns': 50})
+
+    def test_battle_runs_until_faint(self):
+        battle = Battle(make_combatant(), make_combatant('Squirtle', ('water',)), random.Random(7))
+        winner = battle.run()
+        self.assertIsNotNone(winner)
+        loser = battle.rival if winner is battle.player else battle.player
+        self.assertEqual(loser.current_hp, 0)
+
+    def test_simulation_is_reproducible(self):
+        player, rival = make_combatant(), make_combatant('Squirtle', ('water',))
+        self.assertEqual(simulate(player, rival, 200, seed=3), simulate(player, rival, 200, seed=3))
+        self.assertEqual(player.current_hp, player.max_hp)  # The originals are never touched
+
+    def test_headless_simulation(self):
+        # The damage of each move is computed once per battle, every other attack is a lookup
+        # (the time of a simulation is measured by benchmarks/bench_suite.py)
+        import battle_engine
+        with patch('battle_engine.damage_coefficient', wraps=battle_engine.damage_coefficient) as mock_coefficient:
+            results = simulate(make_combatant(), make_combatant('Squirtle', ('water',)), 1000, seed=0)
+        self.assertEqual(results['player_wins'] + results['rival_wins'], 1000)
+        self.assertGreater(results['turns'], 2 * 1000)
+        self.assertLessEqual(mock_coefficient.call_count, 2 * 1000)  # One move per side
+        self.assertNotIn('pygame', sys.modules.get('battle_engine').__dict__)
+
+def make_party(names, max_hp=69):
+    return Party([make_combatant(name, ('normal',), max_hp=max_hp) for name in names])
+
+class TestTeamBattle(unittest.TestCase):
+
+    def test_faster_pokemon_acts_first(self):
+        player, rival = make_party(['A']), make_party(['B'])
+        rival.pokemon.speed = 90
+        events = []
+        battle = TeamBattle(player, rival, random.Random(1), observers=[lambda event, data: events.append((event, data))])
+        battle.play_round(player.pokemon.moves[0], rival.pokemon.moves[0])
+        self.assertEqual([data['attacker'].name for event, data in events if event == 'move'], ['B', 'A'])
+
+    def test_player_acts_first_on_a_speed_tie(self):
+        # Like first_mover, the order is decided without drawing from the battle's random numbers
+        player, rival = make_party(['A']), make_party(['B'])
+        events = []
+        rng = random.Random(1)
+        battle = TeamBattle(player, rival, rng, observers=[lambda event, data: events.append((event, data))])
+        with patch.object(rng, 'random', side_effect=AssertionError('tie drawn at random')):
+            battle.play_round(player.pokemon.moves[0], rival.pokemon.moves[0])
+        self.assertEqual([data['attacker'].name for event, data in events if event == 'move'], ['A', 'B'])
+
+    def test_switch_goes_first(self):
+        player, rival = make_party(['A', 'C']), make_party(['B'])
+        rival.pokemon.speed = 90
+        battle = TeamBattle(player, rival, random.Random(1))
+        battle.play_round((SWITCH, 1), rival.pokemon.moves[0])
+        self.assertEqual(player.active, 1)
+        self.assertEqual(player.members[0].current_hp, 69)
+        self.assertLess(player.members[1].current_hp, 69)
+
+    def test_cannot_switch_to_fainted_member(self):
+        player, rival = make_party(['A', 'C']), make_party(['B'])
+        player.members[1].current_hp = 0
+        with self.assertRaises(ValueError):
+            TeamBattle(player, rival).switch(player, 1)
+
+    def test_fainted_member_is_replaced_and_loses_its_action(self):
+        player, rival = make_party(['A', 'C']), make_party(['B'])
+        player.pokemon.current_hp = 1
+        rival.pokemon.speed = 90
+        events = []
+        battle = TeamBattle(player, rival, random.Random(1), observers=[lambda event, data: events.append(event)])
+        self.assertEqual(battle.play_round(player.pokemon.moves[0], rival.pokemon.moves[0]), 'next_round')
+        self.assertEqual(events, ['move', 'damage', 'faint', 'switch'])
+        self.assertEqual(player.active, 1)
+        self.assertEqual(player.remaining, 1)
+        self.assertEqual(rival.pokemon.current_hp, 69)
+
+    def test_battle_ends_when_a_party_has_fainted(self):
+        player, rival = make_party(['A', 'C', 'D']), make_party(['B'], max_hp=300)
+        winner = TeamBattle(player, rival, random.Random(2)).run()
+        self.assertIn(winner, (player, rival))
+        loser = rival if winner is player else player
+        self.assertEqual(loser.remaining, 0)
+        self.assertTrue(all(member.current_hp <= 0 for member in loser.members))
+
+    def test_simulation_is_reproducible(self):
+        player, rival = make_party(['A', 'C', 'D']), make_party(['B', 'E', 'F'])
+        first = simulate_teams(player, rival, 50, seed=3)
+        self.assertEqual(first, simulate_teams(player, rival, 50, seed=3))
+        self.assertEqual(first['player_wins'] + first['rival_wins'], 50)
+        self.assertEqual(player.members[0].current_hp, 69)  # The parties are copied
+
+    def test_round_cost_does_not_depend_on_party_size(self):
+        # The members waiting on the bench must never be looked at while the active ones fight
+        bench = [Benched() for _ in range(5)]
+        player = Party([make_combatant('P0', ('normal',), max_hp=10 ** 9)] + bench)
+        rival = Party([make_combatant('R0', ('normal',), max_hp=10 ** 9)])
+        Benched.reads = 0
+        battle = TeamBattle(player, rival, random.Random(4))
+        battle.run(max_rounds=500)
+        self.assertEqual(battle.rounds, 500)
+        self.assertEqual(Benched.reads, 0)
+
+class Benched:
+    '''
+    Stands in for a party member that is not in battle, counting how often it is looked at
+    '''
+    reads = 0
+
+    @property
+    def current_hp(self):
+        Benched.reads += 1
+        return 1
+
+if __name__ == '__main__':
+    unittest.main()
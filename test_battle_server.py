@@ -0,0 +1,206 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest.mock import patch
+from battle_server import BattleServer, MatchupPolicies, SpeciesLibrary, demo_library
+
+class Client:
+    '''
+    Sends one JSON request per line and reads its answer
+    '''
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, **request):
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        return json.loads(await self.reader.readline())
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+class TestBattleServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = BattleServer(demo_library())
+        self.host, self.port = await self.server.start('127.0.0.1', 0)
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def connect(self):
+        return Client(*await asyncio.open_connection(self.host, self.port))
+
+    async def play(self, client, player, rival, seed):
+        state = await client.request(op='new', player=player, rival=rival, seed=seed)
+        while state['status'] == 'player_turn':
+            state = await client.request(op='act', session=state['session'], move=0)
+            self.assertTrue(state['ok'], state)
+        return state
+
+    async def test_battle_is_played_to_the_end(self):
+        client = await self.connect()
+        state = await self.play(client, 'charmander', 'bulbasaur', 1)
+        self.assertEqual(state['status'], 'end_battle')
+        self.assertIn(state['winner'], ('player', 'rival'))
+        loser = state['rival'] if state['winner'] == 'player' else state['player']
+        self.assertEqual(loser['hp'], 0)
+        # Finished sessions are removed with their last answer
+        self.assertEqual(self.server.sessions, {})
+        answer = await client.request(op='act', session=state['session'], move=0)
+        self.assertEqual(answer, {'ok': False, 'error': f"'Unknown session {state['session']}'"})
+        await client.close()
+
+    async def test_same_seed_replays_the_same_battle(self):
+        client = await self.connect()
+        first = await self.play(client, 'squirtle', 'charmander', 7)
+        second = await self.play(client, 'squirtle', 'charmander', 7)
+        self.assertEqual((first['turn'], first['player'], first['rival']),
+                         (second['turn'], second['player'], second['rival']))
+        await client.close()
+
+    async def test_faster_rival_moves_first(self):
+        client = await self.connect()
+        state = await client.request(op='new', player='squirtle', rival='charmander')
+        self.assertEqual([event['attacker'] for event in state['events']], ['charmander'])
+        self.assertLess(state['player']['hp'], state['player']['max_hp'])
+        await client.close()
+
+    async def test_potion(self):
+        client = await self.connect()
+        state = await client.request(op='new', player='bulbasaur', rival='squirtle', seed=3)
+        state = await client.request(op='act', session=state['session'], potion=True)
+        self.assertEqual(state['events'][0]['event'], 'potion')
+        self.assertEqual(state['player']['potions'], 2)
+        await client.close()
+
+    async def test_errors(self):
+        client = await self.connect()
+        self.assertEqual(await client.request(op='act', session=99, move=0), {'ok': False, 'error': "'Unknown session 99'"})
+        self.assertFalse((await client.request(op='new', player='mew', rival='squirtle'))['ok'])
+        self.assertFalse((await client.request(op='fly'))['ok'])
+        state = await client.request(op='new', player='bulbasaur', rival='squirtle')
+        answer = await client.request(op='act', session=state['session'], move=9)
+        self.assertEqual(answer, {'ok': False, 'error': 'Invalid move 9'})
+        answer = await client.request(op='act', session=state['session'], move=True)
+        self.assertEqual(answer, {'ok': False, 'error': 'Invalid move True'})
+        client.writer.write(b'not json\n')
+        self.assertFalse(json.loads(await client.reader.readline())['ok'])
+        self.assertTrue((await client.request(op='state', session=state['session']))['ok'])  # The connection still works
+        await client.close()
+
+    async def test_unexpected_error_is_answered(self):
+        client = await self.connect()
+        state = await client.request(op='new', player='bulbasaur', rival='squirtle')
+        with patch.object(self.server, 'act', side_effect=RuntimeError('bug')), redirect_stdout(io.StringIO()), \
+                redirect_stderr(io.StringIO()) as log:
+            answer = await client.request(op='act', session=state['session'], move=0)
+        self.assertEqual(answer, {'ok': False, 'error': 'Internal error'})
+        self.assertIn('RuntimeError: bug', log.getvalue())
+        self.assertTrue((await client.request(op='state', session=state['session']))['ok'])  # The connection still works
+        await client.close()
+
+    async def test_close_and_stats(self):
+        client = await self.connect()
+        state = await client.request(op='new', player='bulbasaur', rival='squirtle')
+        stats = await client.request(op='stats')
+        self.assertEqual((stats['sessions'], stats['connections']), (1, 1))
+        self.assertEqual(stats['species'], ['bulbasaur', 'charmander', 'squirtle'])
+        await client.request(op='close', session=state['session'])
+        self.assertEqual((await client.request(op='stats'))['sessions'], 0)
+        self.assertFalse((await client.request(op='state', session=state['session']))['ok'])
+        await client.close()
+
+    async def test_many_concurrent_sessions(self):
+        clients = [await self.connect() for _ in range(20)]
+        async def run(client, index):
+            sessions = [await client.request(op='new', player='bulbasaur', rival='charmander', seed=index * 50 + i)
+                        for i in range(50)]
+            return [await client.request(op='act', session=session['session'], move=1) for session in sessions]
+        states = sum(await asyncio.gather(*(run(client, index) for index, client in enumerate(clients))), [])
+        self.assertEqual(len(states), 1000)
+        playing = [state['session'] for state in states if state['status'] == 'player_turn']
+        self.assertGreater(len(playing), 900)
+        self.assertEqual(sorted(self.server.sessions), sorted(playing))  # The finished ones were removed
+        # The sessions only own their HP: moves and types are the library's
+        template = self.server.library.templates['bulbasaur']
+        for session in self.server.sessions.values():
+            self.assertIs(session.battle.player.moves, template.moves)
+            self.assertIs(session.battle.player.types, template.types)
+        for client in clients:
+            await client.close()
+
+    async def test_idle_sessions_expire(self):
+        client = await self.connect()
+        first = await client.request(op='new', player='bulbasaur', rival='squirtle')
+        second = await client.request(op='new', player='bulbasaur', rival='squirtle')
+        await client.request(op='state', session=first['session'])  # Now more recently used than the second
+        self.assertEqual(list(self.server.sessions), [second['session'], first['session']])
+        self.server.sessions[second['session']].last_active = 100
+        self.server.sessions[first['session']].last_active = 200
+        timeout = self.server.idle_timeout
+        self.assertEqual(self.server.expire_idle(100 + timeout), 0)
+        self.assertEqual(self.server.expire_idle(150 + timeout), 1)
+        self.assertEqual(list(self.server.sessions), [first['session']])
+        self.assertEqual(self.server.expire_idle(201 + timeout), 1)
+        self.assertEqual((await client.request(op='stats'))['expired'], 2)
+        await client.close()
+
+class TestMatchupPolicies(unittest.TestCase):
+
+    def test_one_policy_per_matchup(self):
+        made = []
+        def factory():
+            policy = lambda battle, pokemon, opponent: pokemon.moves[len(made) - 1]
+            made.append(policy)
+            return policy
+        policies = MatchupPolicies(factory)
+        templates = demo_library().templates
+        bulbasaur, charmander, squirtle = templates['bulbasaur'], templates['charmander'], templates['squirtle']
+        policies(None, bulbasaur, charmander)
+        policies(None, bulbasaur, charmander)
+        self.assertEqual(len(made), 1)
+        policies(None, bulbasaur, squirtle)
+        policies(None, squirtle, bulbasaur)
+        self.assertEqual(len(made), 3)
+        self.assertEqual(set(policies.policies), {('bulbasaur', 'charmander'), ('bulbasaur', 'squirtle'), ('squirtle', 'bulbasaur')})
+
+class TestSpeciesLibrary(unittest.IsolatedAsyncioTestCase):
+
+    async def test_species_is_loaded_once(self):
+        calls = []
+        template = demo_library().templates['squirtle']
+        def loader(name, level, seed):
+            calls.append(name)
+            return template
+        library = SpeciesLibrary(30, loader)
+        results = await asyncio.gather(*(library.get('Squirtle') for _ in range(10)))
+        self.assertEqual(calls, ['squirtle'])
+        self.assertTrue(all(result is template for result in results))
+
+    async def test_unknown_species_without_loader(self):
+        with self.assertRaises(KeyError):
+            await SpeciesLibrary().get('mew')
+
+class TestMain(unittest.TestCase):
+
+    def test_starts_without_species(self):
+        # Nothing is preloaded, the species are loaded when a session asks for them
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'battle_server.py')
+        process = subprocess.Popen([sys.executable, script, '--port', '0'], stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True)
+        try:
+            line = process.stdout.readline()
+        finally:
+            process.terminate()
+            _, errors = process.communicate()
+        self.assertTrue(line.startswith('Battle server listening on 127.0.0.1:'), errors)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from api_cache import ResponseCache
+from bundle import DataBundle, build_bundle
+from pokeapi import DEFAULT_BUNDLE, APIManager, Move, SpeciesRecord
+
+class TestDataBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        sprite_path = os.path.join(self.directory, 'front.png')
+        with open(sprite_path, 'wb') as file:
+            file.write(b'not really a png')
+        self.sprite_url = pathlib.Path(sprite_path).as_uri()
+        self.responses = {
+            f'{APIManager.BASE_URL}/pokemon/charmander': {
+                'name': 'charmander',
+                'stats': [{'stat': {'name': stat, 'url': 'x'}, 'base_stat': 50, 'effort': 0}
+                          for stat in ('hp', 'attack', 'defense', 'speed')],
+                'types': [{'slot': 1, 'type': {'name': 'fire', 'url': 'x'}}],
+                'moves': [
+                    {'move': {'name': 'scratch', 'url': 'http://example.com/move/scratch'},
+                     'version_group_details': [
+                         {'version_group': {'name': 'red-blue'}, 'move_learn_method': {'name': 'level-up'}, 'level_learned_at': 1},
+                         {'version_group': {'name': 'x-y'}, 'move_learn_method': {'name': 'level-up'}, 'level_learned_at': 1}]},
+                    {'move': {'name': 'dig', 'url': 'http://example.com/move/dig'},
+                     'version_group_details': [
+                         {'version_group': {'name': 'red-blue'}, 'move_learn_method': {'name': 'machine'}, 'level_learned_at': 0}]},
+                ],
+                'sprites': {'front_default': self.sprite_url, 'back_default': None, 'front_shiny': 'x'},
+                'abilities': ['lots', 'of', 'data'],
+            },
+            'http://example.com/move/scratch': {'name': 'scratch', 'power': 40, 'type': {'name': 'normal', 'url': 'x'},
+                                                'flavor_text_entries': ['lots', 'of', 'data']},
+        }
+        self.path = os.path.join(self.directory, 'pokedata.bundle')
+        with patch('pokeapi.APIManager.fetch_json', side_effect=self.responses.get):
+            self.counts = build_bundle(self.path, ['charmander'])
+        self.original_cache = APIManager.cache
+        self.original_bundle = APIManager.bundle
+        APIManager.cache = ResponseCache(':memory:', offline=True)
+        Move.registry.clear()
+
+    def tearDown(self):
+        APIManager.cache.close()
+        APIManager.cache = self.original_cache
+        APIManager.bundle = self.original_bundle
+        Move.registry.clear()
+        shutil.rmtree(self.directory)
+
+    def test_build_counts(self):
+        self.assertEqual(self.counts, {'species': 1, 'moves': 1, 'sprites': 1})
+
+    def test_bundle_contents_are_trimmed(self):
+        bundle = DataBundle(self.path)
+        species = bundle.get_json(f'{APIManager.BASE_URL}/pokemon/charmander')
+        self.assertNotIn('abilities', species)
+        self.assertEqual(len(species['moves']), 1)
+        self.assertEqual(bundle.get_json('http://example.com/move/scratch'),
+                         {'name': 'scratch', 'power': 40, 'type': {'name': 'normal'}})
+        self.assertEqual(bundle.get_sprite(self.sprite_url), b'not really a png')
+        self.assertIsNone(bundle.get_json('http://example.com/move/dig'))
+
+    @patch('requests.Session.get')
+    def test_api_manager_backend_never_uses_network(self, mock_get):
+        APIManager.bundle = DataBundle(self.path)
+        record = SpeciesRecord.from_api(APIManager.get_pokemon_data('Charmander'))
+        moves = Move.load_many(record.move_urls(30))
+        self.assertEqual(record.types, ('fire',))
+        self.assertEqual([move.name for move in moves], ['scratch'])
+        mock_get.assert_not_called()
+
+    def test_default_bundle_is_opened_on_first_use(self):
+        # The simulations and tournaments read from the built bundle without setting it up
+        APIManager.bundle = DEFAULT_BUNDLE
+        with patch('bundle.DEFAULT_BUNDLE_PATH', self.path):
+            bundle = APIManager.get_bundle()
+        self.assertEqual(bundle.path, self.path)
+        self.assertIs(APIManager.get_bundle(), bundle)
+        APIManager.bundle = DEFAULT_BUNDLE
+        with patch('bundle.DEFAULT_BUNDLE_PATH', os.path.join(self.directory, 'missing.bundle')):
+            self.assertIsNone(APIManager.get_bundle())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from api_cache import ResponseCache, SCHEMA_VERSION
+from http_transport import SingleFlight
+from pokeapi import APIManager
+
+class CountingHandler(BaseHTTPRequestHandler):
+    '''
+    Serves /data/<name> as {"name": name} with an ETag and a Last-Modified date, counting
+    connections and requests and answering 304 to matching conditional requests
+    '''
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.paths.append(self.path)
+            server.conditional += bool(self.headers.get('If-None-Match') or self.headers.get('If-Modified-Since'))
+        time.sleep(server.delay)
+        name = self.path.rsplit('/', 1)[-1]
+        etag = f'"{name}-{server.version}"'
+        if self.headers.get('If-None-Match') == etag or (
+                server.send_etag is False and self.headers.get('If-Modified-Since') == server.last_modified):
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'name': name, 'version': server.version}).encode()
+        if server.html:  # Like a captive portal answering in place of the API
+            body = b'<html><body>Please log in</body></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html' if server.html else 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if server.send_etag:
+            self.send_header('ETag', etag)
+        self.send_header('Last-Modified', server.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestHTTPTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), CountingHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.connections = self.server.requests = self.server.conditional = 0
+        self.server.paths = []
+        self.server.delay = 0
+        self.server.version = 1
+        self.server.send_etag = True
+        self.server.html = False
+        self.server.last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_port}/data'
+        self.original_cache = APIManager.cache
+        APIManager.cache = ResponseCache(':memory:', ttl=60)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        APIManager.cache.close()
+        APIManager.cache = self.original_cache
+
+    def expire_cache(self):
+        APIManager.cache.ttl = 0
+        time.sleep(0.01)
+
+    def test_connections_are_reused(self):
+        for number in range(20):
+            self.assertEqual(APIManager.fetch_json(f'{self.base}/{number}')['name'], str(number))
+        self.assertEqual(self.server.requests, 20)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_identical_requests_are_coalesced(self):
+        self.server.delay = 0.2
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(APIManager.fetch_json(f'{self.base}/pikachu')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual([result['name'] for result in results], ['pikachu'] * 8)
+
+    def test_etag_revalidation(self):
+        APIManager.fetch_json(f'{self.base}/pikachu')
+        self.expire_cache()
+        self.assertEqual(APIManager.fetch_json(f'{self.base}/pikachu'), {'name': 'pikachu', 'version': 1})
+        self.assertEqual(self.server.conditional, 1)
+        # The 304 made the copy fresh again
+        APIManager.cache.ttl = 60
+        APIManager.fetch_json(f'{self.base}/pikachu')
+        self.assertEqual(self.server.requests, 2)
+
+    def test_changed_resource_is_replaced(self):
+        APIManager.fetch_json(f'{self.base}/pikachu')
+        self.expire_cache()
+        self.server.version = 2
+        self.assertEqual(APIManager.fetch_json(f'{self.base}/pikachu')['version'], 2)
+        self.assertEqual(APIManager.cache.get_entry(f'{self.base}/pikachu').etag, '"pikachu-2"')
+
+    def test_last_modified_revalidation(self):
+        self.server.send_etag = False
+        APIManager.fetch_json(f'{self.base}/pikachu')
+        self.expire_cache()
+        self.assertEqual(APIManager.fetch_json(f'{self.base}/pikachu')['name'], 'pikachu')
+        self.assertEqual(self.server.conditional, 1)
+
+    def test_answer_that_is_not_json(self):
+        APIManager.fetch_json(f'{self.base}/pikachu')
+        self.expire_cache()
+        self.server.version = 2  # Not a 304
+        self.server.html = True
+        self.assertEqual(APIManager.fetch_json(f'{self.base}/pikachu'), {'name': 'pikachu', 'version': 1})
+        self.assertEqual(self.server.conditional, 1)
+        self.assertIsNone(APIManager.fetch_json(f'{self.base}/eevee'))
+
+    def test_expired_copy_when_the_server_is_down(self):
+        APIManager.fetch_json(f'{self.base}/pikachu')
+        self.expire_cache()
+        original = (APIManager.max_retries, APIManager.timeout)
+        APIManager.max_retries, APIManager.timeout = 0, 0.5
+        try:
+            self.server.shutdown()
+            self.server.server_close()
+            APIManager.session = None  # Drop the kept-alive connection to the closed server
+            self.assertEqual(APIManager.fetch_json(f'{self.base}/pikachu')['name'], 'pikachu')
+            self.assertIsNone(APIManager.fetch_json(f'{self.base}/never-cached'))
+        finally:
+            APIManager.max_retries, APIManager.timeout = original
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_errors_are_shared_and_not_kept(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError('down')
+        errors = []
+        def call():
+            try:
+                flights.do('key', fail)
+            except ValueError as error:
+                errors.append(error)
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertEqual((flights.calls, flights.shared), (1, 1))
+        self.assertEqual(flights.do('key', lambda: 'up'), 'up')  # A new call once the failed one is over
+
+class TestCacheMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_old_cache_file_is_upgraded(self):
+        # A cache written before the validators were stored
+        cache = ResponseCache(self.path)
+        cache.put('http://example.com/a', {'name': 'tackle'})
+        cache.close()
+        conn = sqlite3.connect(self.path)
+        conn.execute('CREATE TABLE old AS SELECT url, body, size, stored_at, last_access FROM responses')
+        conn.execute('DROP TABLE responses')
+        conn.execute('ALTER TABLE old RENAME TO responses')
+        conn.execute('PRAGMA user_version = 0')
+        conn.commit()
+        conn.close()
+
+        cache = ResponseCache(self.path)
+        self.assertEqual(cache.get('http://example.com/a'), {'name': 'tackle'})
+        cache.put('http://example.com/b', {'name': 'ember'}, etag='"b"')
+        self.assertEqual(cache.get_entry('http://example.com/b').etag, '"b"')
+        cache.close()
+        conn = sqlite3.connect(self.path)
+        self.assertEqual(conn.execute('PRAGMA user_version').fetchone()[0], SCHEMA_VERSION)
+        conn.close()
+
+    def test_newer_cache_file_is_refused(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION + 1}')
+        conn.close()
+        with self.assertRaises(ValueError):
+            ResponseCache(self.path).get('http://example.com/a')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import sys
+import unittest
+from layout import EMPTY, LayoutCache, move_layout, turn_layout
+from test_battle_engine import MockMove
+
+class TestLayout(unittest.TestCase):
+
+    def test_turn_buttons(self):
+        layout = turn_layout(400, 3)
+        self.assertEqual(layout.hit((60, 430)).action, 'fight')
+        self.assertEqual(layout.hit((250, 445)).action, 'potion')
+        self.assertEqual(layout.hit((250, 445)).label, 'Potion (3)')
+        self.assertIsNone(layout.hit((175, 430)))  # Between the buttons
+        self.assertIsNone(layout.hit((60, 470)))  # The bottom edge is outside, like pygame.Rect
+
+    def test_move_buttons(self):
+        moves = [MockMove('scratch', 40, 'normal'), MockMove('ember', 40, 'fire'), MockMove('growl', None, 'normal')]
+        layout = move_layout(moves, 500, 500)
+        self.assertEqual([widget.label for widget in layout.widgets], ['Scratch', 'Ember', 'Growl'])
+        for widget, move in zip(layout.widgets, moves):
+            left, top, width, height = widget.rect
+            self.assertIs(layout.hit((left + width / 2, top + height / 2)).action, move)
+        self.assertIsNone(layout.hit((480, 445)))  # Where a fourth move would be
+        self.assertIsNone(EMPTY.hit((0, 0)))
+
+    def test_computed_once_per_state(self):
+        cache = LayoutCache()
+        first = cache.get(('player_turn', 400, 3), turn_layout, 400, 3)
+        self.assertIs(cache.get(('player_turn', 400, 3), turn_layout, 400, 3), first)
+        self.assertEqual(cache.builds, 1)
+        self.assertEqual(cache.get(('player_turn', 400, 2), turn_layout, 400, 2).widgets[1].label, 'Potion (2)')
+        self.assertEqual(cache.builds, 2)
+
+    def test_headless(self):
+        self.assertNotIn('pygame', sys.modules['layout'].__dict__)
+
+if __name__ == '__main__':
+    unittest.main()
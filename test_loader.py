@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+from loader import Loader
+
+def poll_until_idle(loader, timeout=5):
+    deadline = time.monotonic() + timeout
+    while loader.busy and time.monotonic() < deadline:
+        loader.poll()
+        time.sleep(0.001)
+
+class TestLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = Loader(max_workers=2)
+
+    def tearDown(self):
+        self.loader.shutdown()
+
+    def test_results_are_delivered_on_the_polling_thread(self):
+        results = []
+        worker_threads = []
+        def job(value):
+            worker_threads.append(threading.current_thread())
+            return value * 2
+        for value in range(5):
+            self.loader.submit(job, value, on_done=lambda result: results.append((result, threading.current_thread())))
+        poll_until_idle(self.loader)
+        self.assertEqual(sorted(result for result, _ in results), [0, 2, 4, 6, 8])
+        self.assertTrue(all(thread is threading.current_thread() for _, thread in results))
+        self.assertTrue(all(thread is not threading.current_thread() for thread in worker_threads))
+        self.assertEqual(self.loader.progress, 1.0)
+
+    def test_nothing_is_delivered_without_poll(self):
+        results = []
+        future = self.loader.submit(lambda: 'done', on_done=results.append)
+        future.result(timeout=5)
+        time.sleep(0.01)
+        self.assertEqual(results, [])
+        self.assertTrue(self.loader.busy)
+        self.assertEqual(self.loader.progress, 0.0)
+        self.assertEqual(self.loader.poll(), 1)
+        self.assertEqual(results, ['done'])
+
+    def test_errors_go_to_on_error(self):
+        errors = []
+        def job():
+            raise ValueError('no data')
+        self.loader.submit(job, on_done=self.fail, on_error=errors.append)
+        poll_until_idle(self.loader)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ValueError)
+        self.assertEqual(self.loader.failed, 1)
+
+    def test_main_thread_is_not_blocked(self):
+        release = threading.Event()
+        self.loader.submit(release.wait, 5)
+        start = time.monotonic()
+        self.assertEqual(self.loader.poll(), 0)
+        self.assertLess(time.monotonic() - start, 0.5)
+        release.set()
+        poll_until_idle(self.loader)
+        self.assertFalse(self.loader.busy)
+
+if __name__ == '__main__':
+    unittest.main()
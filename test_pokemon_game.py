@@ -1,9 +1,20 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import TestCase, mock
 import pygame
 from unittest.mock import patch, Mock
 from PokemonCombat import Move, Pokemon, APIManager, FirePokemon, WaterPokemon, GrassPokemon
-from PokemonCombat import handle_rival_turn, handle_player_turn, check_battle_end
+from PokemonCombat import handle_rival_turn, handle_player_turn, check_battle_end, load_starters, loading, start_loading
+from pokeapi import SpeciesRecord
+from api_cache import ResponseCache
+from loader import Loader
+from test_loader import poll_until_idle
 
 class TestMove(unittest.TestCase):
 
@@ -38,6 +49,91 @@ class TestMove(unittest.TestCase):
         self.assertEqual(fire_move.type, "fire")
         self.assertEqual(water_move.type, "water")
 
+def make_learnset(names, level_learned=1):
+    # Minimal PokeAPI 'moves' entries learned by level-up in red-blue
+    return [{'move': {'url': f'http://example.com/move/{name}'},
+             'version_group_details': [{'version_group': {'name': 'red-blue'},
+                                        'move_learn_method': {'name': 'level-up'},
+                                        'level_learned_at': level_learned}]}
+            for name in names]
+
+def make_species_data(names, level_learned=1):
+    # Minimal PokeAPI pokemon data
+    return {'name': 'testmon',
+            'stats': [{'stat': {'name': stat}, 'base_stat': 50} for stat in ('hp', 'attack', 'defense', 'speed')],
+            'types': [{'type': {'name': 'normal'}}],
+            'moves': make_learnset(names, level_learned),
+            'sprites': {'front_default': 'front.png', 'back_default': 'back.png', 'other': {'huge': 'data'}}}
+
+class TestSpeciesRecord(unittest.TestCase):
+
+    def test_record_is_trimmed(self):
+        data = make_species_data(['tackle', 'growl'], level_learned=10)
+        data['moves'].append({'move': {'url': 'http://example.com/move/surf'},
+                              'version_group_details': [{'version_group': {'name': 'gold-silver'},
+                                                         'move_learn_method': {'name': 'machine'},
+                                                         'level_learned_at': 0}]})
+        record = SpeciesRecord.from_api(data)
+        self.assertEqual(record.max_hp(30), 80)
+        self.assertEqual(record.types, ('normal',))
+        self.assertEqual(record.sprites, {'front_default': 'front.png', 'back_default': 'back.png'})
+        self.assertEqual(record.move_urls(30), ['http://example.com/move/tackle', 'http://example.com/move/growl'])
+        self.assertEqual(record.move_urls(5), [])
+        self.assertFalse(hasattr(record, '__dict__'))
+
+class TestMoveSelection(unittest.TestCase):
+
+    def setUp(self):
+        Move.registry.clear()
+        self.fetched = []
+
+    def tearDown(self):
+        Move.registry.clear()
+
+    def fake_fetch(self, url):
+        self.fetched.append(url)
+        name = url.rsplit('/', 1)[-1]
+        return {'name': name, 'power': None if name.startswith('growl') else 40, 'type': {'name': 'normal'}}
+
+    def make_pokemon(self, names):
+        # Skip __init__ so no species data or sprite has to be fetched
+        pokemon = Pokemon.__new__(Pokemon)
+        pokemon.level = 30
+        pokemon.species = SpeciesRecord.from_api(make_species_data(names))
+        return pokemon
+
+    def test_moves_are_interned(self):
+        with patch('PokemonCombat.APIManager.fetch_json', side_effect=self.fake_fetch):
+            first = Move.get('http://example.com/move/tackle')
+            second = Move.get('http://example.com/move/tackle')
+        self.assertIs(first, second)
+        self.assertEqual(len(self.fetched), 1)
+
+    def test_only_needed_moves_are_fetched(self):
+        pokemon = self.make_pokemon([f'move{i}' for i in range(20)])
+        with patch('PokemonCombat.APIManager.fetch_json', side_effect=self.fake_fetch):
+            pokemon.set_moves()
+        self.assertEqual(len(pokemon.moves), 4)
+        self.assertEqual(len(self.fetched), 4)
+
+    def test_moves_without_power_are_replaced(self):
+        pokemon = self.make_pokemon([f'growl{i}' for i in range(5)] + [f'move{i}' for i in range(5)])
+        with patch('PokemonCombat.APIManager.fetch_json', side_effect=self.fake_fetch):
+            pokemon.set_moves()
+        self.assertEqual(len(pokemon.moves), 4)
+        self.assertTrue(all(move.power is not None for move in pokemon.moves))
+        self.assertEqual(len(set(self.fetched)), len(self.fetched))
+
+    def test_moves_shared_between_pokemon(self):
+        names = ['tackle', 'scratch', 'ember', 'bubble']
+        with patch('PokemonCombat.APIManager.fetch_json', side_effect=self.fake_fetch):
+            first = self.make_pokemon(names)
+            first.set_moves()
+            second = self.make_pokemon(names)
+            second.set_moves()
+        self.assertEqual(len(self.fetched), 4)
+        self.assertEqual({id(move) for move in first.moves}, {id(move) for move in second.moves})
+
 class TestPokemon(unittest.TestCase):
     '''
     Perform_attack method is not tested due to the complexity:
@@ -45,6 +141,10 @@ class TestPokemon(unittest.TestCase):
     - involves random elements and conveys side effects (printing in console, updating display...)
     '''
     def setUp(self):
+        # Use a throwaway cache so the tests never read or write the real one
+        self.original_cache = APIManager.cache
+        APIManager.cache = ResponseCache(':memory:')
+
         # Initialize Pygame and its display module
         pygame.init()
         pygame.display.set_mode((1, 1))  # Minimal display size
@@ -54,6 +154,10 @@ class TestPokemon(unittest.TestCase):
         self.attacker = Pokemon('Charmander', 10, 100, 100)
         self.defender = Pokemon('Squirtle', 10, 100, 100)
 
+    def tearDown(self):
+        APIManager.cache.close()
+        APIManager.cache = self.original_cache
+
     def test_initialization(self):
         self.assertEqual(self.pokemon.name, 'Pikachu')
         self.assertEqual(self.pokemon.level, 10)
@@ -77,7 +181,19 @@ class TestPokemon(unittest.TestCase):
 
 class TestAPIManager(unittest.TestCase):
 
-    @patch('requests.get')
+    def setUp(self):
+        # Use a throwaway cache so the tests never read or write the real one, and no bundle
+        self.original_cache = APIManager.cache
+        self.original_bundle = APIManager.bundle
+        APIManager.cache = ResponseCache(':memory:')
+        APIManager.bundle = None
+
+    def tearDown(self):
+        APIManager.cache.close()
+        APIManager.cache = self.original_cache
+        APIManager.bundle = self.original_bundle
+
+    @patch('requests.Session.get')
     def test_get_pokemon_data(self, mock_get):
         # Mock a API response
         mock_get.return_value = unittest.mock.Mock(status_code=200, json=lambda: {"name": "pikachu"})
@@ -86,7 +202,7 @@ class TestAPIManager(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result['name'], "pikachu")
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_move_data(self, mock_get):
         # Mock a API response for move data
         mock_get.return_value = unittest.mock.Mock(status_code=200, json=lambda: {"name": "tackle", "power": 40})
@@ -96,11 +212,98 @@ class TestAPIManager(unittest.TestCase):
         self.assertEqual(result['name'], "tackle")
         self.assertEqual(result['power'], 40)
 
+    @patch('requests.Session.get')
+    def test_responses_are_cached(self, mock_get):
+        mock_get.return_value = unittest.mock.Mock(status_code=200, json=lambda: {"name": "pikachu"})
+        APIManager.get_pokemon_data("pikachu")
+        result = APIManager.get_pokemon_data("Pikachu")
+
+        self.assertEqual(result['name'], "pikachu")
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(APIManager.cache.hits, 1)
+
+    @patch('requests.Session.get')
+    def test_offline_mode_never_uses_network(self, mock_get):
+        APIManager.cache.offline = True
+        self.assertIsNone(APIManager.get_move_data("http://example.com/move/tackle"))
+        mock_get.assert_not_called()
+
+class StubMoveHandler(BaseHTTPRequestHandler):
+    '''
+    Serves /move/<n> as a move with power n, slowly, and fails the first request for /move/flaky
+    '''
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests += 1
+            fail = self.path == '/move/flaky' and not server.failed_once
+            if fail:
+                server.failed_once = True
+        time.sleep(0.05)
+        with server.lock:
+            server.in_flight -= 1
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        name = self.path.rsplit('/', 1)[-1]
+        body = json.dumps({'name': name, 'power': 1 if name == 'flaky' else int(name), 'type': {'name': 'normal'}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestConcurrentMoveLoading(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubMoveHandler)
+        self.server.lock = threading.Lock()
+        self.server.in_flight = self.server.max_in_flight = self.server.requests = 0
+        self.server.failed_once = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_port}/move'
+        self.original_cache = APIManager.cache
+        self.original_backoff = APIManager.backoff
+        APIManager.cache = ResponseCache(':memory:')
+        APIManager.backoff = 0.01
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        APIManager.cache.close()
+        APIManager.cache = self.original_cache
+        APIManager.backoff = self.original_backoff
+
+    def test_load_many_keeps_order(self):
+        urls = [f'{self.base}/{power}' for power in range(1, 13)]
+        moves = Move.load_many(urls, max_workers=4)
+        self.assertEqual([move.power for move in moves], list(range(1, 13)))
+
+    def test_concurrency_limit(self):
+        urls = [f'{self.base}/{power}' for power in range(1, 13)]
+        Move.load_many(urls, max_workers=4)
+        # Requests overlapped (each one takes 50ms on the server), but never more than 4 at once
+        self.assertLessEqual(self.server.max_in_flight, 4)
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertEqual(self.server.requests, 12)
+
+    def test_retries_server_errors(self):
+        moves = Move.load_many([f'{self.base}/flaky'], max_workers=2)
+        self.assertEqual(moves[0].name, 'flaky')
+        self.assertEqual(self.server.requests, 2)
+
 # Mock classes and functions for some tests of the actions in the game
 class MockMove:
-    def __init__(self, name, power):
+    def __init__(self, name, power, type='normal'):
         self.name = name
         self.power = power
+        self.type = type
 
 class MockPokemon:
     def __init__(self, name, current_hp, moves):
@@ -108,6 +311,12 @@ class MockPokemon:
         self.current_hp = current_hp
         self.moves = moves
         self.max_hp = current_hp
+        # Stats read by the rival's AI
+        self.level = 10
+        self.attack = 50
+        self.defense = 50
+        self.types = ('normal',)
+        self.num_potions = 0
 
     def perform_attack(self, other, move):
         # Simplified attack logic for testing
@@ -150,5 +359,78 @@ class TestPokemonBattle(unittest.TestCase):
         result = check_battle_end(player, rival)
         self.assertEqual(result, 'gameover')
 
+class TestDamageTable(unittest.TestCase):
+
+    @patch('PokemonCombat.show_battle_event')
+    def test_coefficients_are_computed_once_per_battle(self, mock_show_battle_event):
+        from battle_engine import DamageTable
+        from test_battle_engine import FixedRoll, make_combatant
+        player, rival = make_combatant(), make_combatant('Squirtle', ('water',))
+        with patch('PokemonCombat.damage_table', DamageTable()), patch('PokemonCombat.battle_rng', FixedRoll(10000)), \
+                patch('battle_engine.damage_coefficient', return_value=10.0) as mock_coefficient:
+            for _ in range(3):
+                Pokemon.perform_attack(player, rival, player.moves[0])
+        self.assertEqual(mock_coefficient.call_count, 1)
+        self.assertEqual(rival.current_hp, rival.max_hp - 30)
+
+class StarterStub:
+    def __init__(self, name, level, x, y):
+        self.name = name
+        self.x = x
+
+class TestStarterLoading(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = Loader(max_workers=2)
+        self.attempts = []
+
+    def tearDown(self):
+        self.loader.shutdown()
+
+    def fetch_starter(self, name, level):
+        self.attempts.append(name)
+        if name == 'Squirtle' and self.attempts.count(name) == 1:
+            raise ValueError(f'Failed to retrieve data for {name}')
+        return []
+
+    def load(self, pokemons, names=None):
+        with patch('PokemonCombat.loader', self.loader), patch('PokemonCombat.Pokemon', StarterStub), \
+                patch('PokemonCombat.fetch_starter', side_effect=self.fetch_starter), patch('builtins.print'):
+            start_loading()
+            load_starters(pokemons, {'Bulbasaur': (25, 150), 'Squirtle': (325, 150)}, 30, names)
+            poll_until_idle(self.loader)
+
+    def test_failed_starters_can_be_loaded_again(self):
+        pokemons = []
+        self.load(pokemons)
+        self.assertEqual([pokemon.name for pokemon in pokemons], ['Bulbasaur'])
+        self.assertEqual(loading['failed'], ['Squirtle'])
+        # Retrying starts a new loading phase with only the starters that failed
+        self.load(pokemons, loading['failed'])
+        self.assertEqual([pokemon.name for pokemon in pokemons], ['Bulbasaur', 'Squirtle'])
+        self.assertEqual(loading['failed'], [])
+        self.assertEqual((self.loader.completed - loading['since'], self.loader.submitted - loading['since']), (1, 1))
+
+class TestImport(unittest.TestCase):
+
+    def test_import_has_no_side_effects(self):
+        # A fresh interpreter, so the display state of the other tests does not matter
+        code = ('import pygame, PokemonCombat; '
+                'assert PokemonCombat.game is None; '
+                'assert not pygame.display.get_init(); '
+                'assert PokemonCombat.APIManager.session is None')
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_import_without_response_cache(self):
+        # A cache of None always uses the network, the sprite cache is only created on first use
+        code = ('import pokeapi; pokeapi.APIManager.cache = None; import PokemonCombat; '
+                'assert PokemonCombat.Pokemon.sprites is None; '
+                'assert not PokemonCombat.Pokemon.get_sprites().offline')
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
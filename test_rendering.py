@@ -0,0 +1,106 @@
+import os
+import unittest
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+from unittest.mock import patch
+from rendering import Element, FrameRenderer, HPBar
+
+class TestFrameRenderer(unittest.TestCase):
+
+    def setUp(self):
+        pygame.display.init()
+        self.screen = pygame.display.set_mode((200, 200))
+        self.renderer = FrameRenderer(self.screen, (200, 200, 200))
+        self.draws = []
+
+    def element(self, name, key, rect, color=(255, 0, 0)):
+        def draw(surface):
+            self.draws.append(name)
+            surface.fill(color, rect)
+        return Element(name, key, rect, draw)
+
+    def test_first_frame_is_full(self):
+        dirty = self.renderer.render([self.element('a', (1,), (0, 0, 10, 10))])
+        self.assertEqual(dirty, [self.screen.get_rect()])
+        self.assertEqual(self.screen.get_at((5, 5))[:3], (255, 0, 0))
+        self.assertEqual(self.screen.get_at((50, 50))[:3], (200, 200, 200))
+
+    def test_unchanged_frame_draws_nothing(self):
+        self.renderer.render([self.element('a', (1,), (0, 0, 10, 10))])
+        self.draws.clear()
+        with patch('pygame.display.update') as mock_update:
+            dirty = self.renderer.render([self.element('a', (1,), (0, 0, 10, 10))])
+        self.assertEqual(dirty, [])
+        self.assertEqual(self.draws, [])
+        mock_update.assert_not_called()
+        self.assertEqual(self.renderer.skipped, 1)
+
+    def test_only_changed_elements_are_redrawn(self):
+        self.renderer.render([self.element('a', (1,), (0, 0, 10, 10)), self.element('b', (1,), (100, 100, 10, 10))])
+        self.draws.clear()
+        dirty = self.renderer.render([self.element('a', (1,), (0, 0, 10, 10)),
+                                      self.element('b', (2,), (100, 100, 10, 10), (0, 255, 0))])
+        self.assertEqual(dirty, [pygame.Rect(100, 100, 10, 10)])
+        self.assertEqual(self.draws, ['b'])
+        self.assertEqual(self.screen.get_at((105, 105))[:3], (0, 255, 0))
+
+    def test_moved_and_removed_elements_restore_background(self):
+        self.renderer.render([self.element('a', (1,), (0, 0, 10, 10)), self.element('b', (1,), (100, 100, 10, 10))])
+        self.renderer.render([self.element('a', (1,), (20, 0, 10, 10))])
+        self.assertEqual(self.screen.get_at((5, 5))[:3], (200, 200, 200))
+        self.assertEqual(self.screen.get_at((105, 105))[:3], (200, 200, 200))
+        self.assertEqual(self.screen.get_at((25, 5))[:3], (255, 0, 0))
+
+    def test_invalidated_area_is_restored(self):
+        self.renderer.render([self.element('a', (1,), (0, 0, 10, 10))])
+        self.screen.fill((0, 0, 0), (50, 50, 20, 20))  # e.g. a message box drawn directly
+        self.renderer.invalidate((50, 50, 20, 20))
+        dirty = self.renderer.render([self.element('a', (1,), (0, 0, 10, 10))])
+        self.assertEqual(dirty, [pygame.Rect(50, 50, 20, 20)])
+        self.assertEqual(self.screen.get_at((55, 55))[:3], (200, 200, 200))
+
+class TestHPBar(unittest.TestCase):
+
+    def setUp(self):
+        pygame.display.init()
+        pygame.font.init()
+        self.screen = pygame.display.set_mode((300, 100))
+
+    def test_bar_proportions(self):
+        bar = HPBar(drain_rate=None)
+        self.screen.fill((200, 200, 200))
+        bar.draw(self.screen, 0, 0, 35, 70)
+        self.assertEqual(self.screen.get_at((99, 10))[:3], (0, 200, 0))
+        self.assertEqual(self.screen.get_at((100, 10))[:3], (200, 0, 0))
+        self.assertEqual(self.screen.get_at((250, 10))[:3], (200, 200, 200))
+
+    def test_high_max_hp_still_fills_the_bar(self):
+        # 200 // max_hp used to be 0 for big HP pools, drawing an empty bar
+        bar = HPBar(drain_rate=None)
+        bar.draw(self.screen, 0, 0, 700, 700)
+        self.assertEqual(self.screen.get_at((199, 10))[:3], (0, 200, 0))
+
+    def test_constant_work(self):
+        with patch('pygame.draw.rect') as mock_rect:
+            for max_hp in (50, 700):
+                HPBar(drain_rate=None).draw(self.screen, 0, 0, max_hp // 2, max_hp)
+        mock_rect.assert_not_called()
+
+    def test_redrawn_only_when_hp_changes(self):
+        bar = HPBar(drain_rate=None)
+        for _ in range(10):
+            bar.draw(self.screen, 0, 0, 50, 70)
+        bar.draw(self.screen, 0, 0, 40, 70)
+        self.assertEqual(bar.redraws, 2)
+
+    def test_smooth_drain(self):
+        bar = HPBar(drain_rate=40)
+        self.assertEqual(bar.update(70, 70, now=0), 70)
+        self.assertEqual(bar.update(30, 70, now=500), 50)  # 40 HP per second
+        self.assertEqual(bar.update(30, 70, now=800), 38)
+        self.assertEqual(bar.update(30, 70, now=2000), 30)
+        bar.reset()
+        self.assertEqual(bar.update(70, 70, now=2001), 70)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from battle_engine import Battle, Combatant, POTION
+from test_battle_engine import MockMove
+from replay import ATTACK, BATTLE, COMBATANT, SEGMENT, ReplayReader, ReplayWriter, record_simulation, replay_battle, summarize, verify
+
+def make_pair():
+    charmander = Combatant('Charmander', 30, 69, 52, 43, 65, ('fire',),
+                           [MockMove('scratch', 40, 'normal'), MockMove('ember', 40, 'fire'), MockMove('growl', None, 'normal')])
+    squirtle = Combatant('Squirtle', 30, 74, 48, 65, 43, ('water',),
+                         [MockMove('tackle', 40, 'normal'), MockMove('water-gun', 40, 'water')])
+    return charmander, squirtle
+
+class TestReplayLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'battles.replay')
+        self.player, self.rival = make_pair()
+        # Moves without power are never picked
+        self.player.moves = self.player.moves[:2]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_simulated_battles_replay_identically(self):
+        results = record_simulation(self.path, self.player, self.rival, 200, seed=7)
+        stats = summarize(self.path)
+        self.assertEqual(stats['battles'], 200)
+        self.assertEqual(stats['player_wins'], results['player_wins'])
+        self.assertEqual(stats['rival_wins'], results['rival_wins'])
+        self.assertEqual(stats['actions'], results['turns'])
+        self.assertGreater(stats['critical_hits'], 0)
+        self.assertEqual(verify(self.path), 200)
+
+    def test_log_is_compact(self):
+        results = record_simulation(self.path, self.player, self.rival, 1, seed=1)
+        first = os.path.getsize(self.path)
+        definitions = first - 5 - (1 + 12) - results['turns'] * (1 + 7) - (1 + 1)
+        results = record_simulation(self.path, self.player, self.rival, 1000, seed=2)
+        # The pokemon are defined once per session, a battle is its header, its actions and its end
+        expected = 1 + definitions + 1000 * (1 + 12) + results['turns'] * (1 + 7) + 1000 * (1 + 1)
+        self.assertEqual(os.path.getsize(self.path) - first, expected)
+        tags = [record[0] for record in ReplayReader(self.path).records()]
+        self.assertEqual(tags.count(COMBATANT), 4)
+        self.assertEqual(tags.count(SEGMENT), 1)
+        self.assertEqual(tags.count(BATTLE), 1001)
+        self.assertEqual(verify(self.path), 1001)
+
+    def test_appending_does_not_read_the_log(self):
+        record_simulation(self.path, self.player, self.rival, 5, seed=1)
+        with patch.object(ReplayReader, 'records', side_effect=AssertionError('the log was read')):
+            record_simulation(self.path, self.player, self.rival, 5, seed=2)
+        self.assertEqual(summarize(self.path)['battles'], 10)
+
+    def test_unfinished_record_is_cut(self):
+        record_simulation(self.path, self.player, self.rival, 3, seed=1)
+        size = os.path.getsize(self.path)
+        writer = ReplayWriter(self.path)
+        writer.begin(1, self.player, self.rival)
+        writer._file.close()  # Killed while writing the battle: part of it is in the file, not its end
+        writer._end_file.close()
+        with open(self.path, 'ab') as file:
+            file.write(ATTACK + b'\x00')
+        with patch('builtins.print'):
+            record_simulation(self.path, self.player, self.rival, 2, seed=2)
+        self.assertEqual(summarize(self.path)['battles'], 5)
+        self.assertEqual(verify(self.path), 5)
+        self.assertGreater(os.path.getsize(self.path), size)
+
+    def test_unfinished_record_is_cut_without_sidecar(self):
+        record_simulation(self.path, self.player, self.rival, 3, seed=1)
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as file:
+            file.write(BATTLE + b'\x01\x02')
+        os.remove(self.path + '.end')
+        with patch('builtins.print') as mock_print:
+            ReplayWriter(self.path).close()
+        mock_print.assert_called_once()
+        self.assertEqual(os.path.getsize(self.path), size + 1)  # Only the new segment was added
+        self.assertEqual(summarize(self.path)['battles'], 3)
+
+    def test_other_files_are_moved_aside(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'{"json": true}')
+        with patch('builtins.print'):
+            record_simulation(self.path, self.player, self.rival, 2, seed=1)
+        self.assertEqual(summarize(self.path)['battles'], 2)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.bak')]), 1)
+
+    def test_divergence_is_detected(self):
+        record_simulation(self.path, self.player, self.rival, 1, seed=3)
+        log = next(ReplayReader(self.path).battles())
+        attack = log.actions[0]
+        log.actions[0] = attack[:4] + (attack[4] + 1,) + attack[5:]
+        with self.assertRaises(ValueError):
+            replay_battle(log)
+
+    def test_potions_and_unfinished_battles(self):
+        writer = ReplayWriter(self.path)
+        battle = Battle(self.player, self.rival, random.Random(11), observers=[writer.record])
+        writer.begin(11, self.player, self.rival)
+        battle.act(self.player, self.player.moves[0])
+        battle.act(self.rival, self.rival.moves[1])
+        battle.act(self.player, POTION)
+        writer.close()  # Left before the end
+
+        log = next(ReplayReader(self.path).battles())
+        self.assertIsNone(log.winner)
+        self.assertEqual([action[0] for action in log.actions], ['attack', 'attack', 'potion'])
+        self.assertEqual(log.actions[2][3], self.player.current_hp)
+        self.assertEqual(log.player.current_hp, 69)  # The state before the battle
+        replay_battle(log)
+        self.assertEqual(summarize(self.path)['unfinished'], 1)
+
+    def test_reader_streams_records(self):
+        record_simulation(self.path, self.player, self.rival, 3, seed=5)
+        records = ReplayReader(self.path).records()
+        self.assertFalse(isinstance(records, list))
+        self.assertEqual(next(record for record in records if record[0] == ATTACK)[0], ATTACK)
+
+    def test_not_a_replay_log(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'{"json": true}')
+        with self.assertRaises(ValueError):
+            list(ReplayReader(self.path).records())
+
+if __name__ == '__main__':
+    unittest.main()
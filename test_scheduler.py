@@ -0,0 +1,55 @@
+import unittest
+from scheduler import Scheduler
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.scheduler.update(1000)
+
+    def test_waits_add_up(self):
+        self.scheduler.wait(2000)
+        self.scheduler.wait(1500)
+        self.assertTrue(self.scheduler.busy)
+        self.scheduler.update(4499)
+        self.assertTrue(self.scheduler.busy)
+        self.scheduler.update(4500)
+        self.assertFalse(self.scheduler.busy)
+
+    def test_callbacks_run_when_due_in_order(self):
+        calls = []
+        self.scheduler.after(100, lambda: calls.append('second'))
+        self.scheduler.after(50, lambda: calls.append('first'))
+        self.scheduler.after(100, lambda: calls.append('third'))
+        self.assertEqual(self.scheduler.update(1049), 0)
+        self.assertTrue(self.scheduler.busy)
+        self.assertEqual(self.scheduler.update(1100), 3)
+        self.assertEqual(calls, ['first', 'second', 'third'])
+        self.assertFalse(self.scheduler.busy)
+
+    def test_then_runs_after_the_waits(self):
+        calls = []
+        self.scheduler.wait(2000)
+        self.scheduler.then(lambda: calls.append('message'))
+        self.scheduler.update(2999)
+        self.assertEqual(calls, [])
+        self.scheduler.update(3000)
+        self.assertEqual(calls, ['message'])
+
+    def test_then_runs_right_away_when_idle(self):
+        calls = []
+        self.scheduler.then(lambda: calls.append('message'))
+        self.scheduler.update(1000)
+        self.assertEqual(calls, ['message'])
+
+    def test_clear(self):
+        calls = []
+        self.scheduler.wait(2000)
+        self.scheduler.after(10, lambda: calls.append('cancelled'))
+        self.scheduler.clear()
+        self.assertFalse(self.scheduler.busy)
+        self.scheduler.update(5000)
+        self.assertEqual(calls, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+from sprite_cache import SpriteCache
+
+class TestSpriteCache(unittest.TestCase):
+
+    def setUp(self):
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+        self.directory = tempfile.mkdtemp()
+        # A 96x96 image served from a file:// url stands in for the PokeAPI sprite
+        image_path = os.path.join(self.directory, 'source.png')
+        image = pygame.Surface((96, 96), pygame.SRCALPHA)
+        image.fill((200, 0, 0, 255))
+        pygame.image.save(image, image_path)
+        self.url = pathlib.Path(image_path).as_uri()
+        self.cache = SpriteCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_surface_is_scaled(self):
+        surface = self.cache.get_surface(('bulbasaur', 'front_default', 150), self.url, 150)
+        self.assertEqual(surface.get_size(), (150, 150))
+
+    def test_repeat_lookups_do_no_io(self):
+        first = self.cache.get_surface(('bulbasaur', 'front_default', 150), self.url, 150)
+        second = self.cache.get_surface(('bulbasaur', 'front_default', 150), self.url, 150)
+        self.assertIs(first, second)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.downloads, 1)
+
+    def test_bytes_are_kept_on_disk(self):
+        self.cache.get_bytes(self.url)
+        other = SpriteCache(self.cache.directory)
+        other.get_surface(('bulbasaur', 'back_default', 200), self.url, 200)
+        self.assertEqual(other.downloads, 0)
+
+    def test_memory_bound_eviction(self):
+        self.cache.max_bytes = 150 * 150 * 4
+        self.cache.get_surface(('bulbasaur', 'front_default', 150), self.url, 150)
+        self.cache.get_surface(('bulbasaur', 'back_default', 150), self.url, 150)
+        stats = self.cache.stats()
+        self.assertEqual(stats['surfaces'], 1)
+        self.assertLessEqual(stats['bytes'], self.cache.max_bytes)
+
+if __name__ == '__main__':
+    unittest.main()
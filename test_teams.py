@@ -0,0 +1,52 @@
+import threading
+import unittest
+from teams import load_parties, load_party
+
+class FakeLoader:
+    '''
+    Stands in for tournament.load_combatant, optionally waiting at a barrier for the other loads
+    '''
+    def __init__(self, barrier=None):
+        self.barrier = barrier
+        self.threads = set()
+
+    def __call__(self, name, level, seed):
+        self.threads.add(threading.get_ident())
+        if self.barrier is not None:
+            self.barrier.wait()
+        return FakeCombatant(name, level)
+
+class FakeCombatant:
+    def __init__(self, name, level):
+        self.name = name
+        self.level = level
+        self.current_hp = 10
+
+class TestLoadParty(unittest.TestCase):
+
+    def test_members_keep_their_order(self):
+        party = load_party(['a', 'b', 'c'], 30, loader=FakeLoader())
+        self.assertEqual([member.name for member in party.members], ['a', 'b', 'c'])
+        self.assertEqual(party.remaining, 3)
+
+    def test_members_load_concurrently(self):
+        # Every load waits for the 11 others: loading them one after the other breaks the barrier
+        barrier = threading.Barrier(12, timeout=5)
+        loader = FakeLoader(barrier)
+        player, rival = load_parties([list('abcdef'), list('ghijkl')], 30, loader=loader)
+        self.assertEqual([member.name for member in rival.members], list('ghijkl'))
+        self.assertEqual(len(loader.threads), 12)
+
+    def test_party_size(self):
+        with self.assertRaises(ValueError):
+            load_party(list('abcdefg'), 30, loader=FakeLoader())
+        with self.assertRaises(ValueError):
+            load_party([], 30, loader=FakeLoader())
+
+    def test_no_parties(self):
+        loader = FakeLoader()
+        self.assertEqual(load_parties([], 30, loader=loader), [])
+        self.assertEqual(loader.threads, set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from telemetry import MemorySink, Telemetry, configure_telemetry, prometheus_text, sink_for, telemetry
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_disabled_records_nothing(self):
+        metrics = Telemetry()
+        self.assertFalse(metrics.enabled)
+        metrics.count('requests')
+        with metrics.timer('frame_ms'):
+            pass
+        self.assertEqual(metrics.snapshot()['counters'], {})
+        self.assertEqual(metrics.snapshot()['histograms'], {})
+
+    def test_counters_and_histograms(self):
+        sink = MemorySink()
+        metrics = Telemetry(sink)
+        metrics.count('requests')
+        metrics.count('requests', 2)
+        for value in (0.5, 3, 3, 20, 4000):
+            metrics.observe('frame_ms', value)
+        metrics.flush()
+        snapshot = sink.snapshots[-1]
+        self.assertEqual(snapshot['counters'], {'requests': 3})
+        histogram = snapshot['histograms']['frame_ms']
+        self.assertEqual(histogram['count'], 5)
+        self.assertEqual(histogram['max'], 4000)
+        self.assertEqual(histogram['p50'], 5)  # Upper bound of the bucket of the median
+        self.assertEqual(sum(histogram['buckets']), 5)
+
+    def test_timers(self):
+        metrics = Telemetry(MemorySink())
+        @metrics.timed('turn_ms')
+        def turn(value):
+            return value * 2
+        self.assertEqual(turn(21), 42)
+        self.assertEqual(turn.__name__, 'turn')
+        with metrics.timer('load_ms'):
+            pass
+        histograms = metrics.snapshot()['histograms']
+        self.assertEqual(histograms['turn_ms']['count'], 1)
+        self.assertEqual(histograms['load_ms']['count'], 1)
+
+    def test_threads(self):
+        metrics = Telemetry(MemorySink())
+        def work():
+            for _ in range(1000):
+                metrics.count('requests')
+                metrics.observe('request_ms', 1)
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(metrics.counters['requests'], 8000)
+        self.assertEqual(metrics.histograms['request_ms'].count, 8000)
+
+    def test_json_lines_sink(self):
+        path = os.path.join(self.directory, 'telemetry.jsonl')
+        metrics = Telemetry(sink_for(path))
+        metrics.count('requests')
+        metrics.flush()
+        metrics.count('requests')
+        metrics.close()
+        with open(path) as file:
+            snapshots = [json.loads(line) for line in file]
+        self.assertEqual([snapshot['counters']['requests'] for snapshot in snapshots], [1, 2])
+
+    def test_prometheus_sink(self):
+        path = os.path.join(self.directory, 'metrics.prom')
+        metrics = Telemetry(sink_for(path))
+        metrics.count('api.requests', 4)
+        metrics.observe('frame_ms', 3)
+        metrics.observe('frame_ms', 40)
+        metrics.close()
+        with open(path) as file:
+            lines = file.read().splitlines()
+        self.assertIn('pokemon_api_requests_total 4', lines)
+        self.assertIn('# TYPE pokemon_frame_ms histogram', lines)
+        self.assertIn('pokemon_frame_ms_bucket{le="5"} 1', lines)
+        self.assertIn('pokemon_frame_ms_bucket{le="+Inf"} 2', lines)
+        self.assertIn('pokemon_frame_ms_count 2', lines)
+        self.assertEqual(prometheus_text({'counters': {}, 'histograms': {}}), '\n')
+
+    def test_configure_from_environment(self):
+        self.assertIsNone(configure_telemetry({}))
+        self.assertFalse(telemetry.enabled)
+        out = os.path.join(self.directory, 'session.prof')
+        profiler = configure_telemetry({'POKEMON_PROFILE': 'cpu,memory', 'POKEMON_PROFILE_OUT': out})
+        sum(range(1000))
+        profiler.stop(top=5)
+        self.assertTrue(os.path.exists(out))
+        self.assertTrue(os.path.exists(out + '.memory.txt'))
+
+if __name__ == '__main__':
+    unittest.main()
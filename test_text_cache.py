@@ -0,0 +1,51 @@
+import os
+import unittest
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+import pygame
+from unittest.mock import patch
+from text_cache import TextCache
+
+class TestTextCache(unittest.TestCase):
+
+    def setUp(self):
+        pygame.font.init()
+        self.cache = TextCache(max_entries=3)
+
+    def test_fonts_are_loaded_once(self):
+        first = self.cache.get_font(16)
+        second = self.cache.get_font(16)
+        self.cache.get_font(20)
+        self.assertIs(first, second)
+        self.assertEqual(self.cache.font_loads, 2)
+
+    def test_steady_state_allocates_no_surfaces(self):
+        labels = ['Fight', 'Potion (3)', 'HP: 69 / 69']
+        for _ in range(100):
+            for label in labels:
+                self.cache.render(label, 16, (0, 0, 0))
+        self.assertEqual(self.cache.misses, 3)
+        self.assertEqual(self.cache.hits, 297)
+        with patch('pygame.font.Font') as mock_font:
+            self.cache.render('Fight', 16, (0, 0, 0))
+        mock_font.assert_not_called()
+
+    def test_colour_and_size_are_part_of_the_key(self):
+        black = self.cache.render('Fight', 16, (0, 0, 0))
+        red = self.cache.render('Fight', 16, (200, 0, 0))
+        big = self.cache.render('Fight', 20, (0, 0, 0))
+        self.assertIsNot(black, red)
+        self.assertGreater(big.get_height(), black.get_height())
+
+    def test_least_recently_used_text_is_evicted(self):
+        for label in ('a', 'b', 'c'):
+            self.cache.render(label, 16, (0, 0, 0))
+        self.cache.render('a', 16, (0, 0, 0))
+        self.cache.render('d', 16, (0, 0, 0))  # Evicts 'b'
+        self.assertEqual(self.cache.stats()['surfaces'], 3)
+        misses = self.cache.misses
+        self.cache.render('a', 16, (0, 0, 0))
+        self.cache.render('b', 16, (0, 0, 0))
+        self.assertEqual(self.cache.misses, misses + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import csv
+import os
+import tempfile
+import unittest
+from battle_engine import Combatant
+from test_battle_engine import MockMove
+import tournament
+
+STATS = {
+    'bulbasaur': (75, 49, 49, 45, ['grass', 'poison']),
+    'charmander': (69, 52, 43, 65, ['fire']),
+    'squirtle': (74, 48, 65, 43, ['water']),
+    'pikachu': (65, 55, 40, 90, ['electric']),
+}
+
+def fake_loader(name, level, seed):
+    # Module level so it can be sent to the worker processes
+    max_hp, attack, defense, speed, types = STATS[name]
+    moves = [MockMove('tackle', 40, 'normal'), MockMove(f'{types[0]}-move', 40, types[0])]
+    return Combatant(name, level, max_hp, attack, defense, speed, types, moves)
+
+class TestTournament(unittest.TestCase):
+
+    entrants = [('bulbasaur', 30), ('charmander', 30), ('squirtle', 30), ('pikachu', 30)]
+
+    def test_round_robin_matrix(self):
+        matrix = tournament.run_round_robin(self.entrants, 200, seed=1, workers=2, loader=fake_loader)
+        self.assertEqual(len(matrix), 4)
+        for i, row in enumerate(matrix):
+            self.assertIsNone(row[i])
+            for j, rate in enumerate(row):
+                if i != j:
+                    self.assertTrue(0 <= rate <= 1)
+
+    def test_results_do_not_depend_on_worker_count(self):
+        one = tournament.run_round_robin(self.entrants, 200, seed=7, workers=1, loader=fake_loader)
+        three = tournament.run_round_robin(self.entrants, 200, seed=7, workers=3, loader=fake_loader)
+        self.assertEqual(one, three)
+
+    def test_bracket(self):
+        rounds = tournament.run_bracket(self.entrants, 200, seed=1, workers=2, loader=fake_loader)
+        self.assertEqual([len(played) for played in rounds], [2, 1])
+        finalists = {winner for _, _, winner in rounds[0]}
+        self.assertEqual({rounds[1][0][0], rounds[1][0][1]}, finalists)
+
+    def test_write_matrix(self):
+        matrix = [[None, 0.25], [0.5, None]]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'matchups.csv')
+            tournament.write_matrix(path, self.entrants[:2], matrix)
+            with open(path, newline='') as file:
+                rows = list(csv.reader(file))
+        self.assertEqual(rows[0], ['', 'bulbasaur:30', 'charmander:30'])
+        self.assertEqual(rows[1], ['bulbasaur:30', '', '0.250000'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from type_chart import CHART, TYPES, effectiveness, type_id
+
+class TestTypeChart(unittest.TestCase):
+
+    def test_chart_is_compact(self):
+        self.assertEqual(len(TYPES), 18)
+        self.assertEqual(len(CHART), 18 * 18)
+        self.assertEqual(type_id('fire'), TYPES.index('fire'))
+
+    def test_single_type(self):
+        self.assertEqual(effectiveness('fire', ['grass']), 2)
+        self.assertEqual(effectiveness('water', ['fire']), 2)
+        self.assertEqual(effectiveness('grass', ['water']), 2)
+        self.assertEqual(effectiveness('fire', ['water']), 0.5)
+        self.assertEqual(effectiveness('normal', ['ghost']), 0)
+        self.assertEqual(effectiveness('normal', ['normal']), 1)
+
+    def test_dual_type(self):
+        self.assertEqual(effectiveness('fire', ['grass', 'poison']), 2)
+        self.assertEqual(effectiveness('ice', ['grass', 'flying']), 4)
+        self.assertEqual(effectiveness('grass', ['fire', 'flying']), 0.25)
+
+    def test_unknown_types_are_neutral(self):
+        self.assertEqual(effectiveness('shadow', ['grass']), 1)
+        self.assertEqual(effectiveness('fire', ['unknown']), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+'''
+Font registry and rendered text cache
+Loading a font parses the font file from disk and rendering text allocates a new
+surface, so both are done once and reused: fonts are kept by (face, size) and rendered
+text by (text, size, colour, face), evicting the least recently used text first.
+'''
+from collections import OrderedDict
+import pygame
+
+DEFAULT_MAX_ENTRIES = 256
+
+class TextCache:
+    '''
+    Represents the shared fonts and rendered text surfaces
+    Attributes:
+    - max_entries(int): the maximum number of rendered text surfaces kept
+    - hits(int): number of renders served from the cache
+    - misses(int): number of renders that created a new surface
+    - font_loads(int): number of fonts loaded from disk
+    '''
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.font_loads = 0
+        self._fonts = {}
+        self._surfaces = OrderedDict()
+
+    def get_font(self, size, face=None):
+        '''
+        Gets a font, loading it only the first time
+        Arguments:
+        - size(int): the size of the font
+        - face(str): the font file, defaults to pygame's default font
+        Returns:
+        - pygame.font.Font: the shared font
+        '''
+        font = self._fonts.get((face, size))
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.Font(face or pygame.font.get_default_font(), size)
+            self._fonts[(face, size)] = font
+            self.font_loads += 1
+        return font
+
+    def render(self, text, size, color, face=None):
+        '''
+        Gets the rendered surface of a text, rendering it only the first time
+        Arguments:
+        - text(str): the text to render
+        - size(int): the size of the font
+        - color(tuple): the colour of the text
+        - face(str): the font file, defaults to pygame's default font
+        Returns:
+        - pygame.Surface: the shared surface, it must only be blitted and not drawn on
+        '''
+        key = (text, size, color, face)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.get_font(size, face).render(text, True, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        '''
+        Returns the cache counters
+        Returns:
+        - dictionary with hits, misses, font_loads, fonts and surfaces
+        '''
+        return {'hits': self.hits, 'misses': self.misses, 'font_loads': self.font_loads,
+                'fonts': len(self._fonts), 'surfaces': len(self._surfaces)}
+
+text_cache = TextCache()  # Shared by everything that draws text
@@ -0,0 +1,197 @@
+'''
+Multi-process tournament runner
+Plays every matchup of a list of entrants (species at a level) across all cores and
+writes the resulting matchup matrix to a CSV file. Each worker loads the pokemon
+data once when it starts, and every matchup gets its own random stream derived from
+the tournament seed, so the results do not depend on the number of workers.
+Usage: python tournament.py bulbasaur:30 charmander:30 squirtle:30 --battles 10000
+'''
+import argparse
+import csv
+import hashlib
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+import battle_engine
+from pokeapi import APIManager, choose_moves, load_species
+
+try:
+    import batch_sim
+except ImportError:  # numpy is optional, fall back on the scalar engine
+    batch_sim = None
+
+_combatants = {}  # Filled once per worker process by _init_worker
+
+def load_combatant(name, level, seed):
+    '''
+    Builds the battle state of a species at a level from the API data
+    Arguments:
+    - name(str): the name of the pokemon
+    - level(int): the level of the pokemon
+    - seed(int): the tournament seed, used to pick the same moves in every worker
+    Returns:
+    - Combatant: the pokemon ready to battle
+    '''
+    species = load_species(name)
+    if species is None:
+        raise ValueError(f'Failed to retrieve data for {name}')
+    moves = choose_moves(species.move_urls(level), random.Random(f'{seed}:{name}:{level}'))
+    return battle_engine.Combatant.from_species(species, level, moves)
+
+def matchup_seed(seed, player_index, rival_index):
+    '''
+    Derives the seed of one matchup from the tournament seed
+    Arguments:
+    - seed(int): the tournament seed
+    - player_index(int): index of the entrant playing the player
+    - rival_index(int): index of the entrant playing the rival
+    Returns:
+    - int: a 64 bit seed that only depends on the arguments
+    '''
+    digest = hashlib.sha256(f'{seed}:{player_index}:{rival_index}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'little')
+
+def _init_worker(entrants, seed, loader):
+    '''
+    Loads every entrant once in a worker process
+    Arguments:
+    - entrants(list): (name, level) of each entrant
+    - seed(int): the tournament seed
+    - loader(callable): builds a combatant, called as loader(name, level, seed)
+    '''
+    _combatants.clear()
+    for index, (name, level) in enumerate(entrants):
+        _combatants[index] = loader(name, level, seed)
+
+def _play_matchup(task):
+    '''
+    Plays one matchup in a worker process
+    Arguments:
+    - task(tuple): (player_index, rival_index, battles, seed)
+    Returns:
+    - tuple (player_index, rival_index, player_win_rate)
+    '''
+    player_index, rival_index, battles, seed = task
+    player, rival = _combatants[player_index], _combatants[rival_index]
+    if batch_sim is not None:
+        win_rate = batch_sim.simulate_matchup(player, rival, battles, seed)['player_win_rate']
+    else:
+        win_rate = battle_engine.simulate(player, rival, battles, seed)['player_wins'] / battles
+    return player_index, rival_index, win_rate
+
+def _run_matchups(entrants, pairs, battles, seed, workers, loader):
+    '''
+    Plays a list of matchups in a process pool
+    Arguments:
+    - entrants(list): (name, level) of each entrant
+    - pairs(list): (player_index, rival_index) of each matchup
+    - battles(int): battles per matchup
+    - seed(int): the tournament seed
+    - workers(int): number of worker processes
+    - loader(callable): builds a combatant, called as loader(name, level, seed)
+    Returns:
+    - dictionary mapping (player_index, rival_index) to the player's win rate
+    '''
+    # Workers open their own cache connection, a connection must not be shared across fork
+    if APIManager.cache is not None:
+        APIManager.cache.close()
+    tasks = [(i, j, battles, matchup_seed(seed, i, j)) for i, j in pairs]
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(entrants, seed, loader)) as pool:
+        return {(i, j): win_rate for i, j, win_rate in pool.map(_play_matchup, tasks, chunksize=chunksize)}
+
+def run_round_robin(entrants, battles, seed=0, workers=None, loader=load_combatant):
+    '''
+    Plays every entrant against every other entrant, both as the first and second to act
+    Arguments:
+    - entrants(list): (name, level) of each entrant
+    - battles(int): battles per matchup
+    - seed(int): the tournament seed
+    - workers(int): number of worker processes, defaults to the number of cores
+    - loader(callable): builds a combatant, called as loader(name, level, seed)
+    Returns:
+    - list of lists: matrix[i][j] is the win rate of entrant i as the player against entrant j (None on the diagonal)
+    '''
+    workers = workers or os.cpu_count()
+    pairs = [(i, j) for i in range(len(entrants)) for j in range(len(entrants)) if i != j]
+    results = _run_matchups(entrants, pairs, battles, seed, workers, loader)
+    return [[results.get((i, j)) for j in range(len(entrants))] for i in range(len(entrants))]
+
+def run_bracket(entrants, battles, seed=0, workers=None, loader=load_combatant):
+    '''
+    Plays a single elimination bracket, every round is played in parallel
+    An entrant beats its opponent if it wins more than half of the battles, counting
+    both the battles where it is the player and the ones where it is the rival. An entrant
+    without an opponent in a round goes through to the next one.
+    Arguments:
+    - entrants(list): (name, level) of each entrant, in seeding order
+    - battles(int): battles per matchup and side
+    - seed(int): the tournament seed
+    - workers(int): number of worker processes, defaults to the number of cores
+    - loader(callable): builds a combatant, called as loader(name, level, seed)
+    Returns:
+    - list of rounds, each a list of (entrant_index, opponent_index, winner_index)
+    '''
+    workers = workers or os.cpu_count()
+    alive = list(range(len(entrants)))
+    rounds = []
+    while len(alive) > 1:
+        games = [(alive[k], alive[k + 1]) for k in range(0, len(alive) - 1, 2)]
+        pairs = [pair for i, j in games for pair in ((i, j), (j, i))]
+        results = _run_matchups(entrants, pairs, battles, seed, workers, loader)
+        played = []
+        for i, j in games:
+            score = results[(i, j)] + (1 - results[(j, i)])
+            played.append((i, j, i if score >= 1 else j))
+        rounds.append(played)
+        alive = [winner for _, _, winner in played] + alive[len(games) * 2:]
+    return rounds
+
+def write_matrix(path, entrants, matrix):
+    '''
+    Writes a matchup matrix as CSV, one row per entrant as the player
+    Arguments:
+    - path(str): the file to write
+    - entrants(list): (name, level) of each entrant
+    - matrix(list): the matrix from run_round_robin
+    '''
+    labels = [f'{name}:{level}' for name, level in entrants]
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([''] + labels)
+        for label, row in zip(labels, matrix):
+            writer.writerow([label] + ['' if rate is None else f'{rate:.6f}' for rate in row])
+
+def parse_entrant(text):
+    '''
+    Parses an entrant given as name:level (the level defaults to 30)
+    Arguments:
+    - text(str): the entrant
+    Returns:
+    - tuple (name, level)
+    '''
+    name, _, level = text.partition(':')
+    return name.lower(), int(level or 30)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a Pokemon battle tournament')
+    parser.add_argument('entrants', nargs='+', type=parse_entrant, help='species as name:level')
+    parser.add_argument('--battles', type=int, default=10000, help='battles per matchup')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--bracket', action='store_true', help='play a single elimination bracket')
+    parser.add_argument('--out', default='matchups.csv', help='where to write the matchup matrix')
+    args = parser.parse_args()
+
+    if args.bracket:
+        for number, played in enumerate(run_bracket(args.entrants, args.battles, args.seed, args.workers), 1):
+            for i, j, winner in played:
+                print(f'Round {number}: {args.entrants[i][0]} vs {args.entrants[j][0]} -> {args.entrants[winner][0]}')
+    else:
+        matrix = run_round_robin(args.entrants, args.battles, args.seed, args.workers)
+        write_matrix(args.out, args.entrants, matrix)
+        print(f'Wrote {len(args.entrants)}x{len(args.entrants)} matchup matrix to {args.out}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Type effectiveness chart
+The 18 types are interned to small integer IDs and the chart is stored once as a
+compact 18x18 table of bytes holding twice the multiplier (0, 1, 2 or 4), so a
+lookup is a single index into the table.
+'''
+TYPES = ('normal', 'fighting', 'flying', 'poison', 'ground', 'rock', 'bug', 'ghost', 'steel',
+         'fire', 'water', 'grass', 'electric', 'psychic', 'ice', 'dragon', 'dark', 'fairy')
+TYPE_IDS = {name: type_id for type_id, name in enumerate(TYPES)}
+
+# Attacking type -> (super effective against, not very effective against, no effect on)
+_MATCHUPS = {
+    'normal': ((), ('rock', 'steel'), ('ghost',)),
+    'fighting': (('normal', 'rock', 'steel', 'ice', 'dark'), ('flying', 'poison', 'bug', 'psychic', 'fairy'), ('ghost',)),
+    'flying': (('fighting', 'bug', 'grass'), ('rock', 'steel', 'electric'), ()),
+    'poison': (('grass', 'fairy'), ('poison', 'ground', 'rock', 'ghost'), ('steel',)),
+    'ground': (('poison', 'rock', 'steel', 'fire', 'electric'), ('bug', 'grass'), ('flying',)),
+    'rock': (('flying', 'bug', 'fire', 'ice'), ('fighting', 'ground', 'steel'), ()),
+    'bug': (('grass', 'psychic', 'dark'), ('fighting', 'flying', 'poison', 'ghost', 'steel', 'fire', 'fairy'), ()),
+    'ghost': (('ghost', 'psychic'), ('dark',), ('normal',)),
+    'steel': (('rock', 'ice', 'fairy'), ('steel', 'fire', 'water', 'electric'), ()),
+    'fire': (('bug', 'steel', 'grass', 'ice'), ('rock', 'fire', 'water', 'dragon'), ()),
+    'water': (('ground', 'rock', 'fire'), ('water', 'grass', 'dragon'), ()),
+    'grass': (('ground', 'rock', 'water'), ('flying', 'poison', 'bug', 'steel', 'fire', 'grass', 'dragon'), ()),
+    'electric': (('flying', 'water'), ('grass', 'electric', 'dragon'), ('ground',)),
+    'psychic': (('fighting', 'poison'), ('steel', 'psychic'), ('dark',)),
+    'ice': (('flying', 'ground', 'grass', 'dragon'), ('steel', 'fire', 'water', 'ice'), ()),
+    'dragon': (('dragon',), ('steel',), ('fairy',)),
+    'dark': (('ghost', 'psychic'), ('fighting', 'dark', 'fairy'), ()),
+    'fairy': (('fighting', 'dragon', 'dark'), ('poison', 'steel', 'fire'), ()),
+}
+
+def _build_chart():
+    '''
+    Builds the 18x18 table from the matchups above
+    Returns:
+    - bytes: the table, row major by attacking type, holding twice the multiplier
+    '''
+    chart = bytearray([2]) * (len(TYPES) * len(TYPES))
+    for attacking, (strong, weak, immune) in _MATCHUPS.items():
+        row = TYPE_IDS[attacking] * len(TYPES)
+        for defending in strong:
+            chart[row + TYPE_IDS[defending]] = 4
+        for defending in weak:
+            chart[row + TYPE_IDS[defending]] = 1
+        for defending in immune:
+            chart[row + TYPE_IDS[defending]] = 0
+    return bytes(chart)
+
+CHART = _build_chart()
+
+def type_id(name):
+    '''
+    Gets the interned ID of a type
+    Arguments:
+    - name(str): the name of the type
+    Returns:
+    - int: the ID, or None for types outside the chart (e.g. 'unknown')
+    '''
+    return TYPE_IDS.get(name)
+
+def effectiveness(move_type, defender_types):
+    '''
+    Gets the damage multiplier of a move type against a pokemon
+    Arguments:
+    - move_type(str): the type of the move
+    - defender_types(list): the types of the pokemon receiving the move
+    Returns:
+    - float: the multiplier (0, 0.25, 0.5, 1, 2 or 4)
+    '''
+    attacking = TYPE_IDS.get(move_type)
+    if attacking is None:
+        return 1.0
+    row = attacking * len(TYPES)
+    multiplier = 1.0
+    for name in defender_types:
+        defending = TYPE_IDS.get(name)
+        if defending is not None:
+            multiplier *= CHART[row + defending] / 2
+    return multiplier